@@ -27,13 +27,16 @@ gi.require_version('Gtk', '3.0')
 # import Gtk libraries
 from gi.repository import Gtk, Gdk, GLib
 
-from hexview import HexView
+from hexview import HexView, PagedBuffer
+from scanresult import ScanResultModel
+from cheatlist import CheatListModel, data_type
 
-MATCH_CNT = 32
+SCANRES_COL_WIDTH = 120
 
 class GcUI(Gtk.Builder):
 
-    def __init__(self):
+    # `list_loader(count, first, query, callback)` loads the pages of the scan results
+    def __init__(self, list_loader: callable):
         super(GcUI, self).__init__()
 
         self.set_translation_domain(misc.DOMAIN_TRS)
@@ -49,6 +52,7 @@ class GcUI(Gtk.Builder):
         self.scanDataT_vsel  = self.get_object('ScanDataType_Select')
         self.scanMatchT_vsel = self.get_object('ScanMatchType_Select')
         self.signIntVal_chbx = self.get_object('SignedIntType_Checkbox')
+        self.alignOnly_chbx  = self.get_object('AlignedOnly_Checkbox')
         self. process_label  = self.get_object('Process_Label')
         self.procFiltr_input = self.get_object('ProcessFilter_Input')
         self.userFiltr_input = self.get_object('UserFilter_Input')
@@ -81,8 +85,9 @@ class GcUI(Gtk.Builder):
             self.get_object('About_Logo') ]: dialog.connect('clicked', self.on_ShowDialog_handler)
         # deferred creation
         self. mmedit_hexview : HexView = None
-        # init ScanResult @ columns:      addr, value, type, valid, offset, region, match_id
-        self.scanRes_list = Gtk.ListStore(str , str  , str , bool , str   , str   , int)
+        # init ScanResult @ columns: addr, value, type, valid, offset, region, match_id
+        # the rows are loaded from the backend when they are shown
+        self.scanRes_list = ScanResultModel(list_loader)
         self.scanRes_tree.set_model(self.scanRes_list)
         # init ProcessList @ columns:      pid, usr, process
         self.procList_list = Gtk.ListStore(int, str, str)
@@ -91,25 +96,32 @@ class GcUI(Gtk.Builder):
         self.procList_tree.set_model(Gtk.TreeModelSort(model=self.procList_filter))
         self.procList_tree.set_search_column(2)
         # init CheatsList @ columns:        lock, desc, addr, type, value, valid
-        self.cheatList_list = Gtk.ListStore(bool, str , str , str , str  , bool)
+        # the entries are kept by the table of the model, which refreshes them by type groups
+        self.cheatList_list = CheatListModel()
         self.cheatList_tree.set_model(self.cheatList_list)
         # init scanresult treeview columns
         # we may need a cell data func here
-        GcUI.treeview_append_column(self.scanRes_tree, 'Address', 0, #data_func=GcUI.format16,
+        GcUI.treeview_append_column(self.scanRes_tree, 'Address', -1, #data_func=GcUI.format16,
                                     attributes=[('text', 0)],
                                     properties=[('family', 'monospace')])
 
-        GcUI.treeview_append_column(self.scanRes_tree, 'Value', 1,
-                                    attributes=[('text', 0)],
+        GcUI.treeview_append_column(self.scanRes_tree, 'Value', -1,
+                                    attributes=[('text', 1)],
                                     properties=[('family', 'monospace')])
 
-        GcUI.treeview_append_column(self.scanRes_tree, 'Offset', 4, #data_func=GcUI.format16,
+        GcUI.treeview_append_column(self.scanRes_tree, 'Offset', -1, #data_func=GcUI.format16,
                                     attributes=[('text', 4)],
                                     properties=[('family', 'monospace')])
 
-        GcUI.treeview_append_column(self.scanRes_tree, 'Region Type', 5,
+        GcUI.treeview_append_column(self.scanRes_tree, 'Region Type', -1,
                                     attributes=[('text', 5)],
                                     properties=[('family', 'monospace')])
+        # rows of the same height aren't measured one by one, which would load all of them
+        for column in self.scanRes_tree.get_columns():
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            column.set_fixed_width(SCANRES_COL_WIDTH)
+        self.scanRes_tree.set_fixed_height_mode(True)
+        self.scanRes_tree.get_vadjustment().connect('value-changed', self.on_ScanResult_scroll_handler)
         # make processes tree
         GcUI.treeview_append_column(self.procList_tree, 'PID'    , 0, attributes=[('text',0)])
         GcUI.treeview_append_column(self.procList_tree, 'User'   , 1, attributes=[('text',1)])
@@ -125,6 +137,9 @@ class GcUI(Gtk.Builder):
 
     ############################
     # Handlers
+    def on_ScanResult_scroll_handler(self, adj, data=None):
+        self.scanRes_list.prefetch(GcUI.get_visible_rows(self.scanRes_tree))
+
     def on_TextInput_handler(self, input, data=None):
         is_usrFi = input is self.userFiltr_input
         is_prcFi = input is self.procFiltr_input
@@ -297,20 +312,16 @@ class GcUI(Gtk.Builder):
         cell.set_property('text', '%x' % xv)
 
     @staticmethod
-    # sort column according to datatype (callback for TreeView)
-    def treeview_sort_cmp(treemodel, iter1, iter2, user_data):
-        sort_col, isnumeric = user_data
-
-        v1 = treemodel.get_value(iter1, sort_col)
-        v2 = treemodel.get_value(iter2, sort_col)
-
-        if (isnumeric):
-            v1 = float(v1)
-            v2 = float(v2)
-
-        if v1 >  v2: return 1
-        if v1 == v2: return 0
-        return -1
+    # return range(r1, r2) where all rows between r1 and r2 (EXCLUSIVE) are visible
+    # return range(0, 0) if no row visible
+    def get_visible_rows(treeview):
+        _range = treeview.get_visible_range()
+        try:
+            r1 = _range[0][0]
+            r2 = _range[1][0] + 1
+        except:
+            r1 = r2 = 0
+        return range(r1, r2)
 
 
 class GameConqueror(scanmem.Scanmem):
@@ -323,20 +334,28 @@ class GameConqueror(scanmem.Scanmem):
         self._mcnt: int  = 0 # found count
         self._nreg: int  = 0 # regions count
         self._wtid: int  = 0
-        self._maps: list = None
+        self._maps = misc.ProcMaps()
         self._ui  : GcUI = None
+        self._lsqr: str  = '' # sort key of the scan results (see `scanmem.list_query()`)
+        self._plst = misc.ProcessList()
+        self._psrc: int  = 0 # source adding the rows of the process list
+        # the pages read by a refresh are shared by the views, and read again by the next one
+        self.pages.ttl_ms = misc.LIVE_CHECKER_MS // 2
+        # scan progress is pushed by the backend
+        self.subscribe('progress', self.on_scan_progress)
+        self.subscribe('done', self.on_scan_progress)
 
     def Create_MemoryEditor(self):
         # init memory editor
         self._ui.mmedit_hexview = HexView()
         self._ui.mmedit_window.get_child().pack_start(self._ui.mmedit_hexview, True, True, 0)
         self._ui.mmedit_hexview.show_all()
-        self._ui.mmedit_hexview.connect('char-changed', self.MemoryEditor_Byte_Changed_handler)
+        self._ui.mmedit_hexview.connect('bytes-changed', self.MemoryEditor_Bytes_Changed_handler)
 
     def create_window(self):
         ##################################
         # init GUI
-        gcui = self._ui = GcUI()
+        gcui = self._ui = GcUI(self.get_list_matches_async)
 
         # apply setting
         gcui.scanMatchT_vsel.set_active(self.match_type)
@@ -388,6 +407,11 @@ class GameConqueror(scanmem.Scanmem):
         gcui.scanVal_input .connect('key-press-event', self.on_KeyPress_handler)
         gcui.cheatList_tree.connect('key-press-event', self.on_KeyPress_handler)
         gcui.scanRes_tree  .connect('key-press-event', self.on_KeyPress_handler)
+        # the scan results are sorted by the backend
+        for column, key in zip(gcui.scanRes_tree.get_columns(), ['addr', 'value', '', 'region']):
+            if key:
+                column.set_clickable(True)
+                column.connect('clicked', self.on_ScanResult_sort_handler, key)
         # get list of things to be disabled during scan
         gcui. proc_button.connect('clicked', self.on_ProcessList_Open)
         gcui. scan_button.connect('clicked', self.on_ScanProgress_Toggle)
@@ -463,7 +487,7 @@ class GameConqueror(scanmem.Scanmem):
             case 's': val = ' ' * size
             case 'a': val = '00 ' * size
         # add to list
-        self._ui.cheatList_list.append([False, desc, addr, type, val, True])
+        self._ui.cheatList_list.append(desc, int(addr, 16), type, val)
         return False
 
     def on_AddCheat_Open(self, btn: Gtk.Button, data=None):
@@ -539,11 +563,27 @@ class GameConqueror(scanmem.Scanmem):
 
     def on_ProcessList_Open(self, btn: Gtk.Button, data=None):
         proc_list = self._ui.procList_list
-        proc_list.clear()
-        for plist in misc.get_process_list():
-            proc_list.append(plist)
+        # rows of the exited processes are removed, the new ones are added while the dialog shows
+        gone, rows = self._plst.update()
+        if gone:
+            for it in [r.iter for r in proc_list if r[0] in gone]:
+                proc_list.remove(it)
+        if self._psrc:
+            GLib.source_remove(self._psrc)
+        self._psrc = GLib.idle_add(self.add_processes, rows, [0])
         return self._ui.on_ShowDialog_handler(btn, self.check_selected_process)
 
+    # the new processes go on top of the list, by batches between the events of the UI
+    def add_processes(self, rows, pos: list[int]):
+        for _ in range(64):
+            row = next(rows, None)
+            if row is None:
+                self._psrc = 0
+                return False
+            self._ui.procList_list.insert(pos[0], row)
+            pos[0] += 1
+        return True
+
     # Process list
     def check_selected_process(self):
         lstr, iter = self._ui.procList_tree.get_selection().get_selected()
@@ -562,26 +602,22 @@ class GameConqueror(scanmem.Scanmem):
 
     # Memory editor
 
-    def MemoryEditor_Byte_Changed_handler(self, hexview, offset, charval):
-        addr = hexview.base_addr + offset
-        self.write_value(addr, 'int8', charval)
-        # return False such that the byte the default handler will be called, and will be displayed correctly 
-        return False
-
-    def MemoryEditor_Refresh_Button_clicked_cb(self, button, data=None):
-        addr = int(self._ui.mmedit_hexview.base_addr)
-        size = len(self._ui.mmedit_hexview.payload)
-        old_addr = self._ui.mmedit_hexview.get_current_addr()
-        buf,emsg = self.read_memory(addr, size)
-        # ----
+    def MemoryEditor_Bytes_Changed_handler(self, hexview, edits):
+        # one write of all the edited ranges
+        _, emsg = self.write_memory([(hexview.base_addr + offset, data) for offset,data in edits])
         if emsg:
             self._ui.show_error(emsg)
-        # ----
-        if buf != None:
-            self._ui.mmedit_hexview.payload = buf
-            self._ui.mmedit_hexview.show_addr(old_addr)
-        else:
-            self._ui.mmedit_window.hide()
+
+    def MemoryEditor_Refresh_Button_clicked_cb(self, button, data=None):
+        # the pages in sight are read again, the others when they're shown
+        self._ui.mmedit_hexview.reload()
+
+    def MemoryEditor_AutoRefresh_cb(self, widget, data=None):
+        live = self._ui.get_object('MemoryEditor_AutoRefresh_Toggle').get_active()
+        rate = self._ui.get_object('MemoryEditor_AutoRefresh_Rate').get_value_as_int()
+        if self._ui.mmedit_hexview:
+            self._ui.mmedit_hexview.auto_refresh = rate if live else 0
+        return True
 
     # Manually add cheat
 
@@ -603,7 +639,7 @@ class GameConqueror(scanmem.Scanmem):
         lstor, plist = tree.get_selection().get_selected_rows()
         for path in plist:
             addr, val, typestr = lstor.get(lstor.get_iter(path), 0,1,2)
-            self._ui.cheatList_list.append([False, " * ", addr, typestr, str(val), True])
+            self.add_to_cheat_list(addr, val, typestr, ' * ', at_end=True)
 
     def on_PopupMenu_Copy(self, mitem, ltree):
         lstor, plist = ltree.get_selection().get_selected_rows()
@@ -633,15 +669,13 @@ class GameConqueror(scanmem.Scanmem):
 
     def do_ListItems_Remove(self, trigger=None, tree=None):
         lstor, plist = tree.get_selection().get_selected_rows()
-        is_scanres   = tree is self._ui.scanRes_tree
-        list_id = []
-        for path in plist:
-            itr = lstor.get_iter(path)
-            if is_scanres:
-                list_id.append(str(lstor.get_value(itr, 6)))
-            lstor.remove(itr)
-        if is_scanres:
-            self.del_selected_matches(list_id)
+        if tree is self._ui.scanRes_tree:
+            # the matches are deleted by the backend, then the rows are loaded again
+            self.del_selected_matches([lstor.get_value(lstor.get_iter(path), 6) for path in plist])
+            return
+        # from the last row, so that the paths of the next ones stay the same
+        for path in reversed(plist):
+            lstor.remove(lstor.get_iter(path))
 
     def on_KeyPress_handler(self, target, event, data=None):
         key  = Gdk.keyval_name(event.keyval)
@@ -664,16 +698,10 @@ class GameConqueror(scanmem.Scanmem):
                 self.scan_start()
 
     def cheatlist_toggle_lock(self, row):
-        if self._ui.cheatList_list[row][5]: # valid
-            locked = self._ui.cheatList_list[row][0]
-            locked = not locked
-            self._ui.cheatList_list[row][0] = locked
-        if locked:
-            #TODO: check value(valid number & not overflow), if failed, unlock it and do nothing
-            pass
-        else:
-            #TODO: update its value?
-            pass
+        table = self._ui.cheatList_list.table
+        if table.valid[row]:
+            # the backend freezer holds the value from the next refresh
+            self._ui.cheatList_list.set(row, lock=not table.locks[row])
         return True
 
     def cheatlist_toggle_lock_cb(self, cellrenderertoggle, row_str, data=None):
@@ -706,8 +734,7 @@ class GameConqueror(scanmem.Scanmem):
         self.cheatlist_editing = False
         pathlist = self._ui.cheatList_tree.get_selection().get_selected_rows()[1]
         for path in pathlist:
-            row = path[0]
-            self._ui.cheatList_list[row][1] = new_text
+            self._ui.cheatList_list.set(path[0], desc=new_text)
         return True
 
     def cheatlist_edit_value_cb(self, cell, path, new_text, data=None):
@@ -716,30 +743,28 @@ class GameConqueror(scanmem.Scanmem):
         if new_text == '':
             return True
         pathlist = self._ui.cheatList_tree.get_selection().get_selected_rows()[1]
+        table    = self._ui.cheatList_list.table
         for path in pathlist:
             row = path[0]
-            if not self._ui.cheatList_list[row][5]: #not valid
+            if not table.valid[row]:
                 continue
-            self._ui.cheatList_list[row][4] = new_text
-            if self._ui.cheatList_list[row][0]: # locked
-                # data_worker will handle this
-                pass
-            else:
-                (addr, typestr, value) = self._ui.cheatList_list[row][2:5]
-                self.write_value(addr, typestr, value)
+            self._ui.cheatList_list.set(row, value=new_text)
+            # locked values are written by the freezer
+            if not table.locks[row]:
+                self.write_value(table.addrs[row], data_type(table.types[row]), new_text)
         return True
 
     def cheatlist_edit_type_cb(self, cell, path, new_type, data=None):
         self.cheatlist_editing = False
         plist = self._ui.cheatList_tree.get_selection().get_selected_rows()[1]
+        table = self._ui.cheatList_list.table
         for p in plist:
-            row = self._ui.cheatList_list[p[0]]
-            addr, cur_type, val = row[2:5]
+            row = p[0]
+            cur_type, val = table.types[row], table.values[row]
             if new_type != cur_type:
-                row[0] = False # unlock
-                row[3] = new_type
-                if new_type in {'bytearray', 'string'}:
-                    row[4] = self.read_value(addr, cur_type, val, new_type)
+                if data_type(new_type) in {'bytearray', 'string'}:
+                    val = self.read_value(table.addrs[row], data_type(cur_type), val, data_type(new_type))
+                self._ui.cheatList_list.set(row, lock=False, typestr=new_type, value=val)
         return True
 
     # Process list
@@ -753,34 +778,36 @@ class GameConqueror(scanmem.Scanmem):
 
     def read_cheat_list(self, file):
         for ch in self.load_cheat_list(file):
-            self._ui.cheatList_list.append([
-                False, ch['desc'], ch['addr'], ch['type'], ch['value'], True
-            ])
+            self._ui.cheatList_list.append(ch['desc'], int(ch['addr'], 16), ch['type'], ch['value'])
 
     def write_cheat_list(self, file):
-        self.store_cheat_list( file, self._ui.cheatList_list )
+        self.store_cheat_list( file, self._ui.cheatList_list.table.rows() )
 
-    def del_selected_matches(self, sel_ids: list[str] ):
-        idx = 0
-        while idx < len(sel_ids):
-            self.command_send('delete '+','.join(sel_ids[ idx : idx+32 ]))
-            idx += 32
+    def del_selected_matches(self, sel_ids: list[int]):
+        # the rows not loaded yet have no id
+        sel_ids = [i for i in sel_ids if i >= 0]
+        if not sel_ids:
+            return
+        m_count, emsg = self.delete_matches(sel_ids)
+        if emsg:
+            self._ui.show_error(emsg)
+            return
+        self._mcnt = m_count
+        self._ui.main_window.set_title(misc.ltr('Found: %d')% self._mcnt)
+        self.reload_list_matches(self._mcnt)
 
     def browse_memory(self, addr=None):
         # select a region contains addr
         try:
-            self._maps = misc.read_proc_maps(self._cpid)
-        except:
+            self._maps.refresh()
+        except OSError:
             self._ui.show_error('Cannot retrieve memory maps of that process, maybe it has exited (crashed), or you don\'t have enough privileges')
             return
         selected_region = None
         if addr is not None:
-            for m in self._maps:
-                if m['start_addr'] <= addr and addr < m['end_addr']:
-                    selected_region = m
-                    break
+            selected_region = self._maps.find(addr)
             if selected_region:
-                if selected_region['flags'][0] != 'r': # not readable
+                if selected_region.flags[0] != 'r': # not readable
                     self._ui.show_error('Address %x is not readable' % addr)
                     return
             else:
@@ -789,47 +816,71 @@ class GameConqueror(scanmem.Scanmem):
         else:
             # just select the first readable region
             for m in self._maps:
-                if m['flags'][0] == 'r':
+                if m.flags[0] == 'r':
                     selected_region = m
                     break
             if selected_region is None:
                 self._ui.show_error('Cannot find a readable region')
                 return
-            addr = selected_region['start_addr']
+            addr = selected_region.start_addr
+
+        # the whole region is paged, its pages are read in the background when shown
+        start_addr = selected_region.start_addr
+        def fetch(offset: int, size: int, callback: callable):
+            self.read_memory_async(start_addr + offset, size, lambda buf, emsg: callback(buf), fresh=True)
+
+        self._ui.mmedit_hexview.payload = PagedBuffer(selected_region.size, fetch, misc.HEXEDIT_CACHE_PAGES)
+        self._ui.mmedit_hexview.base_addr = start_addr
+        self._ui.mmedit_hexview.show_addr(addr)
+        # set editable flag
+        self._ui.mmedit_hexview.editable = (selected_region.flags[1] == 'w')
+        self._ui.mmedit_window.set_title(misc.ltr('GameConqueror - Memory Editor') + ' - ' + self._maps.label(addr))
+        self._ui.mmedit_window.show()
+
+    def on_scan_progress(self, data:dict):
+        if 'error' in data:
+            self._ui.show_error(data['error'])
+            return
+        # a stopped scan still ends with `done`, which unlocks the UI
+        if not self._is_scanning and data['event'] != 'done':
+            return
 
-        # read region if possible
-        start_addr = max(addr - misc.HEXEDIT_SPAN_MAX, selected_region['start_addr'])
-        end_addr   = min(addr + misc.HEXEDIT_SPAN_MAX, selected_region['end_addr'])
-        # ----
-        buf,emsg   = self.read_memory(start_addr, end_addr - start_addr)
-        if  emsg:
+        self._mcnt = data['match_count']
+        self._ui.scan_progbar.set_fraction(data['scan_progress'])
+
+        if data['event'] == 'done':
+            self._is_scanning = False
+            if data['snapshot']:
+                # the backend doesn't sort the matches of a snapshot
+                self.drop_list_query()
+            self.update_scan_result(self._mcnt)
+            self.reload_list_matches(self._mcnt)
+            self.set_ui_deactive(active=True)
+
+    def on_ScanResult_sort_handler(self, column, key:str):
+        desc = column.get_sort_indicator() and column.get_sort_order() == Gtk.SortType.ASCENDING
+        for col in self._ui.scanRes_tree.get_columns():
+            col.set_sort_indicator(col is column)
+        column.set_sort_order(Gtk.SortType.DESCENDING if desc else Gtk.SortType.ASCENDING)
+        self._lsqr = scanmem.list_query(('-' if desc else '') + key)
+        # the first page tells the count of the sorted matches
+        self.get_list_matches_async(1, 0, self._lsqr, self.on_list_query_reply)
+
+    def drop_list_query(self):
+        self._lsqr = ''
+        for col in self._ui.scanRes_tree.get_columns():
+            col.set_sort_indicator(False)
+
+    def on_list_query_reply(self, mlst:list, total:int, emsg:str):
+        if emsg:
+            self.drop_list_query()
             self._ui.show_error(emsg)
-        # ----
-        if buf != None:
-            self._ui.mmedit_hexview.payload = buf
-            self._ui.mmedit_hexview.show_addr(addr)
-            # set editable flag
-            self._ui.mmedit_hexview.base_addr = start_addr
-            self._ui.mmedit_hexview.editable = (selected_region['flags'][1] == 'w')
-            self._ui.mmedit_window.show()
-
-    # this callback will be called from other thread
-    def progress_watcher(self):
-        if self._is_scanning:
-            emsg,pgss,mcnt = self.get_scan_progress()
-            if emsg:
-                self._ui.show_error(emsg)
-
-            self._mcnt = mcnt
-            self._ui.scan_progbar.set_fraction(pgss)
-
-            if pgss >= 1.0:
-                self._is_scanning = False
-                self.update_scan_result(mcnt)
-                #self.reload_list_matches(m_count)
-                self.set_ui_deactive(active=True)
+        else:
+            self.reload_list_matches(total)
 
-        return self._is_scanning and not self._is_exiting
+    # dispatch replies of pipelined requests
+    def on_backend_reply(self, fd, condition):
+        return self.dispatch_replies()
 
     def add_to_cheat_list(self, addr, value, typestr, desc='No Description', at_end=False):
         # determine longest possible type
@@ -839,10 +890,11 @@ class GameConqueror(scanmem.Scanmem):
             if t in misc.TYPENAMES_S2G:
                 vt = misc.TYPENAMES_S2G[t]
                 break
+        addr = int(addr, 16) if isinstance(addr, str) else addr
         if at_end:
-            self._ui.cheatList_list.append([False, desc, addr, vt, str(value), True])
+            self._ui.cheatList_list.append(desc, addr, vt, str(value))
         else:
-            self._ui.cheatList_list.prepend([False, desc, addr, vt, str(value), True])
+            self._ui.cheatList_list.prepend(desc, addr, vt, str(value))
 
     def select_process(self, pid: str, process_name: str):
         # ask backend for attaching the target process
@@ -851,7 +903,7 @@ class GameConqueror(scanmem.Scanmem):
         # for debug/log
         try:
             self._cpid = pid
-            self._maps = misc.read_proc_maps(pid)
+            self._maps = misc.ProcMaps(pid)
             self._wtid = GLib.timeout_add(misc.LIVE_CHECKER_MS, self.process_status_checker)
         except:
             self._cpid = ''
@@ -865,12 +917,11 @@ class GameConqueror(scanmem.Scanmem):
         self.reset_scan()
 
         # unlock all entries in cheat list
-        for i in range(len(self._ui.cheatList_list)):
-            self._ui.cheatList_list[i][0] = False
+        self._ui.cheatList_list.unlock_all()
 
     def reset_scan(self):
         # reset search type and value type
-        self._ui.scanRes_list.clear()
+        self.reload_list_matches(0)
 
         emsg, rcount, exelnk = self.reset_process()
 
@@ -887,8 +938,6 @@ class GameConqueror(scanmem.Scanmem):
             self._ui.scanVal_input.grab_focus()
 
     def apply_scan_settings(self, data_type: str, is_number = True):
-        # Tell the scanresult sort function if a numeric cast is needed
-        self._ui.scanRes_list.set_sort_func(1, GcUI.treeview_sort_cmp, (1, is_number))
         # search scope
         emsg, rcount, exelnk = self.reset_process()
         if not emsg:
@@ -918,6 +967,7 @@ class GameConqueror(scanmem.Scanmem):
         # set scan options only when first scan, since this will reset backend
         if self._is_firstRun:
             self.apply_scan_settings(data_type, is_number)
+            self.scan_align = 0 if self._ui.alignOnly_chbx.get_active() else 1
 
         _, emsg = self.start_scanning(cmd)
         if emsg:
@@ -925,7 +975,6 @@ class GameConqueror(scanmem.Scanmem):
         else:
             self._is_firstRun = False
             self.set_ui_deactive()
-            GLib.timeout_add(misc.PROGRESS_WATCH_MS, self.progress_watcher)
 
     def set_ui_deactive(self, active = False):
         # disable the window before perform scanning, such that if result come so fast, we won't mess it up
@@ -941,43 +990,12 @@ class GameConqueror(scanmem.Scanmem):
         self._ui.main_window.set_title(misc.ltr('Found: %d')% m_count)
         self._ui.scanVal_input.grab_focus()
 
-    def reload_list_matches(self):
-        matches = self.send_command(f'list L{MATCH_CNT}', 4096)
-
+    def reload_list_matches(self, m_count: int = 0):
+        # the model is detached while its rows are replaced
         self._ui.scanRes_tree.set_model(None)
-        # temporarily disable model for scanresult_liststore for the sake of performance
-        self._ui.scanRes_list.clear()
-
-        while len(matches):
-            if self.is_debug:
-                print(f'+= parse {len(matches)} matches')
-            for m in matches:
-                t   = m['types']
-                rt  = m['region_type']
-                mid = m['match_id']
-                val = m['value']
-
-                if t == 'unknown':
-                    continue
-                # `insert_with_valuesv` has the same function of `append`, but it's 7x faster
-                # Still 5x faster even with the extra baggage
-                addr = m['addr']
-                off  = m['off']
-                self._ui.scanRes_list.insert_with_valuesv(-1, [0, 1, 2, 3, 4, 5, 6], [addr, val, t, True, off, rt, mid])
-                # self._ui.scanRes_list.append([addr, val, t, True, off, rt, mid])
-            matches = self.send_command(f'next L{MATCH_CNT}', 4096)
+        self._ui.scanRes_list.reset(m_count, self._lsqr)
         self._ui.scanRes_tree.set_model(self._ui.scanRes_list)
-
-    # return range(r1, r2) where all rows between r1 and r2 (EXCLUSIVE) are visible
-    # return range(0, 0) if no row visible
-    def get_visible_rows(self, treeview):
-        _range = treeview.get_visible_range()
-        try:
-            r1 = _range[0][0]
-            r2 = _range[1][0] + 1
-        except:
-            r1 = r2 = 0
-        return range(r1, r2)
+        self._ui.scanRes_list.prefetch(GcUI.get_visible_rows(self._ui.scanRes_tree))
 
     # read/write data periodically
     def process_status_checker(self):
@@ -986,43 +1004,72 @@ class GameConqueror(scanmem.Scanmem):
             if misc. is_process_dead(self._cpid, self.is_debug):
                 self._cpid = ''
                 self._ui.show_error('Selected process is no longer available')
-                self._ui.scanRes_list.clear()
+                self.reload_list_matches(0)
+            else:
+                self.refresh_tree(0)
         return not self._is_exiting and self._cpid
 
+    # Rows of the cheat list are valid while their address is mapped (readable)
+    def check_cheat_list(self):
+        try:
+            if not self._maps.refresh():
+                return
+        except OSError:
+            return
+        self._ui.cheatList_list.revalidate(self._maps.readable)
+
     def refresh_tree(self, new_cnt:int):
         if True:
-            # Write to memory locked values in cheat list
-            for i in self._ui.cheatList_list:
-                if i[0] and i[5]: # locked and valid
-                    self.write_value(i[2], i[3], i[4]) # addr, typestr, value
-            # Update visible (and unlocked) cheat list rows
-            rows = self.get_visible_rows(self._ui.cheatList_tree)
-            for i in rows:
-                lock, desc, addr, typestr, value, valid = self._ui.cheatList_list[i]
-                if valid and not lock:
-                    new_value = self.read_value(addr, typestr, value, typestr)
-                    if new_value is None:
-                        self._ui.cheatList_list[i] = (False, desc, addr, typestr, '??', False)
-                    elif new_value != value and not self.cheatlist_editing:
-                        self._ui.cheatList_list[i] = (lock, desc, addr, typestr, str(new_value), valid)
-            # Update visible scanresult rows
-            rows = self.get_visible_rows(self._ui.scanRes_tree)
-            for i in rows:
-                row = self._ui.scanRes_list[i]
-                addr, cur_value, cur_type, valid = row[:4]
-                if valid:
-                    typestr = misc.TYPENAMES_S2G[cur_type.split(' ', 1)[0]]
-                    new_value = self.read_value(addr, typestr, cur_value, typestr)
-                    if new_value is not None:
-                        row[1] = str(new_value)
-                    else:
-                        row[1] = '??'
-                        row[3] = False
+            self.check_cheat_list()
+            table = self._ui.cheatList_list.table
+            # Hold locked values of the cheat list by the backend freezer
+            emsg = self.freezer.sync(table.locked_items())
+            if emsg:
+                self._ui.show_error(emsg)
+            # Read all cheat list entries and visible scanresult rows in one batch
+            groups, items = table.read_items()
+            cheat_cnt  = len(items)
+            scan_rows  = [i for i in GcUI.get_visible_rows(self._ui.scanRes_tree)
+                            if (self._ui.scanRes_list.row(i) or ScanResultModel.EMPTY_ROW)[3]]
+            for i in scan_rows:
+                addr, cur_value, cur_type = self._ui.scanRes_list.row(i)[:3]
+                items.append(self.value_item(addr, misc.TYPENAMES_S2G[cur_type.split(' ', 1)[0]], cur_value))
+            # the rows are updated when the reply comes, without blocking the UI
+            scan_rows  = [(i, self._ui.scanRes_list.row(i)[0]) for i in scan_rows]
+            self.read_many_async(items, lambda values: self.update_tree_values(groups, cheat_cnt, scan_rows, values))
+
+    # the first `cheat_cnt` values are of the cheat list `groups` (see `CheatTable.read_items()`),
+    # `scan_rows` are (row index, addr) of the next ones, rows changed meanwhile are skipped
+    def update_tree_values(self, groups:dict, cheat_cnt:int, scan_rows:list, values:list):
+        # Update cheat list entries, unless one is edited
+        if not self.cheatlist_editing:
+            self._ui.cheatList_list.update(groups, values[:cheat_cnt])
+        # Update scanresult rows
+        for (i, row_addr), new_value in zip(scan_rows, values[cheat_cnt:]):
+            row = self._ui.scanRes_list.row(i)
+            if row is None or row[0] != row_addr:
+                continue
+            new_value = self.item_value(misc.TYPENAMES_S2G[row[2].split(' ', 1)[0]], new_value)
+            if new_value is not None:
+                self._ui.scanRes_list.set_row_value(i, str(new_value))
+            else:
+                self._ui.scanRes_list.set_row_value(i, '??', False)
+
+    # (addr, size or struct) item of a batched read
+    def value_item(self, addr:str, typestr:str, val:int|str):
+        if typestr in misc.TYPESTRUCTS:
+            return (int(addr, 16), misc.TYPESTRUCTS[typestr])
+        return (int(addr, 16), int(misc.get_type_size(typestr, val)))
+
+    def item_value(self, typestr:str, data:bytes|int|float):
+        if data is None or typestr in misc.TYPESTRUCTS:
+            return data
+        return misc.bytes2value(typestr, data)
 
     def read_value(self, addr:str, in_type:str, val:int|str, out_type:str):
         size = misc.get_type_size(in_type, val)
         # ----
-        buf,emsg = self.read_memory(addr, size)
+        buf,emsg = self.read_memory(int(addr, 16) if isinstance(addr, str) else addr, int(size))
         if  emsg:
             self._ui.show_error(emsg)
         #----
@@ -1030,9 +1077,13 @@ class GameConqueror(scanmem.Scanmem):
 
     # addr could be int or str
     def write_value(self, addr:str, typestr:str, value:int|str):
-        data = self.send_command(f'write {typestr} {addr} {value}')
-        if 'error' in data:
-            self._ui.show_error(data['error'])
+        data = misc.value2bytes(typestr, str(value))
+        if data is None:
+            self._ui.show_error('Invalid value')
+            return
+        _, emsg = self.write_memory([(int(addr, 16) if isinstance(addr, str) else addr, data)])
+        if emsg:
+            self._ui.show_error(emsg)
 
     def exit(self, object, data=None):
         self.exit_cleanup()
@@ -1047,6 +1098,12 @@ if __name__ == '__main__':
     try:
         # Open socket and wait clients
         gc_instance.socket_server()
+        if misc.SNAPSHOT_DIR:
+            emsg = gc_instance.set_option('snapshot_dir', misc.SNAPSHOT_DIR)
+            if emsg:
+                print('✖︎ ERROR: '+ emsg)
+        GLib.io_add_watch(gc_instance.fileno(), GLib.PRIORITY_DEFAULT,
+                          GLib.IOCondition.IN | GLib.IOCondition.HUP, gc_instance.on_backend_reply)
         # Init user interface
         gc_instance.create_window()
         # Start
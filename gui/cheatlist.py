@@ -0,0 +1,284 @@
+"""
+    cheatlist.py: cheat list table, which keeps the entries by columns and refreshes them by type groups
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+
+from gi.repository import Gtk
+from gi.repository import GObject
+
+import misc
+from listmodel import FlatListModel
+
+# type names of the backend (see `scanmem.TYPE_NAMES`), which the type column may hold too
+TYPE_ALIASES = {
+    'i8' :'int8'   , 'i16':'int16'  , 'i32':'int32' , 'i64':'int64',
+    'f32':'float32', 'f64':'float64', 'str':'string', 'a8u':'bytearray'
+}
+
+def data_type(typestr: str):
+    """Returns our name (see `misc.TYPESIZES_G2S`) of the type shown in the cheat list"""
+    return TYPE_ALIASES.get(typestr, typestr)
+
+class TypeGroup():
+    """Rows of the entries of one type, with the raw bytes of their last read (None if not read yet)"""
+    __slots__ = ('rows', 'code', 'size', 'last')
+
+    def __init__(self, typestr: str):
+        self.rows = array('L')
+        self.last : bytes = None
+        # numbers are decoded by arrays, the struct format characters are the same
+        self.size, self.code = misc.TYPESIZES_G2S.get(typestr, (0, None))
+
+class CheatTable():
+    """
+    Entries of the cheat list @ columns: lock, desc, addr, type, value, valid
+
+    The columns are stored apart: the addresses in an array, the lock and valid flags in bytearrays.
+    Numeric entries are grouped by type, every group is decoded at once from a batched read
+    and compared with the bytes of the previous read, so that only the entries which changed
+    are formatted again. Strings and byte arrays are decoded one by one.
+    """
+    __slots__ = ('addrs', 'locks', 'valid', 'descs', 'types', 'values', '_groups')
+
+    def __init__(self):
+        self.addrs  = array('Q')
+        self.locks  = bytearray()
+        self.valid  = bytearray()
+        self.descs : list[str] = []
+        self.types : list[str] = []
+        self.values: list[str] = []
+        # type -> group, made again when the entries are moved, retyped or edited
+        self._groups: dict[str, TypeGroup] = None
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def row(self, i: int):
+        return (bool(self.locks[i]), self.descs[i], '%x' % self.addrs[i], self.types[i], self.values[i],
+                bool(self.valid[i]))
+
+    def rows(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def insert(self, i: int, desc: str, addr: int, typestr: str, value: str, lock=False, valid=True):
+        self.addrs .insert(i, addr)
+        self.locks .insert(i, lock)
+        self.valid .insert(i, valid)
+        self.descs .insert(i, desc)
+        self.types .insert(i, typestr)
+        self.values.insert(i, value)
+        self._groups = None
+
+    def remove(self, i: int):
+        for column in (self.addrs, self.locks, self.valid, self.descs, self.types, self.values):
+            del column[i]
+        self._groups = None
+
+    def clear(self):
+        for column in (self.addrs, self.locks, self.valid, self.descs, self.types, self.values):
+            del column[:]
+        self._groups = None
+
+    def set(self, i: int, lock: bool = None, desc: str = None, typestr: str = None, value: str = None,
+            valid: bool = None):
+        """Sets the given columns of the row"""
+        if desc is not None:
+            self.descs[i] = desc
+        if lock is not None:
+            self.locks[i] = lock
+        if valid is not None:
+            self.valid[i] = valid
+        if typestr is not None:
+            self.types[i] = typestr
+        if value is not None:
+            self.values[i] = value
+        if (lock, typestr, value, valid) != (None, None, None, None):
+            self._groups = None
+
+    def size(self, i: int):
+        """Size in bytes of the entry in memory"""
+        typestr = data_type(self.types[i])
+        if typestr in misc.TYPESIZES_G2S:
+            return misc.TYPESIZES_G2S[typestr][0]
+        return max(int(misc.get_type_size(typestr, self.values[i])), 1)
+
+    def locked_items(self):
+        """(addr, bytes) items of the locked and valid entries, for the freezer"""
+        items = []
+        i = self.locks.find(1)
+        while i >= 0:
+            if self.valid[i]:
+                data = misc.value2bytes(data_type(self.types[i]), self.values[i])
+                if data is not None:
+                    items.append((self.addrs[i], data))
+            i = self.locks.find(1, i + 1)
+        return items
+
+    def unlock_all(self):
+        """Unlocks all the entries, returns the rows which were locked"""
+        rows = []
+        i = self.locks.find(1)
+        while i >= 0:
+            rows.append(i)
+            i = self.locks.find(1, i + 1)
+        self.locks[:] = bytes(len(self.locks))
+        return rows
+
+    def revalidate(self, readable: callable):
+        """
+        Sets the entries valid if `readable(addr, size)`, the invalid ones are unlocked,
+        returns the rows which changed
+        """
+        rows = []
+        for i in range(len(self)):
+            valid = readable(self.addrs[i], self.size(i) if self.values[i] != '??' else 1)
+            if valid != self.valid[i]:
+                self.valid[i] = valid
+                self.locks[i] = self.locks[i] and valid
+                rows.append(i)
+        return rows
+
+    def read_items(self):
+        """
+        Returns (groups, items): the (addr, size) items to read for all the entries,
+        the values read are given to `update(groups, values)`
+        """
+        if self._groups is None:
+            self._groups = {}
+            for i, typestr in enumerate(self.types):
+                typestr = data_type(typestr)
+                if typestr not in self._groups:
+                    self._groups[typestr] = TypeGroup(typestr)
+                self._groups[typestr].rows.append(i)
+        items = []
+        for group in self._groups.values():
+            if group.code:
+                items.extend([(self.addrs[i], group.size) for i in group.rows])
+            else:
+                items.extend([(self.addrs[i], self.size(i)) for i in group.rows])
+        return (self._groups, items)
+
+    def update(self, groups: dict[str, TypeGroup], values: list[bytes]):
+        """
+        Sets the values read for the items of `read_items()` (None if they can't be read),
+        the entries which can't be read are set invalid. Locked and invalid entries are left as they are.
+        Returns the rows which changed, none if the entries changed meanwhile.
+        """
+        if groups is not self._groups:
+            return []
+        changed = []
+        pos = 0
+        for typestr, group in groups.items():
+            data = values[pos : pos + len(group.rows)]
+            pos += len(group.rows)
+            # entries which can't be read
+            if None in data:
+                for k in [k for k, d in enumerate(data) if d is None]:
+                    i = group.rows[k]
+                    if self.valid[i]:
+                        self.locks[i] = self.valid[i] = False
+                        self.values[i] = '??'
+                        changed.append(i)
+                    data[k] = bytes(group.size or 1)
+            if not group.code:
+                for i, d in zip(group.rows, data):
+                    value = str(misc.bytes2value(typestr, d))
+                    if self.valid[i] and not self.locks[i] and value != self.values[i]:
+                        self.values[i] = value
+                        changed.append(i)
+                continue
+            # decode the whole group, then format only the entries which differ from the last read
+            buf = b''.join(data)
+            if group.last is None:
+                ks = range(len(group.rows))
+            else:
+                ks = dict.fromkeys(off // group.size for off in misc.diff_offsets(group.last, buf))
+            group.last = buf
+            if not ks:
+                continue
+            numbers = array(group.code)
+            numbers.frombytes(buf)
+            for k in ks:
+                i = group.rows[k]
+                if self.valid[i] and not self.locks[i]:
+                    value = str(numbers[k])
+                    if value != self.values[i]:
+                        self.values[i] = value
+                        changed.append(i)
+        return changed
+
+class CheatListModel(FlatListModel):
+    """
+    Flat model of the cheat list @ columns: lock, desc, addr, type, value, valid
+
+    A view of a `CheatTable`: the cells are formatted when they are drawn.
+    The rows must be changed through the model, which tells its views.
+    """
+    __gtype_name__ = 'CheatListModel'
+
+    COLUMN_TYPES = (GObject.TYPE_BOOLEAN, GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_STRING,
+                    GObject.TYPE_STRING, GObject.TYPE_BOOLEAN)
+
+    def __init__(self):
+        super(CheatListModel, self).__init__()
+        self.table = CheatTable()
+
+    def __len__(self):
+        return len(self.table)
+
+    def insert(self, i: int, desc: str, addr: int, typestr: str, value: str):
+        self.table.insert(i, desc, addr, typestr, value)
+        self.row_inserted(Gtk.TreePath(i), self._iter(i))
+
+    def append(self, desc: str, addr: int, typestr: str, value: str):
+        self.insert(len(self.table), desc, addr, typestr, value)
+
+    def prepend(self, desc: str, addr: int, typestr: str, value: str):
+        self.insert(0, desc, addr, typestr, value)
+
+    def remove(self, itr: Gtk.TreeIter):
+        i = self._index(itr)
+        self.table.remove(i)
+        self.row_deleted(Gtk.TreePath(i))
+
+    def clear(self):
+        for i in reversed(range(len(self.table))):
+            self.table.remove(i)
+            self.row_deleted(Gtk.TreePath(i))
+
+    def set(self, i: int, **columns):
+        """Sets the columns of the row (see `CheatTable.set()`)"""
+        self.table.set(i, **columns)
+        self.rows_changed([i])
+
+    def unlock_all(self):
+        self.rows_changed(self.table.unlock_all())
+
+    def revalidate(self, readable: callable):
+        self.rows_changed(self.table.revalidate(readable))
+
+    def update(self, groups: dict[str, TypeGroup], values: list[bytes]):
+        self.rows_changed(self.table.update(groups, values))
+
+    def rows_changed(self, rows: list[int]):
+        for i in rows:
+            self.row_changed(Gtk.TreePath(i), self._iter(i))
+
+    def _get_row(self, i: int):
+        return self.table.row(i)
+
+GObject.type_register(CheatListModel)
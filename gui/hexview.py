@@ -26,9 +26,157 @@
 """
 
 from gi.repository import Gtk
+from gi.repository import Gdk
 from gi.repository import Pango
 from gi.repository import GObject
 from gi.repository import GLib
+from collections import OrderedDict
+
+from misc import diff_offsets
+
+# The views hold the lines in sight only: the payload is formatted by chunks
+# of lines when the view scrolls, so its size doesn't matter.
+
+class PagedBuffer():
+    """
+    Bytes of a region kept by pages of `PAGE_SIZE`, the payload of a HexView.
+
+    The missing pages are read in the background by `fetch(offset, size, callback)`,
+    which calls `callback(data)` once read (None if they can't be, short if only the first bytes can),
+    then `on_loaded(start, end, changed)` is called: `changed` are the offsets of the bytes changed
+    since the pages were read before, None if some of them weren't.
+    Only the `max_pages` pages used last are kept (all of them if 0), but the edited ones.
+
+    The bytes set are kept apart until they are taken by `take_edits()` to be written,
+    and are set again on the pages read meanwhile, which hold the bytes before the write.
+    """
+    PAGE_SIZE = 4096
+    FETCH_MAX = 16 # pages read at once
+
+    def __init__(self, size, fetch=None, max_pages=0):
+        self.size = size
+        self.fetch = fetch
+        self.max_pages = max_pages
+        self.on_loaded = None
+        self._pages = OrderedDict() # index: memoryview of the page, None if unreadable
+        self._pending = set()
+        self._gen = 0 # generation of the pages, the pages read before a `clear()` are dropped
+        self._fetches = 0 # count of the fetches
+        self._edits = {} # index: {offset in the page: byte} of the bytes set, not taken yet
+        self._taken = {} # index: (fetch count when taken, {offset in the page: byte}) of the bytes taken
+
+    @classmethod
+    def of(cls, buf):
+        """Returns the pages of a whole buffer, edited in place"""
+        mv = memoryview(buf if isinstance(buf, bytearray) else bytearray(buf))
+        pb = cls(len(mv))
+        for i in range(0, len(mv), cls.PAGE_SIZE):
+            pb._pages[i // cls.PAGE_SIZE] = mv[i:i + cls.PAGE_SIZE]
+        return pb
+
+    def __len__(self):
+        return self.size
+
+    # byte at `off`, None if it isn't known
+    def __getitem__(self, off):
+        page = self._pages.get(off // self.PAGE_SIZE)
+        return None if page is None else page[off % self.PAGE_SIZE]
+
+    def __setitem__(self, off, val):
+        i = off // self.PAGE_SIZE
+        page = self._pages.get(i)
+        if page is not None:
+            page[off % self.PAGE_SIZE] = val
+            self._edits.setdefault(i, {})[off % self.PAGE_SIZE] = val
+
+    def take_edits(self):
+        """Returns the sorted (offset, byte) items of the bytes set since the last call"""
+        items = []
+        for i, edits in sorted(self._edits.items()):
+            items.extend((i * self.PAGE_SIZE + off, val) for off, val in sorted(edits.items()))
+            # the pages being read may still hold the bytes before the write
+            self._taken[i] = (self._fetches, {**self._taken.get(i, (0, {}))[1], **edits})
+        self._edits.clear()
+        return items
+
+    def chunks(self, start, end):
+        """Returns the (data, length) chunks of the bytes [start, end), `data` is None if they aren't known"""
+        end = min(end, self.size)
+        res = []
+        while start < end:
+            i = start // self.PAGE_SIZE
+            stop = min(end, (i + 1) * self.PAGE_SIZE)
+            page = self._pages.get(i)
+            if page is not None:
+                self._pages.move_to_end(i)
+                page = page[start - i * self.PAGE_SIZE : stop - i * self.PAGE_SIZE].tobytes()
+            res.append((page, stop - start))
+            start = stop
+        return res
+
+    def load(self, start, end, reload=False):
+        """Fetches the missing pages of the bytes [start, end), all of them if `reload`"""
+        if self.fetch is None:
+            return
+        first = max(start, 0) // self.PAGE_SIZE
+        last  = (min(end, self.size) - 1) // self.PAGE_SIZE
+        want  = lambda i: i <= last and i not in self._pending and (reload or i not in self._pages)
+        run = []
+        for i in range(first, last + 2):
+            if want(i) and len(run) < self.FETCH_MAX:
+                run.append(i)
+                continue
+            if run:
+                self._pending.update(run)
+                self._fetches += 1
+                self.fetch(run[0] * self.PAGE_SIZE, min(len(run) * self.PAGE_SIZE, self.size - run[0] * self.PAGE_SIZE),
+                           lambda data, first=run[0], n=len(run), gen=self._gen, seq=self._fetches:
+                               self._loaded(first, n, data, gen, seq))
+                run = []
+            if want(i):
+                run.append(i)
+
+    def _loaded(self, first, n, data, gen, seq):
+        if gen != self._gen:
+            return
+        mv = memoryview(data) if data is not None else None
+        changed = []
+        for i in range(first, first + n):
+            self._pending.discard(i)
+            old = self._pages.get(i)
+            new = mv[(i - first) * self.PAGE_SIZE : (i - first + 1) * self.PAGE_SIZE] if mv is not None else None
+            # the data may be short (the region shrank), the pages it doesn't fully cover are unknown
+            if new is not None and len(new) != min(self.PAGE_SIZE, self.size - i * self.PAGE_SIZE):
+                new = None
+            # the bytes taken are written once read by the fetches after them
+            if i in self._taken and self._taken[i][0] < seq:
+                del self._taken[i]
+            if new is not None:
+                for edits in (self._taken.get(i, (0, {}))[1], self._edits.get(i, {})):
+                    for off, val in edits.items():
+                        new[off] = val
+            if changed is not None and old is not None and new is not None and len(old) == len(new):
+                changed.extend(i * self.PAGE_SIZE + off for off in diff_offsets(old, new))
+            elif old is not None or new is not None:
+                changed = None
+            self._pages[i] = new
+            self._pages.move_to_end(i)
+        if self.max_pages and len(self._pages) > self.max_pages:
+            drop = [i for i in self._pages if i not in self._edits][:len(self._pages) - self.max_pages]
+            for i in drop:
+                del self._pages[i]
+        if self.on_loaded:
+            self.on_loaded(first * self.PAGE_SIZE, (first + n) * self.PAGE_SIZE, changed)
+
+    def clear(self):
+        """Drops the fetched pages, which are read again"""
+        if self.fetch is None:
+            return
+        self._pages.clear()
+        self._pending.clear()
+        self._edits.clear()
+        self._taken.clear()
+        self._gen += 1
 
 class BaseText(Gtk.TextView):
     __gtype_name__ = 'BaseText'
@@ -43,8 +191,51 @@ class BaseText(Gtk.TextView):
         self.texttag = self.buffer.create_tag(None)
         self.texttag.set_property('fallback', False)
 
+    def set_lines(self, txt):
+        self.buffer.set_text('')
+        if txt:
+            self.buffer.insert_with_tags(self.buffer.get_start_iter(), txt, self.texttag)
+
+    def char_width(self):
+        ctx = self.get_pango_context()
+        font = ctx.load_font(Pango.FontDescription(self._parent.font))
+        metric = font.get_metrics(ctx.get_language())
+        return max(
+            metric.get_approximate_char_width(),
+            metric.get_approximate_digit_width()) / Pango.SCALE
+
+    def select_offset(self, off):
+        start_iter = self.buffer.get_iter_at_offset(off)
+        end_iter = start_iter.copy()
+        end_iter.forward_char()
+        self.buffer.select_range(start_iter, end_iter)
+
+    def get_insert_offset(self):
+        return self.buffer.get_iter_at_mark(self.buffer.get_insert()).get_offset()
+
+    def do_get_preferred_height(self):
+        return 0,0
+
 GObject.type_register(BaseText)
 
+# texts of one cell per byte, which give the (start, end) offsets of the cell
+# of the byte at `rel` of the lines in sight by `cell_range(rel)`
+class CellText():
+    def set_cell(self, rel, txt):
+        start, end = self.cell_range(rel)
+        start_iter = self.buffer.get_iter_at_offset(start)
+        self.buffer.delete(start_iter, self.buffer.get_iter_at_offset(end))
+        self.buffer.insert_with_tags(start_iter, txt, self.texttag)
+
+    # applies `tags[level]` to the cells of the {rel: level} `levels`, the other tags are removed
+    def set_cell_tags(self, tags, levels):
+        start_iter, end_iter = self.buffer.get_bounds()
+        for tag in tags:
+            self.buffer.remove_tag(tag, start_iter, end_iter)
+        for rel, level in levels.items():
+            start, end = self.cell_range(rel)
+            self.buffer.apply_tag(tags[level], self.buffer.get_iter_at_offset(start), self.buffer.get_iter_at_offset(end))
+
 class OffsetText(BaseText):
     __gtype_name__ = 'OffsetText'
 
@@ -52,7 +243,6 @@ class OffsetText(BaseText):
         super(OffsetText, self).__init__(parent)
         self.off_len = 1
         self.connect('button-press-event', self.__on_button_press)
-        self.connect('realize', self.__on_realize)
 
         self.set_cursor_visible(False)
         self.texttag.set_property('weight', Pango.Weight.BOLD)
@@ -60,494 +250,370 @@ class OffsetText(BaseText):
     def __on_button_press(self, widget, evt):
         return True
 
-    def __on_realize(self, widget):
-        """
-        TODO
-        self.modify_base(Gtk.StateType.NORMAL, self.get_style().dark[Gtk.StateType.NORMAL])
-        """
-        return True
-
-    def render(self, txt):
-        self.buffer.set_text('')
+    # offsets of the lines of `length` bytes from the `top` one
+    def render(self, top, length):
         base_addr = self._parent.base_addr
         bpl = self._parent.bpl
-        tot_lines = int(len(txt) / bpl)
+        tot_lines = (length + bpl - 1) // bpl
 
-        if len(txt) % bpl != 0:
-            tot_lines += 1
-
-        self.off_len = len('%x'%(base_addr+len(txt),))
-        output = []
-
-        for i in range(tot_lines):
-            output.append(("%0" + str(self.off_len) + "x") % (base_addr + i*bpl))
-
-        if output:
-            self.buffer.insert_with_tags(
-                self.buffer.get_end_iter(),
-                "\n".join(output),
-                self.texttag
-            )
+        self.set_lines("\n".join(
+            "%0*x" % (self.off_len, base_addr + (top + i) * bpl) for i in range(tot_lines)
+        ))
 
     def do_get_preferred_width(self):
-        ctx = self.get_pango_context()
-        font = ctx.load_font(Pango.FontDescription(self._parent.font))
-        metric = font.get_metrics(ctx.get_language())
-        char_width_pango = max(
-            metric.get_approximate_char_width(),
-            metric.get_approximate_digit_width()) / Pango.SCALE
-
-        w = char_width_pango * self.off_len
-        w += 2
-
-        return w,w 
-
-    def do_get_preferred_height(self):
-        return 0,0
+        w = self.char_width() * self.off_len + 2
+        return w,w
 
-class AsciiText(BaseText):
+class AsciiText(CellText, BaseText):
     __gtype_name__ = 'AsciiText'
     _printable = \
         "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!\"#$%" \
         "&'()*+,-./:;<=>?@[\]^_`{|}~ "
+    # bytes.translate() table of the chars shown for the bytes, dots for the unprintable ones
+    _table = bytes(c if 0x20 <= c < 0x7f else 0x2e for c in range(256))
 
     def __init__(self, parent):
         super(AsciiText, self).__init__(parent)
         self.connect('key-press-event', self.__on_key_press)
         self.connect('button-release-event', self.__on_button_release)
-        self.connect_after('move-cursor', self.__on_move_cursor)
-        self.prev_start = None
-        self.prev_end = None
-        """
-        TODO
-        self.texttag.set_property(
-            'background-gdk',
-            self.get_style().text_aa[Gtk.StateType.NORMAL]
-        )
-        """
-    def __on_move_cursor(self, textview, step_size, count, extend_selection, data=None):
-        buffer = self.get_buffer()
-        insert_mark = buffer.get_insert()
-        insert_iter = buffer.get_iter_at_mark(insert_mark)
-        insert_off = insert_iter.get_offset()
-        if not extend_selection:
-            if count > 0:
-                # try to move forward
-                if insert_iter.is_end() or \
-                   step_size != Gtk.MovementStep.VISUAL_POSITIONS:
-                    # at end or line down: stay
-                    insert_iter.backward_char()
-                else:
-                    # move forward
-                    if (insert_off+1) % (self._parent.bpl+1) == 0:
-                        insert_iter.forward_char()
-            elif count < 0:
-                # try to move backward
-                if not insert_iter.is_start() and \
-                   step_size == Gtk.MovementStep.VISUAL_POSITIONS:
-                    # move backward (at start or line up: stay)
-                    if (insert_off+1) % (self._parent.bpl+1) == 1:
-                        insert_iter.backward_char()
-                    insert_iter.backward_char()
-            # set end always to one char in front of start
-            end_iter = insert_iter.copy()
-            end_iter.forward_char()
-            # select one char
-            buffer.select_range(insert_iter, end_iter)
-        return True
 
     def __on_key_press(self, widget, evt, data=None):
+        if self._parent.move_cursor(evt, self):
+            return True
         if not self._parent.editable:
             return False
         c = evt.keyval
         if c < 256 and (chr(c) in AsciiText._printable):
-            buffer = self.get_buffer()
-            bounds = buffer.get_selection_bounds()
-            if bounds and (bounds[1].get_offset() - bounds[0].get_offset() > 1):
-                self.select_a_char()
-            else:
-                iter = buffer.get_iter_at_mark(buffer.get_insert())
-                off = iter.get_offset()
-                org_off = off - int(off / (self._parent.bpl + 1))
-                self._parent.emit('char-changed', org_off, c)
-                self.select_a_char(buffer.get_iter_at_offset(off+1))
+            off = self._parent.cursor
+            self._parent.edit_byte(off, c)
+            self._parent.set_cursor(off + 1)
             return True
         return False
 
     def __on_button_release(self, widget, event, data=None):
-        buffer = self.get_buffer()
-        bounds = buffer.get_selection_bounds()
-        if (not bounds) or (bounds[1].get_offset() - bounds[0].get_offset() == 1):
-            self.select_a_char()
+        line, col = divmod(self.get_insert_offset(), self._parent.bpl + 1)
+        self._parent.set_cursor_at(line, min(col, self._parent.bpl - 1))
         # return False in order to let other handler handle it
         return False
 
-    # we want at least one char is selected all the time
-    def select_a_char(self, insert_iter = None):
-        buffer = self.get_buffer()
-        if insert_iter is None:
-            insert_iter = buffer.get_iter_at_mark(buffer.get_insert())
-        insert_off = insert_iter.get_offset()
-        if (insert_off+1) % (self._parent.bpl+1) == 0:
-            if insert_iter.is_end():
-                end_iter = insert_iter.copy()
-                insert_iter.backward_char()
-            else:
-                insert_iter.forward_char()
-                end_iter = insert_iter.copy()
-                end_iter.forward_char()
-        else:
-            end_iter = insert_iter.copy()
-            end_iter.forward_char()
-        buffer.select_range(insert_iter, end_iter)
-        self.scroll_to_iter(insert_iter, 0, False, 0, 0)
+    # byte at `rel` of the lines in sight
+    def select_byte(self, rel, nibble=0):
+        self.select_offset(rel + rel // self._parent.bpl)
 
-    def render(self, txt):
-        self.buffer.set_text('')
+    def cell_range(self, rel):
+        off = rel + rel // self._parent.bpl
+        return off, off + 1
 
+    # `chunks` of PagedBuffer.chunks(), the unknown bytes are blank
+    def render(self, chunks):
         bpl = self._parent.bpl
-        tot_lines = int(len(txt) / bpl)
-
-        if len(txt) % bpl != 0:
-            tot_lines += 1
+        chars = ''.join(data.translate(AsciiText._table).decode('ascii') if data is not None else ' ' * n
+                        for data,n in chunks)
 
-        output = []
-
-        convert = lambda i: "".join(
-            [chr(x) if (chr(x) in AsciiText._printable) else ('.') for x in list(i)])
-
-        for i in range(tot_lines):
-            if i * bpl + bpl > len(txt):
-                output.append(
-                    convert(txt[i * bpl:])
-                )
-            else:
-                output.append(
-                    convert(txt[i * bpl:(i * bpl) + bpl])
-                )
-
-        if output:
-            self.buffer.insert_with_tags(
-                self.buffer.get_end_iter(),
-                "\n".join(output),
-                self.texttag
-            )
+        self.set_lines("\n".join(
+            chars[i:i + bpl] for i in range(0, len(chars), bpl)
+        ))
 
     def do_get_preferred_width(self):
-        ctx = self.get_pango_context()
-        font = ctx.load_font(Pango.FontDescription(self._parent.font))
-        metric = font.get_metrics(ctx.get_language())
-        char_width_pango = max(
-            metric.get_approximate_char_width(),
-            metric.get_approximate_digit_width()) / Pango.SCALE
-
-        w = char_width_pango * self._parent.bpl
-        w += 2
-
+        w = self.char_width() * self._parent.bpl + 2
         return w,w
 
-    def do_get_preferred_height(self):
-        return 0,0
-
-    # start and end are offset to the original text
-    def select_blocks(self, start=None, end=None):
-        if not start and not end:
-            # deselect
-            if self.prev_start and self.prev_end and \
-               self.prev_start != self.prev_end:
-
-                self.buffer.remove_tag(self.texttag,
-                                       self.buffer.get_iter_at_mark(self.prev_start),
-                                       self.buffer.get_iter_at_mark(self.prev_end))
-
-                self.buffer.delete_mark(self.prev_start)
-                self.prev_start = None
-                self.buffer.delete_mark(self.prev_end)
-                self.prev_end = None
-            return
-
-        bpl = self._parent.bpl
-        start += start/bpl
-        end += end/bpl
-
-        if self.prev_start and self.prev_end:
-            if self.buffer.get_iter_at_mark(self.prev_start).get_offset() == start \
-               and self.buffer.get_iter_at_mark(self.prev_end).get_offset() == end:
-                # nothing to do
-                return
-            else:
-                # remove old selection
-                self.buffer.remove_tag(self.texttag,
-                                       self.buffer.get_iter_at_mark(self.prev_start),
-                                       self.buffer.get_iter_at_mark(self.prev_end))
-
-        # apply new selection
-        start_iter = self.buffer.get_iter_at_offset(start)
-        end_iter = self.buffer.get_iter_at_offset(end)
-
-        self.buffer.apply_tag(self.texttag, start_iter, end_iter)
-        if self.prev_start:
-            self.buffer.move_mark(self.prev_start, start_iter)
-        else:
-            self.prev_start = self.buffer.create_mark(None, start_iter, True)
-        if self.prev_end:
-            self.buffer.move_mark(self.prev_end, end_iter)
-        else:
-            self.prev_end = self.buffer.create_mark(None, end_iter, False)
-
 
-class HexText(BaseText):
+class HexText(CellText, BaseText):
     __gtype_name__ = 'HexText'
     _hexdigits = '0123456789abcdefABCDEF'
 
     def __init__(self, parent):
         super(HexText, self).__init__(parent)
-        self.connect('realize', self.__on_realize)
         self.connect('button-release-event', self.__on_button_release)
         self.connect('key-press-event', self.__on_key_press)
-        self.connect_after('move-cursor', self.__on_move_cursor)
-
-        self.prev_start = None
-        self.prev_end = None
-        """
-        TODO
-        self.texttag.set_property(
-            'background-gdk',
-            self.get_style().mid[Gtk.StateType.NORMAL]
-        )
-        """
 
     def __on_key_press(self, widget, evt, data=None):
+        if self._parent.move_cursor(evt, self):
+            return True
         if not self._parent.editable:
             return False
         char = evt.keyval
         if char < 256 and (chr(char) in HexText._hexdigits):
-            buffer = self.get_buffer()
-            bounds = buffer.get_selection_bounds()
-            if bounds and (bounds[1].get_offset() - bounds[0].get_offset() > 1):
-                self.select_a_char()
+            off = self._parent.cursor
+            nibble = self._parent.nibble
+            digit = int(chr(char), 16)
+            val = self._parent.payload[off]
+            if val is None: # not read
+                return True
+            if nibble == 0:
+                val = (digit << 4) | (val & 0x0f)
             else:
-                c = chr(char).upper()
-                iter = buffer.get_iter_at_mark(buffer.get_insert())
-                off = iter.get_offset()
-                pos = off % 3
-                org_off = int(off / 3)
-                txt = buffer.get_text(
-                        buffer.get_iter_at_offset(org_off*3),
-                        buffer.get_iter_at_offset(org_off*3+2),
-                        True)
-                if pos < 2:
-                    l = list(txt)
-                    l[pos] = c
-                    self._parent.emit('char-changed', org_off, int(''.join(l),16))
-                    self.select_a_char(buffer.get_iter_at_offset(off+1))
+                val = (val & 0xf0) | digit
+            self._parent.edit_byte(off, val)
+            self._parent.set_cursor(off + nibble, 1 - nibble)
             return True
         return False
 
-
     def __on_button_release(self, widget, event, data=None):
-        buffer = self.get_buffer()
-        bounds = buffer.get_selection_bounds()
-        if (not bounds) or (bounds[1].get_offset() - bounds[0].get_offset() == 1):
-            self.select_a_char()
+        line, col = divmod(self.get_insert_offset(), self._parent.bpl * 3)
+        self._parent.set_cursor_at(line, col // 3, min(col % 3, 1))
         # return False in order to let other handler handle it
         return False
 
-    # we want at least one char is selected all the time
-    def select_a_char(self, insert_iter = None):
-        buffer = self.get_buffer()
-        if insert_iter is None:
-            insert_iter = buffer.get_iter_at_mark(buffer.get_insert())
-        insert_off = insert_iter.get_offset()
-        if insert_off % 3 == 2:
-            if insert_iter.is_end():
-                end_iter = insert_iter.copy()
-                insert_iter.backward_char()
-            else:
-                insert_iter.forward_char()
-                end_iter = insert_iter.copy()
-                end_iter.forward_char()
-        else:
-            end_iter = insert_iter.copy()
-            end_iter.forward_char()
-        buffer.select_range(insert_iter, end_iter)
-        self.scroll_to_iter(insert_iter, 0, False, 0, 0)
-
-    def __on_move_cursor(self, textview, step_size, count, extend_selection, data=None):
-        buffer = self.get_buffer()
-        insert_mark = buffer.get_insert()
-        insert_iter = buffer.get_iter_at_mark(insert_mark)
-        insert_off = insert_iter.get_offset()
-        if not extend_selection:
-            if count > 0:
-                # try to move forward
-                if insert_iter.is_end() or \
-                   step_size != Gtk.MovementStep.VISUAL_POSITIONS:
-                    # at end or line down: stay
-                    insert_iter.backward_char()
-                else:
-                    # move forward
-                    if insert_off % 3 == 2:
-                        insert_iter.forward_char()
-            elif count < 0:
-                # try to move backward
-                if not insert_iter.is_start() and \
-                   step_size == Gtk.MovementStep.VISUAL_POSITIONS:
-                    # move backward (at start or line up: stay)
-                    if insert_off % 3 == 0:
-                        insert_iter.backward_char()
-                    insert_iter.backward_char()
-            # set end always to one char in front of start
-            end_iter = insert_iter.copy()
-            end_iter.forward_char()
-            # select one char
-            buffer.select_range(insert_iter, end_iter)
-        return True
+    # digit `nibble` of the byte at `rel` of the lines in sight
+    def select_byte(self, rel, nibble=0):
+        self.select_offset(rel * 3 + nibble)
 
-    def __on_realize(self, widget):
-        """
-        TODO
-        self.modify_base(Gtk.StateType.NORMAL, self.get_style().mid[Gtk.StateType.NORMAL])
-        """
-        return True
-
-    def render(self, txt):
-        self.buffer.set_text('')
+    def cell_range(self, rel):
+        return rel * 3, rel * 3 + 2
 
+    # `chunks` of PagedBuffer.chunks(), the unknown bytes are ??
+    def render(self, chunks):
         bpl = self._parent.bpl
-        tot_lines = int(len(txt) / bpl)
-
-        if len(txt) % bpl != 0:
-            tot_lines += 1
+        digits = ' '.join(data.hex(' ').upper() if data is not None else ' '.join(['??'] * n)
+                          for data,n in chunks)
+        width = bpl * 3
 
-        output = []
-        convert = lambda x: '%02X'%(x,)
-
-        for i in range(tot_lines):
-            if i * bpl + bpl > len(txt):
-                output.append(
-                    " ".join(map(convert, txt[i * bpl:]))
-                )
-            else:
-                output.append(
-                    " ".join(map(convert, txt[i * bpl:(i * bpl) + bpl]))
-                )
-
-        if output:
-            self.buffer.insert_with_tags(
-                self.buffer.get_end_iter(),
-                "\n".join(output).upper(),
-                self.texttag
-            )
+        self.set_lines("\n".join(
+            digits[i:i + width - 1] for i in range(0, len(digits), width)
+        ))
 
     def do_get_preferred_width(self):
-        ctx = self.get_pango_context()
-        font = ctx.load_font(Pango.FontDescription(self._parent.font))
-        metric = font.get_metrics(ctx.get_language())
-        char_width_pango = max(
-            metric.get_approximate_char_width(),
-            metric.get_approximate_digit_width()) / Pango.SCALE
-
-        w = char_width_pango * self._parent.bpl * 3
-        w += 2
+        w = self.char_width() * self._parent.bpl * 3 + 2
         return w,w
 
-    def do_get_preferred_height(self):
-        return 0,0
-
-    # start and end are offset to the original text
-    def select_blocks(self, start=None, end=None):
-        if not start and not end:
-            # deselect
-            if self.prev_start and self.prev_end and \
-               self.prev_start != self.prev_end:
-                self.buffer.remove_tag(self.texttag,
-                                       self.buffer.get_iter_at_mark(self.prev_start),
-                                       self.buffer.get_iter_at_mark(self.prev_end))
-
-                self.buffer.delete_mark(self.prev_start)
-                self.prev_start = None
-                self.buffer.delete_mark(self.prev_end)
-                self.prev_end = None
-            return
-
-        start *= 3
-        end = end * 3 -1
-        
-        if self.prev_start and self.prev_end:
-            if self.buffer.get_iter_at_mark(self.prev_start).get_offset() == start \
-               and self.buffer.get_iter_at_mark(self.prev_end).get_offset() == end:
-                return
-            else:
-                # remove old selection
-                self.buffer.remove_tag(self.texttag,
-                                       self.buffer.get_iter_at_mark(self.prev_start),
-                                       self.buffer.get_iter_at_mark(self.prev_end))
-
-        start_iter = self.buffer.get_iter_at_offset(start)
-        end_iter = self.buffer.get_iter_at_offset(end)
-
-        self.buffer.apply_tag(self.texttag, start_iter, end_iter)
-        if self.prev_start:
-            self.buffer.move_mark(self.prev_start, start_iter)
-        else:
-            self.prev_start = self.buffer.create_mark(None, start_iter, True)
-        if self.prev_end:
-            self.buffer.move_mark(self.prev_end, end_iter)
-        else:
-            self.prev_end = self.buffer.create_mark(None, end_iter, False)
-
 class HexView(Gtk.Box):
     __gtype_name__ = 'HexView'
     __gsignals__ = {
-        'char-changed' : (GObject.SignalFlags.RUN_LAST, GObject.TYPE_BOOLEAN, (int,int))
+        # (offset, bytes) of the contiguous ranges edited, to write at once
+        'bytes-changed' : (GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (GObject.TYPE_PYOBJECT,))
     }
 
+    EDIT_DELAY_MS = 400 # edits are committed once the keys pause that long
+
+    PAGES_AHEAD = 4 # pages read ahead of the scroll
+    # backgrounds of the bytes changed by the last auto refreshes, fading
+    HIGHLIGHTS = ['#ffb74d', '#ffcc80', '#ffe0b2', '#fff3e0']
+    # colors of the bytes by number of changes seen: 1+, 4+, 16+, 64+
+    HEAT_COLORS = ['#1565c0', '#6a1b9a', '#c62828', '#ff1744']
+
     def __init__(self):
         super(HexView, self).__init__(homogeneous=False, spacing=4)
         self.set_border_width(4)
+        self.set_size_request(-1, 128)
 
         self._bpl = 16
         self._font = "Monospace 10"
-        self._payload = ""
+        self._payload = PagedBuffer(0)
         self._base_addr = 0;
+        self._top = 0    # first line in sight
+        self._rows = 1   # lines in sight
+        self._cursor = 0 # offset of the selected byte
+        self._nibble = 0 # selected digit of the byte in the hex view
+        self._ages = {}  # offset: auto refreshes since the byte changed
+        self._heat = {}  # page index: bytearray of the changes seen of its bytes
+        self._auto_ms = 0
+        self._auto_src = 0
+        self._edit_src = 0
         self.editable = False
 
+        # the adjustment counts lines
         self.vadj = Gtk.Adjustment()
         self.vscroll = Gtk.Scrollbar.new(Gtk.Orientation.VERTICAL, self.vadj)
-
+        self.vadj.connect('value-changed', self.__on_value_changed)
 
         self.offset_text = OffsetText(self)
         self.hex_text = HexText(self)
         self.ascii_text = AsciiText(self)
 
-        self.offset_text.set_vadjustment(self.vadj)
-        self.hex_text.set_vadjustment(self.vadj)
-        self.ascii_text.set_vadjustment(self.vadj)
-
-        self.hex_text.buffer.connect('mark-set', self.__on_hex_change)
-        self.ascii_text.buffer.connect('mark-set', self.__on_ascii_change)
-
-        def scroll(widget):
-            widget.set_size_request(-1, 128)
-            frame = Gtk.ScrolledWindow.new(None, self.vadj)
-#            frame.set_shadow_type(Gtk.ShadowType.IN)
-            frame.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.NEVER)
-            frame.add(widget)
-            frame.connect('scroll-event', self.__on_scroll_event)
-            return frame
-
-        self.pack_start(scroll(self.offset_text), expand=False, fill=False, padding=0)
-        self.pack_start(scroll(self.hex_text), expand=False, fill=False, padding=0)
-        self.pack_start(scroll(self.ascii_text), expand=False, fill=False, padding=0)
+        for view in (self.offset_text, self.hex_text, self.ascii_text):
+            view.connect('scroll-event', self.__on_scroll_event)
+            view.connect('focus-out-event', self.__on_focus_out)
+            self.pack_start(view, expand=False, fill=True, padding=0)
+        self._hl_tags = {}
+        self._heat_tags = {}
+        for view in (self.hex_text, self.ascii_text):
+            self._hl_tags[view] = [view.buffer.create_tag(None, background=c) for c in HexView.HIGHLIGHTS]
+            self._heat_tags[view] = [view.buffer.create_tag(None, foreground=c) for c in HexView.HEAT_COLORS]
         self.pack_end(self.vscroll, False, False, 0)
 
-#        self.connect('char-changed', self.do_char_changed)
+        self.connect('size-allocate', self.__on_size_allocate)
+
+    def __on_focus_out(self, widget, event, data=None):
+        self.commit()
+        return False
 
     def __on_scroll_event(self, widget, event, data=None):
         self.vscroll.emit('scroll-event', event.copy())
         return True
 
+    def __on_value_changed(self, adj):
+        if int(adj.get_value()) != self._top:
+            self.repaint()
+
+    def __on_size_allocate(self, widget, allocation):
+        line_h = self.offset_text.create_pango_layout('0').get_pixel_size()[1]
+        rows = max(1, (allocation.height - 2 * self.get_border_width()) // max(line_h, 1))
+        if rows != self._rows:
+            self._rows = rows
+            # don't change the texts while allocating their size
+            GLib.idle_add(self.update_lines)
+
+    # number of lines of the payload
+    def get_lines(self):
+        return (len(self._payload) + self._bpl - 1) // self._bpl
+
+    def update_lines(self):
+        top = min(self._top, max(self.get_lines() - self._rows, 0))
+        self.vadj.configure(top, 0, self.get_lines(), 1, self._rows, self._rows)
+        self.repaint()
+
+    # formats the lines in sight
+    def repaint(self):
+        forward = int(self.vadj.get_value()) >= self._top
+        self._top = int(self.vadj.get_value())
+        start = self._top * self._bpl
+        end = start + self._rows * self._bpl
+        chunks = self._payload.chunks(start, end)
+
+        self.offset_text.render(self._top, sum(n for data,n in chunks))
+        self.hex_text.render(chunks)
+        self.ascii_text.render(chunks)
+        if self._ages or self._heat:
+            self.retag()
+        self.select_cursor()
+        # read the pages in sight, and the next ones in the direction of the scroll
+        ahead = HexView.PAGES_AHEAD * PagedBuffer.PAGE_SIZE
+        if forward:
+            self._payload.load(start, end + ahead)
+        else:
+            self._payload.load(start - ahead, end)
+
+    def __on_loaded(self, start, end, changed):
+        top = self._top * self._bpl
+        bottom = top + self._rows * self._bpl
+        if changed is None:
+            if start < bottom and end > top:
+                self.repaint()
+            return
+        # only the cells of the changed bytes are painted again
+        shown = False
+        for off in changed:
+            self._ages[off] = 0
+            heat = self._heat.setdefault(off // PagedBuffer.PAGE_SIZE, bytearray(PagedBuffer.PAGE_SIZE))
+            heat[off % PagedBuffer.PAGE_SIZE] = min(heat[off % PagedBuffer.PAGE_SIZE] + 1, 255)
+            if top <= off < bottom:
+                val = self._payload[off]
+                self.hex_text.set_cell(off - top, '%02X' % val)
+                self.ascii_text.set_cell(off - top, chr(AsciiText._table[val]))
+                shown = True
+        if shown:
+            self.retag()
+            self.select_cursor()
+
+    # highlights of the bytes in sight changed lately, and colors of their heat
+    def retag(self):
+        top = self._top * self._bpl
+        end = min(top + self._rows * self._bpl, len(self._payload))
+        ages = {off - top: age for off, age in self._ages.items() if top <= off < end}
+        heats = {}
+        page_size = PagedBuffer.PAGE_SIZE
+        for i in range(top // page_size, (end - 1) // page_size + 1):
+            heat = self._heat.get(i)
+            if heat is None:
+                continue
+            start = max(top, i * page_size)
+            counts = heat[start - i * page_size : min(end, (i + 1) * page_size) - i * page_size]
+            for off in diff_offsets(bytes(len(counts)), counts):
+                heats[start - top + off] = min((counts[off].bit_length() - 1) // 2, len(HexView.HEAT_COLORS) - 1)
+        for view in (self.hex_text, self.ascii_text):
+            view.set_cell_tags(self._hl_tags[view], ages)
+            view.set_cell_tags(self._heat_tags[view], heats)
+
+    def __on_auto_refresh(self):
+        if self.get_mapped():
+            self.commit()
+            # the highlights fade, then the bytes in sight are read again
+            self._ages = {off: age + 1 for off, age in self._ages.items() if age + 1 < len(HexView.HIGHLIGHTS)}
+            start = self._top * self._bpl
+            self._payload.load(start, start + self._rows * self._bpl, reload=True)
+            self.retag()
+        return True
+
+    def get_auto_refresh(self):
+        return self._auto_ms
+    def set_auto_refresh(self, ms):
+        """Reads the bytes in sight every `ms` milliseconds, highlighting the changes (0 to stop)"""
+        if self._auto_src:
+            GLib.source_remove(self._auto_src)
+            self._auto_src = 0
+        self._auto_ms = ms
+        if ms:
+            self._auto_src = GLib.timeout_add(ms, self.__on_auto_refresh)
+        else:
+            self._ages.clear()
+            self.retag()
+
+    def reload(self):
+        """Reads the pages of the payload again"""
+        self.commit()
+        self._payload.clear()
+        self.repaint()
+
+    def select_cursor(self):
+        rel = self._cursor - self._top * self._bpl
+        if 0 <= rel < min(self._rows * self._bpl, len(self._payload) - self._top * self._bpl):
+            self.hex_text.select_byte(rel, self._nibble)
+            self.ascii_text.select_byte(rel)
+
+    # select the byte at `off`, scroll to it if needed
+    def set_cursor(self, off, nibble=0):
+        if not len(self._payload):
+            return
+        self._cursor = min(max(off, 0), len(self._payload) - 1)
+        self._nibble = nibble if self._cursor == off else 0
+        line = self._cursor // self._bpl
+        if line < self._top:
+            self.vadj.set_value(line)
+        elif line >= self._top + self._rows:
+            self.vadj.set_value(line - self._rows + 1)
+        self.select_cursor()
+
+    # select the byte at `col` of the `line` in sight
+    def set_cursor_at(self, line, col, nibble=0):
+        self.set_cursor((self._top + line) * self._bpl + col, nibble)
+
+    # handles the keys moving the cursor in `view`
+    def move_cursor(self, evt, view):
+        key = Gdk.keyval_name(evt.keyval)
+        ctrl = evt.state & Gdk.ModifierType.CONTROL_MASK
+        off = self._cursor
+        bpl = self._bpl
+
+        if key == 'Left':
+            if view is self.hex_text and self._nibble:
+                self.set_cursor(off, 0)
+            else:
+                self.set_cursor(off - 1, 1 if view is self.hex_text and off else 0)
+        elif key == 'Right':
+            if view is self.hex_text and not self._nibble:
+                self.set_cursor(off, 1)
+            else:
+                self.set_cursor(off + 1)
+        elif key == 'Up':
+            self.set_cursor(off - bpl if off >= bpl else off, self._nibble)
+        elif key == 'Down':
+            self.set_cursor(off + bpl if off + bpl < len(self._payload) else off, self._nibble)
+        elif key == 'Page_Up':
+            self.set_cursor(max(off - self._rows * bpl, off % bpl), self._nibble)
+        elif key == 'Page_Down':
+            self.set_cursor(off + self._rows * bpl, self._nibble)
+        elif key == 'Home':
+            self.set_cursor(0 if ctrl else off - off % bpl)
+        elif key == 'End':
+            self.set_cursor(len(self._payload) - 1 if ctrl else off - off % bpl + bpl - 1)
+        elif key in ('Return', 'KP_Enter'):
+            self.commit()
+        else:
+            return False
+        return True
+
     # scroll to the addr
     # select the byte at addr
     # set focus
@@ -555,66 +621,71 @@ class HexView(Gtk.Box):
         GLib.idle_add(self.show_addr_helper, addr)
 
     def show_addr_helper(self, addr):
-        off = addr - self._base_addr
-        off *= 3
-
-        buf = self.hex_text.get_buffer()
-        off_iter = buf.get_iter_at_offset(off)
-
-        self.hex_text.scroll_to_iter(off_iter, 0, True, 0, 0)
-        iter2 = off_iter.copy()
-        iter2.forward_char()
-        buf.select_range(off_iter, iter2)
+        line = (addr - self._base_addr) // self._bpl
+        if not self._top <= line < self._top + self._rows:
+            # in the middle of the view
+            self.vadj.set_value(max(line - self._rows // 2, 0))
+        self.set_cursor(addr - self._base_addr)
         self.hex_text.grab_focus()
 
     def get_current_addr(self):
-        buf = self.hex_text.get_buffer()
-        buf_iter = buf.get_iter_at_mark(buf.get_insert())
-        off = buf_iter.get_offset()
-        return off//3 + self._base_addr
+        return self._cursor + self._base_addr
+
+    def get_cursor(self):
+        return self._cursor
+
+    def get_nibble(self):
+        return self._nibble
 
     def do_realize(self):
         Gtk.Box.do_realize(self)
         # set font
         self.modify_font(self._font)
 
-
-    def __on_hex_change(self, buffer, iter, mark):
-        return True
-
-    def __on_ascii_change(self, buffer, iter, mark):
-        return True
-
-    def do_char_changed(self, offset, charval):
-        hex_buffer = self.hex_text.get_buffer()
-        ascii_buffer = self.ascii_text.get_buffer()
-        # set text
-        # set hex
-        iter1 = hex_buffer.get_iter_at_offset(offset * 3)
-        iter2 = hex_buffer.get_iter_at_offset(offset * 3 + 2)
-        hex_buffer.delete(iter1, iter2)
-        hex_buffer.insert(iter1, '%02X'%(charval,))
-        # set ascii
-        iter1 = ascii_buffer.get_iter_at_offset(offset + offset / self._bpl)
-        iter2 = ascii_buffer.get_iter_at_offset(offset + offset / self._bpl + 1)
-        ascii_buffer.delete(iter1, iter2)
-        char = chr(charval)
-        ascii_buffer.insert(iter1, (char in AsciiText._printable and char or '.'))
-        return True
+    # edits the byte at `offset` of the payload, which is committed later
+    def edit_byte(self, offset, charval):
+        if self._payload[offset] is None: # not read
+            return
+        self._payload[offset] = charval
+        # paint the cell of the byte
+        rel = offset - self._top * self._bpl
+        if 0 <= rel < self._rows * self._bpl:
+            self.hex_text.set_cell(rel, '%02X' % charval)
+            self.ascii_text.set_cell(rel, chr(AsciiText._table[charval]))
+        if self._edit_src:
+            GLib.source_remove(self._edit_src)
+        self._edit_src = GLib.timeout_add(HexView.EDIT_DELAY_MS, self.commit)
+
+    def commit(self):
+        """Emits 'bytes-changed' with the ranges of the bytes edited since the last commit"""
+        if self._edit_src:
+            GLib.source_remove(self._edit_src)
+            self._edit_src = 0
+        edits = []
+        for off, val in self._payload.take_edits():
+            if edits and edits[-1][0] + len(edits[-1][1]) == off:
+                edits[-1][1].append(val)
+            else:
+                edits.append((off, bytearray([val])))
+        if edits:
+            self.emit('bytes-changed', [(off, bytes(data)) for off, data in edits])
+        return False
 
     def get_payload(self):
         return self._payload
+    # a PagedBuffer, or a buffer edited in place
     def set_payload(self, val):
-        self._payload = val
-
-        for view in {self.offset_text, self.hex_text, self.ascii_text}:
-            # Invalidate previous iters
-            if hasattr(view, 'prev_start'):
-                view.prev_start = None
-            if hasattr(view, 'prev_end'):
-                view.prev_end = None
-
-            view.render(self._payload)
+        if isinstance(val, str):
+            val = val.encode()
+        self.commit()
+        self._payload.on_loaded = None
+        self._payload = val if isinstance(val, PagedBuffer) else PagedBuffer.of(val)
+        self._payload.on_loaded = self.__on_loaded
+        self._ages.clear()
+        self._heat.clear()
+        self._cursor = min(self._cursor, max(len(self._payload) - 1, 0))
+        self.update_offset_len()
+        self.update_lines()
 
     def get_font(self):
         return self._font
@@ -634,39 +705,44 @@ class HexView(Gtk.Box):
     def set_bpl(self, val):
         self._bpl = val
         # Redraw!
-        self.payload = self.payload
+        for view in {self.hex_text, self.ascii_text}:
+            view.queue_resize()
+        self.update_lines()
+
+    def update_offset_len(self):
+        off_len = len('%x'%(self._base_addr + len(self._payload),))
+        if off_len != self.offset_text.off_len:
+            self.offset_text.off_len = off_len
+            self.offset_text.queue_resize()
 
     def get_base_addr(self):
         return self._base_addr
     def set_base_addr(self, val):
         self._base_addr = val
-        view = self.offset_text
-        # Invalidate previous iters
-        if hasattr(view, 'prev_start'):
-            view.prev_start = None
-        if hasattr(view, 'prev_end'):
-            view.prev_end = None
-
-        view.render(self._payload)
+        self.update_offset_len()
+        self.offset_text.render(self._top, min(self._rows * self._bpl, len(self._payload) - self._top * self._bpl))
 
 
     payload = property(get_payload, set_payload)
     font = property(get_font, modify_font)
     bpl = property(get_bpl, set_bpl)
     base_addr = property(get_base_addr, set_base_addr)
+    auto_refresh = property(get_auto_refresh, set_auto_refresh)
+    cursor = property(get_cursor)
+    nibble = property(get_nibble)
 
 GObject.type_register(HexView)
 
 if __name__ == "__main__":
-    def char_changed_handler(hexview, offset, charval):
-        #print 'handler:','%X' % (offset,), chr(charval), '%02X' % (charval,)
-        return False
+    def bytes_changed_handler(hexview, edits):
+        #print('handler:', ['%X:%s' % (offset, data.hex()) for offset,data in edits])
+        pass
     w = Gtk.Window()
     w.resize(500,500)
     view = HexView()
     view.payload = "Woo welcome this is a simple read/only HexView widget for PacketManipulator"*16
     view.base_addr = 0x6fff000000000000;
-#    view.connect('char-changed', char_changed_handler)
+#    view.connect('bytes-changed', bytes_changed_handler)
     view.editable = True
     w.add(view)
     w.show_all()
@@ -0,0 +1,107 @@
+"""
+    listmodel.py: base of the flat tree models, which are drawn from the rows of a python container
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from gi.repository import Gtk
+from gi.repository import GObject
+
+class FlatListModel(GObject.Object, Gtk.TreeModel):
+    """
+    Flat model of `COLUMN_TYPES` columns, the iters hold the row index
+
+    Subclasses give the row count by `__len__()` and the cells of a row by `_get_row(i)`,
+    and change `_stamp` when the iters they gave become outdated.
+    """
+    __gtype_name__ = 'FlatListModel'
+
+    COLUMN_TYPES = ()
+
+    def __init__(self):
+        super(FlatListModel, self).__init__()
+        self._stamp = 1
+
+    def __len__(self):
+        return 0
+
+    def _get_row(self, i: int):
+        """Returns the cells of the row `i`, by column"""
+        raise NotImplementedError
+
+    def _iter(self, i: int):
+        itr = Gtk.TreeIter()
+        itr.stamp = self._stamp
+        itr.user_data = i
+        return itr
+
+    def _index(self, itr: Gtk.TreeIter):
+        return itr.user_data or 0
+
+    # Gtk.TreeModel interface
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(self.COLUMN_TYPES)
+
+    def do_get_column_type(self, n: int):
+        return self.COLUMN_TYPES[n]
+
+    def do_get_iter(self, path: Gtk.TreePath):
+        i = path.get_indices()[0]
+        if i < len(self):
+            return (True, self._iter(i))
+        return (False, None)
+
+    def do_get_path(self, itr: Gtk.TreeIter):
+        return Gtk.TreePath(self._index(itr))
+
+    def do_get_value(self, itr: Gtk.TreeIter, column: int):
+        return self._get_row(self._index(itr))[column]
+
+    def do_iter_next(self, itr: Gtk.TreeIter):
+        i = self._index(itr) + 1
+        if i < len(self):
+            itr.user_data = i
+            return (True, itr)
+        return (False, None)
+
+    def do_iter_previous(self, itr: Gtk.TreeIter):
+        i = self._index(itr) - 1
+        if i >= 0:
+            itr.user_data = i
+            return (True, itr)
+        return (False, None)
+
+    def do_iter_children(self, parent: Gtk.TreeIter):
+        if parent is None and len(self):
+            return (True, self._iter(0))
+        return (False, None)
+
+    def do_iter_has_child(self, itr: Gtk.TreeIter):
+        return False
+
+    def do_iter_n_children(self, itr: Gtk.TreeIter):
+        return len(self) if itr is None else 0
+
+    def do_iter_nth_child(self, parent: Gtk.TreeIter, n: int):
+        if parent is None and n < len(self):
+            return (True, self._iter(n))
+        return (False, None)
+
+    def do_iter_parent(self, child: Gtk.TreeIter):
+        return (False, None)
+
+GObject.type_register(FlatListModel)
@@ -19,7 +19,7 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import os, struct, platform, locale
+import os, pwd, struct, platform, locale, bisect
 
 SEARCH_SCOPE_NAMES = ['Basic', 'Normal', 'ReadOnly', 'Full']
 
@@ -41,6 +41,8 @@ TYPESIZES_G2S = {
     'int32':(4,'i'), 'uint32':(4,'I'), 'float32':(4,'f'),
     'int64':(8,'q'), 'uint64':(8,'Q'), 'float64':(8,'d')
 }
+# precompiled converters for the types above
+TYPESTRUCTS = { k: struct.Struct(v[1]) for k,v in TYPESIZES_G2S.items() }
 # convert type names used by scanmem into ours
 TYPENAMES_S2G = {
     'I8' :'int8' ,'I8s' :'int8' ,'I8u' :'uint8',
@@ -56,6 +58,8 @@ DOMAIN_TRS = os.environ['SCANMEM_DOMAIN_TS']
 LOCALE_DIR = os.environ['SCANMEM_LOCALEDIR']
 SMUSER_CFG = os.environ['SCANMEM_USER_CFG']
 APP_UI_DIR = os.environ['SCANMEM_UI_DIR']
+# files of the snapshots (`?` scans) instead of the memory, if set
+SNAPSHOT_DIR = os.environ.get('SCANMEM_SNAPSHOT_DIR', '')
 
 # exported from a bash script
 def parse_env_args():
@@ -66,10 +70,8 @@ def get_ui_xml_path(tk: str):
     """ Returns the interface file path for a given toolkit. """
     return os.path.join(APP_UI_DIR, f'{tk}.interface.gameconqueror.xml')
 
-PROGRESS_WATCH_MS = 100   # for scan progress updates
 LIVE_CHECKER_MS   = 2500  # for read(update)/write(lock)
-HEXEDIT_SPAN_MAX  = 1024  # hexview half-height
-SCAN_RESULT_LIMIT = 10000 # maximal number of entries that can be displayed
+HEXEDIT_CACHE_PAGES = 4096 # pages of a region kept by the memory editor
 
 # In some locale, ',' is used in float numbers
 locale.setlocale(locale.LC_NUMERIC, 'C')
@@ -180,7 +182,7 @@ def get_type_size(data_type: str, data: list[int] | str | int):
 # parse bytes dumped by scanmem into number, string, etc.
 def bytes2value(data_type: str, data: list[int]):
     if  data_type in TYPESIZES_G2S:
-        return struct.unpack(TYPESIZES_G2S[data_type][1], bytes(data))[0]
+        return TYPESTRUCTS[data_type].unpack(bytes(data))[0]
     elif data_type == 'string':
         return bytes(data).decode(errors='replace')
     elif data_type == 'bytearray':
@@ -188,6 +190,40 @@ def bytes2value(data_type: str, data: list[int]):
     else:
         return None if data_type is None else data
 
+# encode the value as it's stored in memory, None if it can't be
+def value2bytes(data_type: str, value: str):
+    try:
+        if  data_type in TYPESIZES_G2S:
+            num = eval_operand(value)
+            if data_type.startswith('float'):
+                return TYPESTRUCTS[data_type].pack(float(num))
+            # wrap negative numbers and fill unsigned ones
+            num = int(num) & ((1 << TYPESIZES_G2S[data_type][0] * 8) - 1)
+            return TYPESTRUCTS[data_type if data_type[0] == 'u' else 'u'+ data_type].pack(num)
+        elif data_type == 'string':
+            return value.encode()
+        elif data_type == 'bytearray':
+            return bytes.fromhex(value)
+    except (ValueError, struct.error):
+        pass
+    return None
+
+# bytes.translate() table marking the non-zero bytes
+_NONZERO = bytes(1 if c else 0 for c in range(256))
+
+# return the offsets of the bytes which differ between the buffers `old` and `new` of the same size
+def diff_offsets(old: bytes, new: bytes):
+    if old == new:
+        return []
+    # compare all the bytes at once, then find the non-zero ones of the xor
+    mask = (int.from_bytes(old, 'little') ^ int.from_bytes(new, 'little')).to_bytes(len(new), 'little').translate(_NONZERO)
+    res = []
+    i = mask.find(1)
+    while i >= 0:
+        res.append(i)
+        i = mask.find(1, i + 1)
+    return res
+
 # return negative if unknown
 def get_pointer_width():
     bits = platform.architecture()[0]
@@ -200,37 +236,176 @@ def get_pointer_width():
             pass
     return -1
 
-def read_proc_maps(pid: int | str):
-    maps = []
-    for line in open(f'/proc/{pid}/maps').readlines():
-        info = line.split(' ', 5)
-        start, end = [int(h,16) for h in info[0].split('-')]
-        maps.append({
-            'start_addr': start,
-            'end_addr'  : end,
-            'flags'     : info[1],
-            'offset'    : info[2],
-            'dev'       : info[3],
-            'inode'     : int(info[4]),
-            'pathname'  : '' if len(info) < 6 else info[5].lstrip(), # don't use strip
-            'size'      : end - start
-        })
-    return maps
-
-def get_process_list(exclude_usr: str = 'root'):
-    for proc in os.popen('ps -wweo pid=,user:16=,command= --sort=-pid').readlines():
-        tok = proc.split(maxsplit=2)
-        pid = tok[0].strip()
-        usr = tok[1].strip() if len(tok) >= 2 else '<???>'
-        exe = tok[2].strip() if len(tok) >= 3 else ''
-        if exclude_usr and (usr == exclude_usr):
-            continue
+class MapsRegion():
+    """A region of /proc/{pid}/maps, `type` is one of `scanmem.REGION_TYPES` (as the backend labels it)"""
+    __slots__ = ('start_addr', 'end_addr', 'flags', 'offset', 'dev', 'inode', 'pathname', 'type')
+
+    @property
+    def size(self):
+        return self.end_addr - self.start_addr
+
+class ProcMaps():
+    """
+    Index of the regions of /proc/{pid}/maps, which the kernel lists by address:
+    `find()` bisects their start addresses, `refresh()` reads the file again
+    but parses it only if its content changed.
+    """
+    __slots__ = ('pid', 'regions', '_starts', '_digest')
+
+    def __init__(self, pid: int | str = ''):
+        self.pid = pid
+        self.regions: list[MapsRegion] = []
+        self._starts: list[int] = []
+        self._digest = None
+        if pid:
+            self.refresh()
+
+    def refresh(self):
+        """Returns True if the regions changed, raises OSError if the maps can't be read"""
+        with open(f'/proc/{self.pid}/maps', 'rb') as f:
+            data = f.read()
+        digest = (len(data), hash(data))
+        if digest == self._digest:
+            return False
+        self._digest = digest
+        try:
+            exe = os.readlink(f'/proc/{self.pid}/exe')
+        except OSError:
+            exe = ''
+        self.regions = []
+        # same detection of the ELF files as the backend (see `sm_readmaps()`):
+        # the regions from the executable one of a file are its code, with its .bss
+        code_regions = exe_regions = prev_end = 0
+        binname, is_exe = '', False
+        for line in data.decode(errors='replace').splitlines():
+            info = line.split(' ', 5)
+            r = MapsRegion()
+            r.start_addr, r.end_addr = [int(h,16) for h in info[0].split('-')]
+            r.flags    = info[1]
+            r.offset   = info[2]
+            r.dev      = info[3]
+            r.inode    = int(info[4])
+            r.pathname = '' if len(info) < 6 else info[5].lstrip() # don't use strip
+            if code_regions > 0:
+                if (r.flags[2] == 'x' or code_regions >= 4 or
+                        r.pathname != binname and (r.pathname or r.start_addr != prev_end)):
+                    code_regions, is_exe = 0, False
+                    if exe_regions > 1:
+                        exe_regions = 0
+                else:
+                    code_regions += 1
+                    exe_regions  += is_exe
+            if code_regions == 0:
+                if r.flags[2] == 'x' and r.pathname:
+                    code_regions, binname = 1, r.pathname
+                    if r.pathname == exe:
+                        exe_regions, is_exe = 1, True
+                elif exe_regions == 1 and r.pathname and r.pathname == exe:
+                    exe_regions += 1
+                    code_regions, binname, is_exe = exe_regions, r.pathname, True
+            prev_end = r.end_addr
+            if is_exe:
+                r.type = 'exe'
+            elif code_regions > 0:
+                r.type = 'code'
+            else:
+                r.type = {'[heap]': 'heap', '[stack]': 'stack'}.get(r.pathname, 'misc')
+            self.regions.append(r)
+        self._starts = [r.start_addr for r in self.regions]
+        return True
+
+    def find(self, addr: int):
+        """Returns the region of `addr`, None if it isn't mapped"""
+        i = bisect.bisect_right(self._starts, addr) - 1
+        if i >= 0 and addr < self.regions[i].end_addr:
+            return self.regions[i]
+        return None
+
+    def readable(self, addr: int, size: int = 1):
+        """Whether the `size` bytes at `addr` are in a readable region"""
+        while size > 0:
+            r = self.find(addr)
+            if r is None or r.flags[0] != 'r':
+                return False
+            size -= r.end_addr - addr
+            addr  = r.end_addr
+        return True
+
+    def label(self, addr: int):
+        """Returns a description of the region of `addr`: type, range, flags and pathname"""
+        r = self.find(addr)
+        if r is None:
+            return ''
+        return f'{r.type} {r.start_addr:x}-{r.end_addr:x} {r.flags} {r.pathname}'.rstrip()
+
+    def __iter__(self):
+        return iter(self.regions)
+
+class ProcessList():
+    """
+    Processes of /proc as (pid, user, command) rows, by pid: `update()` lists /proc
+    and reads only the processes which appeared since the previous update.
+    """
+    __slots__ = ('exclude_usr', '_procs', '_users')
+
+    def __init__(self, exclude_usr: str = 'root'):
+        self.exclude_usr = exclude_usr
+        self._procs: dict[int, int] = {} # pid: inode of /proc/{pid}, changed for a new process
+        self._users: dict[int, str] = {} # uid: user name
+
+    def user_name(self, uid: int):
+        if uid not in self._users:
+            try:
+                self._users[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self._users[uid] = str(uid)
+        return self._users[uid]
+
+    def read_process(self, pid: int):
+        """Returns the (pid, user, command) row of a process, None if it exited"""
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                exe = f.read().rstrip(b'\0').replace(b'\0', b' ').decode(errors='replace')
+            with open(f'/proc/{pid}/status') as f:
+                name = uid = None
+                for line in f:
+                    if line.startswith('Name:'):
+                        name = line[len('Name:'):].strip()
+                    elif line.startswith('Uid:'):
+                        uid = int(line.split()[2]) # effective uid, as `ps` shows
+                        break
+        except (OSError, ValueError, IndexError):
+            return None
         # process name may be empty, but not the name of the executable
         if not exe:
-            exelink = os.path.join('/proc',pid,'exe')
-            if os.path.exists(exelink):
-                exe = os.path.realpath(exelink)
-        yield (int(pid), usr, exe)
+            exelink = f'/proc/{pid}/exe'
+            exe = os.path.realpath(exelink) if os.path.exists(exelink) else f'[{name}]'
+        return (pid, '<???>' if uid is None else self.user_name(uid), exe)
+
+    def update(self):
+        """
+        Returns the pids of the processes gone since the previous update,
+        and a generator of the rows of the new ones (by decreasing pid)
+        """
+        procs = {}
+        with os.scandir('/proc') as it:
+            for entry in it:
+                if entry.name.isdigit():
+                    procs[int(entry.name)] = entry.inode()
+        gone  = {pid for pid,ino in self._procs.items() if procs.get(pid) != ino}
+        added = sorted((pid for pid,ino in procs.items() if self._procs.get(pid) != ino), reverse=True)
+        self._procs = {pid: ino for pid,ino in self._procs.items() if pid not in gone}
+        return gone, self._read_rows([(pid, procs[pid]) for pid in added])
+
+    # the processes are known once read, those of an unfinished generator are new again
+    def _read_rows(self, procs: list[tuple[int, int]]):
+        for pid, ino in procs:
+            row = self.read_process(pid)
+            if row is None:
+                continue
+            self._procs[pid] = ino
+            if not (self.exclude_usr and row[1] == self.exclude_usr):
+                yield row
 
 def is_process_dead(pid: int | str, dbg_mode: bool):
     is_running = False
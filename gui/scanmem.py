@@ -19,7 +19,8 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import os, re, tempfile, socket, json
+import os, socket, json, struct, time
+from collections import OrderedDict
 
 SOCK_PATH = os.environ['SCANMEM_SOCKET'] # /tmp/scanmem-X.X~dev-socket
 
@@ -27,56 +28,472 @@ FIND_MATCH = ['eq', 'lt', 'gt', 'ne', 'le', 'ge', 'ic', 'dc']
 TYPE_NAMES = ['i8', 'i16', 'i32', 'i64', 'f32', 'f64', 'str', 'a8u']
 TYPE_SIZES = [1, 2, 4, 8, 4, 8, 0, 0]
 
+# every request and reply is a frame: request id + length of the payload (host byte order) + payload,
+# the reply has the id of its request
+FRAME_HDR = struct.Struct('=IQ')
+# id of the events pushed by the backend, never used by requests
+EVENT_ID = 0
+# bytes received at once from the socket
+RECV_CHUNK = 65536
+# `list` reply: number of records, record size, match count of the last scan, then the records
+MATCH_HDR = struct.Struct('=IIQ')
+# match id, region id, addr, offset in the region, match flags (or length), region type, padding;
+# the value bytes follow (record size - MATCH_REC.size)
+MATCH_REC = struct.Struct('=IIQQHBx')
+REGION_TYPES = ['misc', 'code', 'exe', 'heap', 'stack']
+# the reads of the target memory go through a cache of its pages (see `PageCache`)
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+PAGE_CACHE_MAX = 512 # pages kept at most
+PAGE_CACHE_TTL_MS = 1000 # age of the pages read again
+PAGE_CACHE_SPAN = 16 # pages of the largest read kept, larger ones are dumped
+# number flags of a match (see `match_flags` in value.h) by width, the longest first:
+# (signed, unsigned, float), scanmem type names and struct formats of the value
+MATCH_FLAGS = [
+    ((0x80, 0x40, 0x200), 'I64', 'q', 'Q', 'F64', 'd'),
+    ((0x20, 0x10, 0x100), 'I32', 'i', 'I', 'F32', 'f'),
+    ((0x08, 0x04, 0x000), 'I16', 'h', 'H', '', ''),
+    ((0x02, 0x01, 0x000), 'I8' , 'b', 'B', '', '')
+]
+
+_match_types_cache : dict[int, tuple[str, struct.Struct]] = {}
+
+def match_types(flags: int):
+    """Returns (types_str, struct.Struct of the longest type) of the match flags, (types_str, None) if no number"""
+    if flags not in _match_types_cache:
+        names = []; fmt = ''
+        for (s, u, f), iname, ifmt, ufmt, fname, ffmt in MATCH_FLAGS:
+            if flags & s and flags & u:
+                names.append(iname); fmt = fmt or ifmt
+            elif flags & s or flags & u:
+                names.append(iname +('s' if flags & s else 'u')); fmt = fmt or (ifmt if flags & s else ufmt)
+            if flags & f:
+                names.append(fname); fmt = fmt or ffmt
+        _match_types_cache[flags] = (' '.join(names) or 'unknown', struct.Struct('='+ fmt) if fmt else None)
+    return _match_types_cache[flags]
+
+def list_query(sort: str = '', addr: tuple[int, int] = None, region: str = '', value: tuple[float, float] = None):
+    """
+    Returns the sort key and filters of `list`, applied by the backend to all matches:
+    `sort` is 'addr', 'value' or 'region' ('-' prefixed for the descending order),
+    `addr` is a (start, end) range (end excluded), `region` one of `REGION_TYPES`,
+    `value` is a (min, max) range of the numbers, the matches of a snapshot are refused
+    """
+    query = []
+    if sort:
+        query.append(f'sort:{sort}')
+    if addr:
+        query.append(f'addr:{addr[0]:x}:{addr[1]:x}')
+    if region:
+        query.append(f'region:{region}')
+    if value:
+        query.append(f'value:{value[0]!r}:{value[1]!r}')
+    return ' '.join(query)
+
+class FreezeTable():
+    """
+    Values held by the backend, which writes them back to the target memory
+    every `period` ms by its own timer thread.
+    The table of the backend is only changed here, so that it stays the same as the mirror,
+    which is changed once the backend accepted the change.
+    """
+
+    def __init__(self, sm: 'Scanmem'):
+        self._sm = sm
+        self._items : dict[int, bytes] = {} # mirror of the backend table
+        self._period: int = -1
+
+    def _send(self, cmd: str, key: str):
+        data = self._sm.send_command(cmd)
+        if 'error' in data:
+            return (0, data['error'])
+        return (data[key], '')
+
+    def add(self, items: list[tuple[int, bytes]]):
+        """Adds (or replaces) (addr, bytes) items, returns (number of items written, emsg)"""
+        if not items:
+            return (0, '')
+        for a,b in items:
+            self._sm.pages.invalidate(a, len(b))
+        res = self._send('lock add '+ ' '.join(f'{a:x}:{b.hex()}' for a,b in items), 'written')
+        if not res[1]:
+            self._items.update(items)
+        return res
+
+    def remove(self, addrs: list[int]):
+        """Returns (number of items removed, emsg)"""
+        if not addrs:
+            return (0, '')
+        res = self._send('lock remove '+ ' '.join(f'{a:x}' for a in addrs), 'removed')
+        if not res[1]:
+            for a in addrs:
+                self._items.pop(a, None)
+        return res
+
+    def clear(self):
+        res = self._send('lock clear', 'lock_count')
+        if not res[1]:
+            self._items.clear()
+        return res
+
+    def write(self, items: list[tuple[int, bytes]]):
+        """
+        Writes (addr, bytes) items and makes the table hold exactly them, if the table
+        holds them already, the backend just re-applies it.
+        Returns (number of items written, emsg)
+        """
+        new = dict(items)
+        if not new and not self._items:
+            return (0, '')
+        for a,b in new.items():
+            self._sm.pages.invalidate(a, len(b))
+        if new == self._items:
+            return self._send('writev', 'written')
+        res = self._send(' '.join(['writev ='] + [f'{a:x}:{b.hex()}' for a,b in new.items()]), 'written')
+        if not res[1]:
+            self._items = new
+        return res
+
+    def sync(self, items: list[tuple[int, bytes]]):
+        """
+        Makes the table hold exactly `items`, only the differences are sent to the backend.
+        Returns emsg
+        """
+        new = dict(items)
+        _,erem = self.remove([a for a in self._items if a not in new])
+        _,eadd = self.add([(a,b) for a,b in new.items() if self._items.get(a) != b])
+        return erem or eadd
+
+    def list(self):
+        """Returns a list of (addr, bytes, written) items as held by the backend"""
+        data = self._sm.send_command('lock list')
+        if 'error' in data:
+            return []
+        self._period = data['period_ms']
+        return [(int(i['addr'], 16), bytes.fromhex(i['bytes']), i['written']) for i in data['locks']]
+
+    def reset(self):
+        """Forgets the items, the backend drops its table with the target process"""
+        self._items.clear()
+
+    @property
+    def period(self):
+        if self._period < 0:
+            self.list()
+        return self._period
+
+    @period.setter
+    def period(self, ms: int):
+        """Sets the writing period (1 ms to 60 s), 0 stops the timer"""
+        data = self._sm.send_command(f'lock period {int(ms)}')
+        if 'error' not in data:
+            self._period = data['period_ms']
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, addr: int):
+        return addr in self._items
+
+class PageCache():
+    """
+    Pages of the target memory read lately, shared by the reads of all the views:
+    they are keyed by (pid, page address), read again once older than `ttl_ms`,
+    the least recently used are dropped past `max_pages`, and so are those written by us.
+    """
+
+    def __init__(self, sm: 'Scanmem'):
+        self._sm = sm
+        self._pages : OrderedDict[tuple[str, int], tuple[float, bytes]] = OrderedDict() # key => (time, data)
+        self.ttl_ms   : int = PAGE_CACHE_TTL_MS
+        self.max_pages: int = PAGE_CACHE_MAX
+
+    def _keys(self, addr: int, size: int):
+        pid = self._sm._cpid
+        return [(pid, p) for p in range(addr - addr % PAGE_SIZE, addr + max(size, 1), PAGE_SIZE)]
+
+    def lookup(self, items: list[tuple[int, int|struct.Struct]]):
+        """Returns ({key: data} of the cached pages of the (addr, size or struct) items, [keys of the others])"""
+        oldest = time.monotonic() - self.ttl_ms / 1000
+        pages = {}; missing = []
+        for addr, fmt in items:
+            for key in self._keys(addr, fmt if isinstance(fmt, int) else fmt.size):
+                if key in pages or key in missing:
+                    continue
+                when, data = self._pages.get(key, (oldest, None))
+                if when > oldest:
+                    self._pages.move_to_end(key)
+                    pages[key] = data
+                else:
+                    self._pages.pop(key, None)
+                    missing.append(key)
+        return (pages, missing)
+
+    def read_cmd(self, keys: list[tuple[str, int]]):
+        """Returns the `read` command of the pages"""
+        return b'read ' + b' '.join(b'%x:%i' % (p, PAGE_SIZE) for _,p in keys)
+
+    def store(self, keys: list[tuple[str, int]], frame: bytearray):
+        """Keeps the pages of the `read` reply, returns {key: data} (an unreadable page is empty, all of them if the reply is not a full frame)"""
+        now = time.monotonic()
+        if len(frame) != (4 + PAGE_SIZE) * len(keys):
+            return dict.fromkeys(keys, b'')
+        pages = {}
+        pos = 4 * len(keys)
+        for key, nread in zip(keys, struct.unpack_from(f'={len(keys)}I', frame)):
+            pages[key] = bytes(frame[pos:pos+nread])
+            self._pages[key] = (now, pages[key])
+            pos += PAGE_SIZE
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return pages
+
+    def values(self, pages: dict, items: list[tuple[int, int|struct.Struct]]):
+        """Returns the bytes (or the unpacked value for a Struct) of every item, None if not in the `pages`"""
+        vals = []
+        for addr, fmt in items:
+            size = fmt if isinstance(fmt, int) else fmt.size
+            data = [pages.get(k, b'') for k in self._keys(addr, size)]
+            if any(len(d) != PAGE_SIZE for d in data[:-1]):
+                vals.append(None)
+                continue
+            data = b''.join(data)[addr % PAGE_SIZE:][:size]
+            if len(data) != size:
+                vals.append(None)
+            elif isinstance(fmt, int):
+                vals.append(data)
+            else:
+                vals.append(fmt.unpack(data)[0])
+        return vals
+
+    def invalidate(self, addr: int, size: int):
+        """Drops the pages of `size` bytes at `addr`, which are read again"""
+        for key in self._keys(addr, size):
+            self._pages.pop(key, None)
+
+    def clear(self):
+        self._pages.clear()
+
 class Scanmem():
     """Wrapper for libscanmem."""
 
     def __init__(self, pid = '', debug_mode = False):
         self._serv : socket.socket = None
         self._cpid : str = pid
+        self._rbuf = bytearray() # received data not yet dispatched
+        self._next_id : int = 1
+        self._pending : dict[int, callable] = {} # request id => callback of pipelined requests
+        self._replies : dict[int, bytearray] = {} # request id => payload of waited requests
+        self._events  : dict[str, list[callable]] = {} # event name => subscribers
+        self.freezer = FreezeTable(self)
+        self.pages = PageCache(self)
         # public flags
         self.is_debug  : bool = debug_mode
         self.num_signed: bool = True
         self.match_type: int  = 0 # equal
         self.scan_scope: int  = 1 # Normal
         self.scan_type : int  = 2 # Int32
+        self.scan_align: int  = 1 # any address, 0 for the size of the type (see `option scan_alignment`)
         # private flags
         self._is_firstRun = True
         self._is_scanning = False
         self._is_waiting = False
         self._is_exiting = False # currently for data_worker only, other 'threads' may also use this flag
 
-    def read_memory(self, addr: int, nb: int):
+    def read_memory(self, addr: int, nb: int, fresh: bool = False):
         """
-        Execute command using libscanmem.
-        This function is NOT thread safe, send only one command at a time.
-        
-        cmd: command to run
-        raw_out: if True, return in a string what libscanmem would print to stdout
+        Reads `nb` bytes of the target memory at `addr` through the `pages` cache
+        (`fresh` reads them again anyway).
+
+        Larger reads (or partly readable ones) are dumped: the backend replies in-band with a binary frame,
+        which payload is received straight into the returned bytearray.
         """
-        tmp_name = emsg = ''
+        if fresh:
+            self.pages.invalidate(addr, nb)
+        if nb <= PAGE_CACHE_SPAN * PAGE_SIZE:
+            pages, missing = self.pages.lookup([(addr, nb)])
+            if missing:
+                pages.update(self.pages.store(missing, self._request(self.pages.read_cmd(missing))))
+            data = self.pages.values(pages, [(addr, nb)])[0]
+            if data is not None:
+                return self._dump_reply(bytearray(data))
+        return self._dump_reply(self._request(b'dump %x %i' % (addr, nb)))
 
-        with tempfile.NamedTemporaryFile(suffix='-dmem') as tmp_file:
-            tmp_name = tmp_file.name
+    def read_memory_async(self, addr: int, nb: int, callback: callable, fresh: bool = False):
+        """Same as `read_memory()`, but doesn't wait, `callback(mbuf, emsg)` gets the result"""
+        if fresh:
+            self.pages.invalidate(addr, nb)
+        def on_pages(pages: dict):
+            data = self.pages.values(pages, [(addr, nb)])[0]
+            if data is not None:
+                callback(*self._dump_reply(bytearray(data)))
+            else:
+                self._request_async(b'dump %x %i' % (addr, nb), lambda buf: callback(*self._dump_reply(buf)))
+        if nb <= PAGE_CACHE_SPAN * PAGE_SIZE:
+            self._read_pages_async([(addr, nb)], on_pages)
+        else:
+            on_pages({})
 
-        data = self.send_command('dump %x %i %s' % (addr, nb, tmp_name))
-        mbuf : bytes = None
+    def _dump_reply(self, mbuf: bytearray):
+        if not mbuf:
+            return (None, 'Cannot access target memory')
+        return (mbuf, '')
 
-        if 'error' in data:
-            emsg : str = data['error']
-        elif data['total_readed'] == 0:
-            emsg : str = 'Cannot access target memory'
+    def _read_pages_async(self, items: list[tuple[int, int|struct.Struct]], callback: callable):
+        """Calls `callback(pages)` with the pages of the items, at once if all of them are cached"""
+        pages, missing = self.pages.lookup(items)
+        if not missing:
+            callback(pages)
         else:
-            with open(tmp_name, mode='rb') as dump_file:
-                ____ = dump_file.seek(0)
-                mbuf = dump_file.read()
-        return (mbuf, emsg)
+            self._request_async(self.pages.read_cmd(missing),
+                                lambda frame: callback({**pages, **self.pages.store(missing, frame)}))
 
-    def send_command(self, cmd: str, cap = 1024):
+    def read_many(self, items: list[tuple[int, int|struct.Struct]]):
+        """
+        Reads several locations of the target memory, the pages which aren't in the `pages` cache in one request.
+        `items` is a list of (addr, size) or (addr, struct.Struct) pairs,
+        returns a list with bytes (or the unpacked value for a Struct) for every item,
+        None if the item can't be read fully.
+        """
+        if not items:
+            return []
+        pages, missing = self.pages.lookup(items)
+        if missing:
+            pages.update(self.pages.store(missing, self._request(self.pages.read_cmd(missing))))
+        return self.pages.values(pages, items)
+
+    def read_many_async(self, items: list[tuple[int, int|struct.Struct]], callback: callable):
+        """Same as `read_many()`, but doesn't wait, `callback(values)` gets the result"""
+        if not items:
+            callback([])
+        else:
+            self._read_pages_async(items, lambda pages: callback(self.pages.values(pages, items)))
+
+    def write_memory(self, items: list[tuple[int, bytes]]):
+        """Writes (addr, bytes) items to the target memory once, returns (number of items written, emsg)"""
+        if not items:
+            return (0, '')
+        for a,b in items:
+            self.pages.invalidate(a, len(b))
+        data = self.send_command(' '.join(['write'] + [f'{a:x}:{b.hex()}' for a,b in items]))
+        if 'error' in data:
+            return (0, data['error'])
+        return (data['written'], '')
+
+    def write_many(self, items: list[tuple[int, bytes]]):
+        """
+        Writes (addr, bytes) items to the target memory and keeps them in the lock table
+        of the `freezer` (replacing its items), see `FreezeTable.write()`.
+        Returns (number of items written, emsg)
+        """
+        return self.freezer.write(items)
+
+    def _send_frame(self, cmd: bytes):
+        """Sends the command frame, returns its request id"""
+        rid = self._next_id
+        self._next_id = rid % 0xffffffff + 1 # id 0 is never used by requests
+        self._serv.sendall(FRAME_HDR.pack(rid, len(cmd)) + cmd)
+        return rid
+
+    def _request(self, cmd: bytes):
+        """
+        Sends the command and waits for its reply, returns the payload (empty if the connection was closed).
+        Replies of pipelined requests received meanwhile are dispatched to their callbacks.
+        """
+        rid = self._send_frame(cmd)
+        while rid not in self._replies:
+            if not self._recv_frames(block=True):
+                return bytearray()
+        return self._replies.pop(rid)
+
+    def _request_async(self, cmd: bytes, callback: callable):
+        """Sends the command without waiting, `callback(payload)` is called by `dispatch_replies()`"""
+        self._pending[self._send_frame(cmd)] = callback
+
+    def dispatch_replies(self):
+        """
+        Dispatches the replies available on the socket without blocking,
+        to be called by the main loop when the socket is readable (see `fileno()`).
+        Returns False if the connection was closed.
+        """
+        return self._recv_frames(block=False)
+
+    def fileno(self):
+        return self._serv.fileno()
+
+    def _recv_frames(self, block: bool):
+        try:
+            chunk = self._serv.recv(RECV_CHUNK, 0 if block else socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return True
+        if not chunk:
+            return False
+        self._rbuf += chunk
+        while len(self._rbuf) >= FRAME_HDR.size:
+            rid, size = FRAME_HDR.unpack_from(self._rbuf)
+            end = FRAME_HDR.size + size
+            if len(self._rbuf) >= end:
+                data = self._rbuf[FRAME_HDR.size:end]
+                del self._rbuf[:end]
+            elif block:
+                # a large payload is received straight into its buffer
+                data = bytearray(size)
+                have = len(self._rbuf) - FRAME_HDR.size
+                data[:have] = self._rbuf[FRAME_HDR.size:]
+                self._rbuf.clear()
+                if self._recv_into(memoryview(data)[have:]) != size - have:
+                    return False
+            else:
+                break
+            callback = self._pending.pop(rid, None)
+            if rid == EVENT_ID:
+                self._dispatch_event(data)
+            elif callback:
+                callback(data)
+            else:
+                self._replies[rid] = data
+        return True
+
+    def subscribe(self, event: str, callback: callable):
+        """
+        Calls `callback(dat)` with the JSON object of every `event` pushed by the backend:
+        `progress` while scanning and `done` when the scan is over, both carry
+        `scan_progress`, `match_count`, `syscalls` and `read_bytes` (reads of the target memory),
+        `stopped`, `snapshot` (the matches can't be sorted or filtered yet) and `ok` (False if the scan command failed)
+        """
+        self._events.setdefault(event, []).append(callback)
+
+    def _dispatch_event(self, buf: bytearray):
+        dat = self._json_reply('event', buf)
+        for callback in self._events.get(dat.get('event'), []):
+            callback(dat)
+
+    def _recv_into(self, view: memoryview):
+        """
+        Fills the whole `view` from the socket, returns the number of received bytes
+        (less than the view size only if the connection was closed)
+        """
+        pos = 0
+        while pos < len(view):
+            n = self._serv.recv_into(view[pos:])
+            if n == 0:
+                break
+            pos += n
+        return pos
+
+    def send_command(self, cmd: str):
         """
         Sends commands to the backend via UNIX socket and receives JSON objects in response
 
-        """ ; self._serv.sendall(cmd.encode() + b'\0')
-        buf = self._serv.recv(cap)
+        """ ; return self._json_reply(cmd, self._request(cmd.encode()))
+
+    def send_command_async(self, cmd: str, callback: callable):
+        """
+        Sends the command without waiting for the reply, commands can be pipelined,
+        `callback(dat)` gets the JSON object when `dispatch_replies()` receives it
+        """
+        self._request_async(cmd.encode(), lambda buf: callback(self._json_reply(cmd, buf)))
+
+    def _json_reply(self, cmd: str, buf: bytearray):
         try:
             dat = json.loads(buf)
         except Exception as e:
@@ -91,15 +508,21 @@ class Scanmem():
         ------
 
         """  ; self._is_scanning = True
-        data = self.send_command(f'find {FIND_MATCH[self.match_type]}:{TYPE_NAMES[self.scan_type]} {val}')
+        data = self.send_command(f'find {FIND_MATCH[self.match_type]}:{TYPE_NAMES[self.scan_type]}@{self.scan_align} {val}')
         emsg = ''
         if 'error' in data:
             emsg : str = data['error']
         return (not self._is_firstRun, emsg)
 
     def get_scan_progress(self):
+        return self._scan_progress(self.send_command('info'))
+
+    def get_scan_progress_async(self, callback: callable):
+        """`callback(emsg, pgss, mcnt)` gets the result"""
+        self.send_command_async('info', lambda data: callback(*self._scan_progress(data)))
+
+    def _scan_progress(self, data: dict):
         pgss = 0.0; mcnt = 0
-        data = self.send_command('info')
         emsg = ''
         if 'error' in data:
             emsg : str   = data['error']
@@ -128,9 +551,15 @@ class Scanmem():
         if 'error' in data:
             print('✖︎ ERROR: '+ data['error'])
 
+    def set_option(self, name: str, value: str|int):
+        """Sets a runtime option of libscanmem (see `help option` of scanmem), returns the error message"""
+        data = self.send_command(f'option {name} {value}')
+        return data.get('error', '')
+
     def reset_process(self):
         rcnt = 0
         data = self.send_command(f'rset [{self.scan_scope + 1}] {self._cpid}')
+        self.freezer.reset()
         emsg = link = ''
         if 'error' in data:
             emsg : str = data['error']
@@ -139,30 +568,49 @@ class Scanmem():
             link : str = data['exelink']
         return (emsg, rcnt, link)
 
-    def get_list_matches(self, count: int):
+    def delete_matches(self, match_ids: list[int]):
+        """Deletes the matches of the `match_ids` (as listed), returns (number of matches left, emsg)"""
+        data = self.send_command('delete '+ ','.join(str(i) for i in sorted(set(match_ids))))
+        if 'error' in data:
+            return (0, data['error'])
+        return (data['match_count'], '')
+
+    def get_list_matches(self, count: int, first: int = 0, query: str = ''):
         """
-        Returns a generator of (match_id_str, addr_str, off_str, region_type, value, types_str) for each match, all strings.
-        The function executes commands internally, it is NOT thread safe
+        Returns ([(match_id, addr_str, off_str, region_type, value, types_str), ...], total, emsg)
+        for `count` matches (all if 0) starting from the index `first`,
+        `total` is the number of matches selected by the `query` (see `list_query()`).
+
+        The backend replies with a binary frame of fixed-width records (see `MATCH_HDR`, `MATCH_REC`),
+        the value bytes are decoded as the longest type of the match flags.
         """
-        line_templ = '{"match_id":%s,"addr":"%s","off":"%s","region_type":"%s","value":%s,"types":"%s"}'
-        line_regex = re.compile(r'^\[ *(\d+)\] +([\da-f]+), +\d+ \+ +([\da-f]+), +(\w+), (.*), +\[([\w ]+)\]$')
-        name_templ = emsg = ''
+        return self._matches_reply(self._request(b'list %i %i %s' % (first, count, query.encode())))
 
-        with tempfile.NamedTemporaryFile(suffix='-mlist') as tmp_file:
-            name_templ = tmp_file.name
+    def get_list_matches_async(self, count: int, first: int, query: str, callback: callable):
+        """Same as `get_list_matches()`, but doesn't wait, `callback(mlst, total, emsg)` gets the result"""
+        self._request_async(b'list %i %i %s' % (first, count, query.encode()),
+                            lambda frame: callback(*self._matches_reply(frame)))
 
-        data = self.send_command(f'list {count} {name_templ}')
+    def _matches_reply(self, frame: bytearray):
+        if len(frame) < MATCH_HDR.size:
+            return ([], 0, self._json_reply('list', frame).get('error', 'Cannot list matches'))
+        nrec, rec_size, total = MATCH_HDR.unpack_from(frame)
+        if len(frame) != MATCH_HDR.size + nrec * rec_size:
+            return ([], 0, self._json_reply('list', frame).get('error', 'Cannot list matches'))
+        rec = struct.Struct(f'{MATCH_REC.format}{rec_size - MATCH_REC.size}s')
+        is_str = TYPE_NAMES[self.scan_type] == 'str'
+        is_arr = TYPE_NAMES[self.scan_type] == 'a8u'
         mlst = []
-
-        if 'error' in data:
-            emsg : str = data['error']
-        else:
-            with open(name_templ, mode='r') as templ_file:
-                ______ = templ_file.seek(0)
-                for m in templ_file.readlines():
-                    m = line_templ % line_regex.match(m).groups()
-                    mlst.append(json.loads(m))
-        return (mlst, emsg)
+        for mid, rid, addr, off, flags, rtype, data in rec.iter_unpack(memoryview(frame)[MATCH_HDR.size:]):
+            if is_str:
+                types, value = 'string', data[:flags].decode(errors='replace')
+            elif is_arr:
+                types, value = 'bytearray', data[:flags].hex(' ')
+            else:
+                types, fmt = match_types(flags)
+                value = fmt.unpack_from(data)[0] if fmt else None
+            mlst.append((mid, '%x' % addr, '%x' % off, REGION_TYPES[rtype], value, types))
+        return (mlst, total, '')
 
     def load_cheat_list(self, filepath: str):
         with open(filepath, mode='r') as f:
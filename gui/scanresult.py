@@ -0,0 +1,131 @@
+"""
+    scanresult.py: scan results model, which loads the matches from the backend on demand
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+
+from gi.repository import Gtk
+from gi.repository import GObject
+
+from listmodel import FlatListModel
+
+# matches requested at once
+PAGE_ROWS   = 256
+# pages kept in memory, the least recently used are dropped first
+CACHE_PAGES = 64
+# pages loaded ahead of the visible rows, in both directions
+PREFETCH_PAGES = 1
+
+class ScanResultModel(FlatListModel):
+    """
+    Flat model of the scan results @ columns: addr, value, type, valid, offset, region, match_id
+
+    Only the row count is known in advance, the rows are loaded by pages through
+    `loader(count, first, query, callback)` (see `Scanmem.get_list_matches_async()`),
+    when they are drawn or when `prefetch()` is called for the visible range.
+    The query (sort key and filters) is applied by the backend before paging.
+    Rows which are not loaded yet are shown empty and invalid.
+    The rows are not removed one by one: the matches are deleted by the backend, then the model is reset.
+    """
+    __gtype_name__ = 'ScanResultModel'
+
+    COLUMN_TYPES = (GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_BOOLEAN,
+                    GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_INT)
+    EMPTY_ROW = ('', '', '', False, '', '', -1)
+
+    def __init__(self, loader: callable):
+        super(ScanResultModel, self).__init__()
+        self._loader = loader
+        self._count  = 0
+        self._query  = ''
+        self._pages  : OrderedDict[int, list[list]] = OrderedDict()
+        self._loading: set[int] = set()
+        self._visible = range(0, 0)
+
+    def reset(self, count: int, query: str = ''):
+        """
+        Drops all rows and sets the new row count of the `query`,
+        the model must be detached from its views meanwhile (no signals are emitted)
+        """
+        self._count = count
+        self._query = query
+        # iters and pending pages of another stamp are outdated
+        self._stamp = self._stamp % 0x7fffffff + 1
+        self._pages.clear()
+        self._loading.clear()
+        self._visible = range(0, 0)
+
+    def clear(self):
+        self.reset(0)
+
+    def __len__(self):
+        return self._count
+
+    def row(self, i: int):
+        """Returns the row as a list, None if it isn't loaded"""
+        page = self._pages.get(i // PAGE_ROWS)
+        return None if page is None else page[i % PAGE_ROWS]
+
+    def set_row_value(self, i: int, value: str, valid: bool = True):
+        row = self.row(i)
+        if row is not None and (row[1] != value or row[3] != valid):
+            row[1] = value
+            row[3] = valid
+            self.row_changed(Gtk.TreePath(i), self._iter(i))
+
+    def prefetch(self, rows: range):
+        """Loads the pages of the `rows` range (and around it) which aren't loaded yet"""
+        self._visible = rows
+        if not self._count or not len(rows):
+            return
+        first = max(0, rows.start // PAGE_ROWS - PREFETCH_PAGES)
+        last  = min((self._count - 1) // PAGE_ROWS, (rows.stop - 1) // PAGE_ROWS + PREFETCH_PAGES)
+        for p in range(first, last + 1):
+            if p in self._pages:
+                self._pages.move_to_end(p)
+            else:
+                self._load_page(p)
+
+    def _load_page(self, p: int):
+        if p in self._loading:
+            return
+        self._loading.add(p)
+        stamp = self._stamp
+        self._loader(PAGE_ROWS, p * PAGE_ROWS, self._query, lambda mlst, total, emsg: self._on_page(stamp, p, mlst))
+
+    def _on_page(self, stamp: int, p: int, mlst: list):
+        if stamp != self._stamp:
+            return
+        self._loading.discard(p)
+        if not mlst:
+            return
+        self._pages[p] = [[addr, str(value), types, types != 'unknown', off, rtype, mid]
+                            for mid, addr, off, rtype, value, types in mlst]
+        while len(self._pages) > CACHE_PAGES:
+            self._pages.popitem(last=False)
+        # the rows drawn meanwhile are empty
+        first = p * PAGE_ROWS
+        for i in range(max(first, self._visible.start), min(first + len(mlst), self._visible.stop)):
+            self.row_changed(Gtk.TreePath(i), self._iter(i))
+
+    def _get_row(self, i: int):
+        row = self.row(i)
+        if row is None:
+            self._load_page(i // PAGE_ROWS)
+            return self.EMPTY_ROW
+        return row
+
+GObject.type_register(ScanResultModel)
@@ -124,6 +124,9 @@ bool handler__set(globals_t * vars, char **argv, unsigned argc)
         return false;
     }
 
+    if (!sm_expand_snapshot(vars))
+        return false;
+
     /* --- parse arguments into settings structs --- */
 
     settings = calloca(argc - 1, sizeof(struct setting));
@@ -329,6 +332,7 @@ bool handler__list(globals_t *vars, char **argv, unsigned argc)
     const char *bytearray_suffix = ", [bytearray]";
     const char *string_suffix = ", [string]";
     FILE *pager = stdout;
+    matches_and_old_values_array *matches = vars->matches, *listed = NULL;
 
     unsigned long max_to_print = 10000;
     if (argc > 1) {
@@ -349,10 +353,18 @@ bool handler__list(globals_t *vars, char **argv, unsigned argc)
         return false;
     }
 
+    /* only the listed matches of a snapshot are expanded, one more tells if there are others */
+    if (vars->snapshot && !(matches = listed = snapshot_to_array(vars->snapshot, 0, max_to_print + 1)))
+    {
+        show_error("memory allocation failed.\n");
+        free(v);
+        return false;
+    }
+
     if (vars->regions)
         np = vars->regions->head;
 
-    matches_and_old_values_swath *reading_swath_index = vars->matches->swaths;
+    matches_and_old_values_swath *reading_swath_index = matches->swaths;
     size_t reading_iterator = 0;
 
     if (isatty(STDOUT_FILENO)) {
@@ -450,10 +462,12 @@ bool handler__list(globals_t *vars, char **argv, unsigned argc)
     }
 
     free(v);
+    free(listed);
     close_pager(pager);
     return true;
 fail:
     free(v);
+    free(listed);
     close_pager(pager);
     return false;
 }
@@ -472,6 +486,9 @@ bool handler__delete(globals_t * vars, char **argv, unsigned argc)
         return false;
     }
 
+    if (!sm_expand_snapshot(vars))
+        return false;
+
     if (!parse_uintset(argv[1], &del_set, (size_t)vars->num_matches)) {
         show_error("failed to parse the set, try `help delete`.\n");
         return false;
@@ -525,6 +542,8 @@ bool handler__reset(globals_t * vars, char **argv, unsigned argc)
     vars->scan_progress = 0;
 
     if (vars->matches) { free(vars->matches); vars->matches = NULL; vars->num_matches = 0; }
+    snapshot_free(vars->snapshot);
+    vars->snapshot = NULL;
 
     /* refresh list of regions */
     l_destroy(vars->regions);
@@ -583,6 +602,8 @@ bool handler__snapshot(globals_t *vars, char **argv, unsigned argc)
 
     /* remove any existing matches */
     if (vars->matches) { free(vars->matches); vars->matches = NULL; vars->num_matches = 0; }
+    snapshot_free(vars->snapshot);
+    vars->snapshot = NULL;
 
     if (sm_searchregions(vars, MATCHANY, NULL) != true) {
         show_error("failed to save target address space.\n");
@@ -649,7 +670,7 @@ bool handler__dregion(globals_t *vars, char **argv, unsigned argc)
         }
         
         /* check for any affected matches before removing it */
-        if(vars->num_matches > 0)
+        if(vars->num_matches > 0 && sm_expand_snapshot(vars))
         {
             region_t *reg_to_delete = np->data;
 
@@ -1184,6 +1205,9 @@ bool handler__watch(globals_t * vars, char **argv, unsigned argc)
         return false;
     }
     
+    if (!sm_expand_snapshot(vars))
+        return false;
+
     loc = nth_match(vars->matches, id);
 
     /* check that this is a valid match-id */
@@ -1701,6 +1725,89 @@ bool handler__option(globals_t * vars, char **argv, unsigned argc)
         return false;
 #endif
     }
+    else if (strcasecmp(argv[1], "vm_readv") == 0)
+    {
+        if (strcmp(argv[2], "0") == 0) { sm_set_procmem_reader(PROCMEM_READER_PREAD); }
+        else if (strcmp(argv[2], "1") == 0) {
+            if (sm_set_procmem_reader(PROCMEM_READER_VM_READV) != PROCMEM_READER_VM_READV)
+                show_warn("process_vm_readv() is not supported on your system.\n");
+        }
+        else
+        {
+            show_error("bad value for vm_readv, see `help option`.\n");
+            return false;
+        }
+    }
+    else if (strcasecmp(argv[1], "scan_threads") == 0)
+    {
+        char *end;
+        unsigned long n = strtoul(argv[2], &end, 10);
+
+        if (*argv[2] == '\0' || *end != '\0' || n > 64)
+        {
+            show_error("bad value for scan_threads, see `help option`.\n");
+            return false;
+        }
+        vars->options.scan_threads = n;
+    }
+    else if (strcasecmp(argv[1], "scan_alignment") == 0)
+    {
+        char *end;
+        unsigned long n = strtoul(argv[2], &end, 10);
+
+        /* a power of two, or 0 */
+        if (*argv[2] == '\0' || *end != '\0' || n > 4096 || (n & (n - 1)))
+        {
+            show_error("bad value for scan_alignment, see `help option`.\n");
+            return false;
+        }
+        vars->options.alignment = n;
+    }
+    else if (strcasecmp(argv[1], "snapshot_dir") == 0)
+    {
+        char *dir = NULL;
+
+        if (strcmp(argv[2], "-") != 0) {
+            if (access(argv[2], W_OK | X_OK) != 0) {
+                show_error("can't write snapshots to `%s`: %s.\n", argv[2], strerror(errno));
+                return false;
+            }
+            if ((dir = strdup(argv[2])) == NULL) {
+                show_error("memory allocation failed.\n");
+                return false;
+            }
+        }
+        free(vars->options.snapshot_dir);
+        vars->options.snapshot_dir = dir;
+    }
+    else if (strcasecmp(argv[1], "snapshot_window") == 0)
+    {
+        char *end;
+        unsigned long n = strtoul(argv[2], &end, 10);
+
+        if (*argv[2] == '\0' || *end != '\0' || n > 4096)
+        {
+            show_error("bad value for snapshot_window, see `help option`.\n");
+            return false;
+        }
+        vars->options.snapshot_window = n;
+    }
+    else if (strcasecmp(argv[1], "soft_dirty") == 0)
+    {
+        if (strcmp(argv[2], "0") == 0) {vars->options.soft_dirty = 0; }
+        else if (strcmp(argv[2], "1") == 0) {
+            if (!sm_soft_dirty_supported()) {
+                show_error("the soft-dirty pages are not tracked by your kernel.\n");
+                return false;
+            }
+            vars->options.soft_dirty = 1;
+        }
+        else
+        {
+            show_error("bad value for soft_dirty, see `help option`.\n");
+            return false;
+        }
+    }
     else
     {
         show_error("unknown option specified, see `help option`.\n");
@@ -332,7 +332,8 @@ bool handler__write(globals_t *vars, char **argv, unsigned argc);
 
 #define OPTION_COMPLETE "scan_data_type{number,int,float," VALUE_TYPES \
     "},region_scan_level{1,2,3,4},dump_with_ascii{0,1},endianness{0,1,2}," \
-    "noptrace{0,1}"
+    "noptrace{0,1},vm_readv{0,1},scan_threads,scan_alignment{0,1,2,4,8}," \
+    "snapshot_dir,snapshot_window,soft_dirty{0,1}"
 #define OPTION_SHRTDOC "set runtime options of scanmem, see `help option`"
 #define OPTION_LONGDOC "usage: option <option_name> <option_value>\n" \
                  "\n" \
@@ -381,6 +382,45 @@ bool handler__write(globals_t *vars, char **argv, unsigned argc);
                  "\t0:\tuse ptrace\n" \
                  "\t1:\tno ptrace\n" \
                  "\n" \
+                 "vm_readv\tread the memory with process_vm_readv, many ranges per call\n" \
+                 "\t\t\tDefault:1 (falls back to 0 if it fails)\n" \
+                 "\tpossibles values:\n"\
+                 "\t0:\tuse /proc/pid/mem or ptrace\n" \
+                 "\t1:\tuse process_vm_readv\n" \
+                 "\n" \
+                 "scan_threads\tnumber of threads scanning the memory\n" \
+                 "\t\t\tDefault:0\n" \
+                 "\tpossibles values:\n"\
+                 "\t0:\tone per online CPU\n" \
+                 "\t1-64:\tthat many (without /proc/pid/mem there is only one)\n" \
+                 "\n" \
+                 "scan_alignment\taddresses where a new scan looks for values\n" \
+                 "\t\t\tDefault:1\n" \
+                 "\tpossibles values:\n"\
+                 "\t0:\taligned to the size of each type (bytearrays and strings anywhere)\n" \
+                 "\t1:\tany address\n" \
+                 "\t2-4096:\tmultiples of that power of two only\n" \
+                 "\n" \
+                 "snapshot_dir\tdirectory of the files keeping the snapshots of numbers\n" \
+                 "\t\t\tDefault:- (the snapshots are kept in memory)\n" \
+                 "\tpossibles values:\n"\
+                 "\t-:\tkeep them in memory\n" \
+                 "\tpath:\tmap sparse files of that directory, removed along with the snapshot\n" \
+                 "\n" \
+                 "snapshot_window\tMiB of a snapshot file scanned in a row by a thread,\n" \
+                 "\t\t\tbefore they are released from memory\n" \
+                 "\t\t\tDefault:64\n" \
+                 "\tpossibles values:\n"\
+                 "\t0-4096:\t0 releases every buffer\n" \
+                 "\n" \
+                 "soft_dirty\tread again only the pages of the matches written since\n" \
+                 "\t\t\tthe last scan, by the soft-dirty bits of the kernel\n" \
+                 "\t\t\t(ignored with noptrace, the target must be stopped)\n" \
+                 "\t\t\tDefault:0\n" \
+                 "\tpossibles values:\n"\
+                 "\t0:\tread every page\n" \
+                 "\t1:\tskip the unchanged pages\n" \
+                 "\n" \
                  "Example:\n" \
                  "\toption scan_data_type int32\n"
 
@@ -46,6 +46,8 @@
 #include <stdbool.h>
 #include <limits.h>
 #include <fcntl.h>
+#include <pthread.h>
+#include <stdatomic.h>
 
 // dirty hack for FreeBSD
 #if defined(__FreeBSD__) || defined(__FreeBSD_kernel__)
@@ -75,23 +77,59 @@
 
 /* ptrace peek buffer, used by peekdata() as a mirror of the process memory.
  * Max size is the maximum allowed rounded VLT scan length, aka UINT16_MAX,
- * plus a `PEEKDATA_CHUNK`, to store a full extra chunk for maneuverability */
+ * plus a `PEEKDATA_CHUNK`, to store a full extra chunk for maneuverability.
+ * Every scanning thread has its own buffer (and its own `/proc/<pid>/mem`). */
 #if HAVE_PROCMEM
 # define PEEKDATA_CHUNK 2048
 #else
 # define PEEKDATA_CHUNK sizeof(long)
 #endif
 #define MAX_PEEKBUF_SIZE ((1<<16) + PEEKDATA_CHUNK)
-static struct {
+static __thread struct {
     uint8_t cache[MAX_PEEKBUF_SIZE];  /* read from ptrace()  */
     unsigned size;              /* amount of valid memory stored (in bytes) */
     const char *base;           /* base address of cached region */
+    pid_t pid;                  /* pid of scanned process */
 #if HAVE_PROCMEM
     int procmem_fd;             /* file descriptor of the opened `/proc/<pid>/mem` file */
-#else
-    pid_t pid;                  /* pid of scanned process */
 #endif
-} peekbuf;
+} peekbuf
+#if HAVE_PROCMEM
+= { .procmem_fd = -1 }
+#endif
+;
+
+#if HAVE_PROCMEM
+/* opens `/proc/<pid>/mem` for the peek buffer of the calling thread */
+static bool peekbuf_open(pid_t target)
+{
+    char mem[32];
+    int fd;
+
+    /* reset the peek buffer */
+    peekbuf.size = 0;
+    peekbuf.base = NULL;
+    peekbuf.pid = target;
+
+    /* print the path to mem file */
+    snprintf(mem, sizeof(mem), "/proc/%d/mem", target);
+
+    /* attempt to open the file */
+    if ((fd = open(mem, O_RDWR)) == -1) {
+        show_error("unable to open %s.\n", mem);
+        return false;
+    }
+    peekbuf.procmem_fd = fd;
+    return true;
+}
+
+static void peekbuf_close(void)
+{
+    if (peekbuf.procmem_fd != -1)
+        close(peekbuf.procmem_fd);
+    peekbuf.procmem_fd = -1;
+}
+#endif
 
 
 bool sm_attach(pid_t target)
@@ -114,26 +152,14 @@ bool sm_attach(pid_t target)
         }
     }
 
+#if HAVE_PROCMEM
+    /* open the `/proc/<pid>/mem` file */
+    if (!peekbuf_open(target))
+        return false;
+#else
     /* reset the peek buffer */
     peekbuf.size = 0;
     peekbuf.base = NULL;
-
-#if HAVE_PROCMEM
-    { /* open the `/proc/<pid>/mem` file */
-        char mem[32];
-        int fd;
-
-        /* print the path to mem file */
-        snprintf(mem, sizeof(mem), "/proc/%d/mem", target);
-
-        /* attempt to open the file */
-        if ((fd = open(mem, O_RDWR)) == -1) {
-            show_error("unable to open %s.\n", mem);
-            return false;
-        }
-        peekbuf.procmem_fd = fd;
-    }
-#else
     peekbuf.pid = target;
 #endif
 
@@ -146,7 +172,7 @@ bool sm_detach(pid_t target)
 {
 #if HAVE_PROCMEM
     /* close the mem file before detaching */
-    close(peekbuf.procmem_fd);
+    peekbuf_close();
 #endif
 
     if (!sm_globals.options.no_ptrace)
@@ -163,18 +189,26 @@ bool sm_detach(pid_t target)
 
 
 /* Reads data from the target process, and places it on the `dest_buffer`
- * using either `ptrace` or `pread` on `/proc/pid/mem`.
+ * using `process_vm_readv`, or either `ptrace` or `pread` on `/proc/pid/mem`.
  * The target process is not passed, but read from the static peekbuf.
  * `sm_attach()` MUST be called before this function. */
 static inline size_t readmemory(uint8_t *dest_buffer, const char *target_address, size_t size)
 {
     size_t nread = 0;
 
+#if HAVE_PROCESS_VM_READV
+    if (sm_get_procmem_reader() == PROCMEM_READER_VM_READV) {
+        procmem_iov_t iov = { (uintptr_t)target_address, size, 0, dest_buffer };
+        if (sm_vm_read_vec(peekbuf.pid, &iov, 1) != -1)
+            return iov.ndone;
+    }
+#endif
 #if HAVE_PROCMEM
     do {
         ssize_t ret = pread(peekbuf.procmem_fd, dest_buffer + nread,
                             size - nread, (unsigned long)(target_address + nread));
-        if (ret == -1) {
+        sm_procmem_count(1, ret > 0 ? ret : 0);
+        if (ret <= 0) {
             /* we can't read further, report what was read */
             return nread;
         }
@@ -191,6 +225,7 @@ static inline size_t readmemory(uint8_t *dest_buffer, const char *target_address
     for (nread = 0; nread < size; nread += sizeof(long)) {
         const char *ptrace_address = target_address + nread;
         long ptraced_long = ptrace(PTRACE_PEEKDATA, peekbuf.pid, ptrace_address, NULL);
+        sm_procmem_count(1, sizeof(long));
 
         /* check if ptrace() succeeded */
         if (UNLIKELY(ptraced_long == -1L && errno != 0)) {
@@ -334,170 +369,1263 @@ static inline uint16_t flags_to_memlength(scan_data_type_t scan_data_type, match
     }
 }
 
-/* This is the function that handles when you enter a value (or >, <, =) for the second or later time (i.e. when there's already a list of matches);
- * it reduces the list to those that still match. It returns false on failure to attach, detach, or reallocate memory, otherwise true. */
-bool sm_checkmatches(globals_t *vars,
-                     scan_match_type_t match_type,
-                     const uservalue_t *uservalue)
+/* The maximum logical size is a comfortable 1MiB (increasing it does not help).
+ * The actual allocation is that plus the rounded size of the maximum possible VLT.
+ * This is needed because the last byte might be scanned as max size VLT,
+ * thus need (2^16 - 2) extra bytes after it */
+#define MAX_BUFFER_SIZE (1<<20)
+#define MAX_ALLOC_SIZE  (MAX_BUFFER_SIZE + (1<<16))
+
+/* The scans are split in chunks, which are handed out to a pool of threads:
+ * ranges of the regions on the first scan, ranges of the old matches on the next ones */
+#define SEARCH_CHUNK_SIZE (1<<24)
+#define CHECK_CHUNK_SIZE  (1<<18)
+#define MAX_SCAN_THREADS  64
+/* how often the progress is updated while waiting for the threads (in ms) */
+#define SCAN_POLL_MS      10
+
+typedef struct {
+    void *start;                /* first byte to check */
+    size_t size;                /* number of bytes to check */
+    size_t region_size;         /* bytes readable from `start` to the end of its region */
+    unsigned long regnum;       /* region number, if the chunk is the first of its region */
+    matches_and_old_values_swath *swath; /* swath of `start` in the old matches */
+    size_t index;               /* index of `start` in `swath` */
+    size_t max_bytes;           /* the most `matches` can take */
+    matches_and_old_values_array *matches; /* matches of the chunk */
+    matches_and_old_values_swath *writing_swath;
+    unsigned long num_matches;
+    snapshot_region *snapshot;  /* region of `start` in the snapshot, at `index` */
+    uint8_t next_old_values[sizeof(int64_t) - 1]; /* kept before the next chunk replaces them */
+    bool done;
+    atomic_bool scanned;        /* set by its thread once the chunk is finished */
+} scan_chunk_t;
+
+/* The pages of the old matches written since the last scan (see `option soft_dirty`):
+ * runs of pages in address order, with a bit set for each soft-dirty page.
+ * The other pages still hold the old values, they aren't read again. */
+#define DIRTY_MAP_GAP 64        /* pages between two runs which are rather joined */
+
+typedef struct {
+    uintptr_t start;            /* address of the first page */
+    size_t num_pages;
+    uint64_t *dirty;            /* one bit per page */
+} dirty_run_t;
+
+typedef struct {
+    size_t page_size;
+    size_t num_runs;
+    dirty_run_t runs[0];
+} dirty_map_t;
+
+static int dirty_run_cmp(const void *a, const void *b)
 {
-    matches_and_old_values_swath *reading_swath_index = vars->matches->swaths;
-    matches_and_old_values_swath reading_swath = *reading_swath_index;
+    const dirty_run_t *ra = a, *rb = b;
 
-    unsigned long bytes_scanned = 0;
-    unsigned long total_scan_bytes = 0;
-    matches_and_old_values_swath *tmp_swath_index = reading_swath_index;
-    unsigned int samples_remaining = NUM_SAMPLES;
-    unsigned int samples_to_dot = SAMPLES_PER_DOT;
-    size_t bytes_at_next_sample;
-    size_t bytes_per_sample;
+    return (ra->start > rb->start) - (ra->start < rb->start);
+}
 
-    if (sm_choose_scanroutine(vars->options.scan_data_type, match_type, uservalue, vars->options.reverse_endianness) == false)
-    {
-        show_error("unsupported scan for current data type.\n");
-        return false;
+/* reads the soft-dirty pages of the old matches, if the last scan of the target cleared them,
+ * returns NULL if every page must be read */
+static dirty_map_t *dirty_map_new(const globals_t *vars)
+{
+    matches_and_old_values_swath *swath;
+    dirty_map_t *map;
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    size_t i, n = 0, num_words = 0;
+    uint64_t *words;
+
+    if (!vars->options.soft_dirty || vars->options.no_ptrace || vars->soft_dirty_target != vars->target)
+        return NULL;
+
+    if (vars->snapshot)
+        n = vars->snapshot->num_regions;
+    else
+        for (swath = vars->matches->swaths; swath->number_of_bytes; swath = local_address_beyond_last_element(swath))
+            n++;
+    if (!(map = malloc(sizeof(dirty_map_t) + n * sizeof(dirty_run_t))))
+        return NULL;
+    map->page_size = page_size;
+    map->num_runs = 0;
+
+    /* the pages of each region or swath (with the bytes of its last match), then the runs of them */
+    if (vars->snapshot) {
+        for (i = 0; i < n; i++) {
+            const snapshot_region *region = &vars->snapshot->regions[i];
+
+            map->runs[i].start = (uintptr_t)region->first_byte_in_child;
+            map->runs[i].num_pages = region->number_of_bytes;
+        }
+    } else {
+        for (i = 0, swath = vars->matches->swaths; i < n; i++, swath = local_address_beyond_last_element(swath)) {
+            map->runs[i].start = (uintptr_t)swath->first_byte_in_child;
+            map->runs[i].num_pages = swath->number_of_bytes + sizeof(int64_t) - 1;
+        }
     }
+    for (i = 0; i < n; i++) {
+        uintptr_t end = map->runs[i].start + map->runs[i].num_pages;
 
-    assert(sm_scan_routine);
+        map->runs[i].start -= map->runs[i].start % page_size;
+        map->runs[i].num_pages = (end - map->runs[i].start + page_size - 1) / page_size;
+    }
+    qsort(map->runs, n, sizeof(dirty_run_t), dirty_run_cmp);
+
+    for (i = 0; i < n; i++) {
+        dirty_run_t *last = map->num_runs ? &map->runs[map->num_runs - 1] : NULL;
+        uintptr_t end = map->runs[i].start + map->runs[i].num_pages * page_size;
+
+        if (last && map->runs[i].start <= last->start + (last->num_pages + DIRTY_MAP_GAP) * page_size) {
+            if (end > last->start + last->num_pages * page_size)
+                last->num_pages = (end - last->start) / page_size;
+        } else {
+            map->runs[map->num_runs++] = map->runs[i];
+        }
+    }
+
+    if (map->num_runs == 0)
+        return map;
+    for (i = 0; i < map->num_runs; i++)
+        num_words += (map->runs[i].num_pages + 63) / 64;
+    if (!(words = malloc(num_words * sizeof(uint64_t)))) {
+        free(map);
+        return NULL;
+    }
+    for (i = 0; i < map->num_runs; i++) {
+        map->runs[i].dirty = words;
+        if (!sm_read_soft_dirty(vars->target, map->runs[i].start, map->runs[i].num_pages, words)) {
+            show_warn("failed to read the soft-dirty pages, every page is read again.\n");
+            free(map->runs[0].dirty);
+            free(map);
+            return NULL;
+        }
+        words += (map->runs[i].num_pages + 63) / 64;
+    }
+    return map;
+}
+
+static void dirty_map_free(dirty_map_t *map)
+{
+    if (map) {
+        if (map->num_runs)
+            free(map->runs[0].dirty);
+        free(map);
+    }
+}
+
+/* returns how many of the `size` bytes from `addr` are in pages which are all unchanged,
+ * or all of them may have changed (`*unchanged` tells which) */
+static size_t dirty_map_span(const dirty_map_t *map, uintptr_t addr, size_t size, bool *unchanged)
+{
+    const dirty_run_t *run;
+    size_t lo = 0, hi, page, num_pages;
+    uintptr_t end;
+
+    *unchanged = false;
+    if (!map)
+        return size;
+
+    /* the last run starting at or before `addr` */
+    for (hi = map->num_runs; lo < hi; ) {
+        size_t mid = (lo + hi) / 2;
+
+        if (map->runs[mid].start <= addr)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+    if (lo == 0)
+        return map->num_runs ? MIN(size, map->runs[0].start - addr) : size;
+    run = &map->runs[lo - 1];
+    num_pages = run->num_pages;
+    end = run->start + num_pages * map->page_size;
+    if (addr >= end)
+        return lo < map->num_runs ? MIN(size, map->runs[lo].start - addr) : size;
+
+    page = (addr - run->start) / map->page_size;
+    *unchanged = !((run->dirty[page / 64] >> (page % 64)) & 1);
+    while (++page < num_pages && *unchanged == !((run->dirty[page / 64] >> (page % 64)) & 1) &&
+           run->start + page * map->page_size < addr + size)
+        ;
+    return MIN(size, run->start + page * map->page_size - addr);
+}
+
+/* clears the soft-dirty bits of the target before its memory is read, the next scan
+ * only reads the pages written after that: the other threads of the target and the
+ * freezer keep running, a page they write during the scan just stays dirty */
+static void dirty_map_clear(globals_t *vars)
+{
+    vars->soft_dirty_target = 0;
+    if (!vars->options.soft_dirty || vars->options.no_ptrace)
+        return;
+    if (sm_clear_soft_dirty(vars->target))
+        vars->soft_dirty_target = vars->target;
+    else
+        show_warn("failed to clear the soft-dirty pages, the next scan reads every page.\n");
+}
 
-    while(tmp_swath_index->number_of_bytes)
+typedef struct scan_pool {
+    globals_t *vars;
+    const uservalue_t *uservalue;
+    const dirty_map_t *dirty;   /* the pages written since the last scan, NULL to read every page */
+    bool (*scan_chunk)(struct scan_pool *pool, scan_chunk_t *chunk);
+    scan_chunk_t *chunks;
+    size_t num_chunks;
+    size_t total_bytes;
+    unsigned num_threads;       /* 0 if the chunks are scanned by the calling thread */
+    unsigned num_dots;          /* dots printed so far */
+    bool by_region;             /* a progress line for each region, instead of the dots of the whole scan */
+    size_t next_report;         /* first chunk whose progress isn't fully printed */
+    size_t region_size;         /* size of the region of the line printed, 0 if it's ended */
+    size_t region_done;         /* bytes of its chunks finished */
+    size_t bytes_reported;      /* bytes of the chunks before `next_report` */
+    atomic_size_t next_chunk;
+    atomic_size_t bytes_scanned;
+    atomic_ulong num_matches;
+    atomic_uint running;
+    atomic_bool failed;
+} scan_pool_t;
+
+/* Each thread reads the target through its own `/proc/<pid>/mem`, ptrace()
+ * only works from the attached thread, so the scan can't be shared without it. */
+static unsigned scan_pool_threads(globals_t *vars, size_t num_chunks)
+{
+#if HAVE_PROCMEM
+    long n = vars->options.scan_threads;
+
+    if (n == 0)
+        n = sysconf(_SC_NPROCESSORS_ONLN);
+    if (n < 1)
+        n = 1;
+    if (n > MAX_SCAN_THREADS)
+        n = MAX_SCAN_THREADS;
+    return (size_t)n < num_chunks ? (unsigned)n : (unsigned)num_chunks;
+#else
+    (void) vars;
+    (void) num_chunks;
+    return 0;
+#endif
+}
+
+/* Prints the line of each region in address order, as the chunks are finished:
+ * `NN/MM searching <start> - <end>`, the dots of its progress, then `ok` */
+static void scan_pool_report_regions(scan_pool_t *pool, size_t bytes_scanned)
+{
+    while (pool->next_report < pool->num_chunks) {
+        scan_chunk_t *c = &pool->chunks[pool->next_report];
+        bool finished = atomic_load(&c->scanned);
+        size_t done;
+
+        if (c->regnum && !pool->region_size) {
+            show_user("%02lu/%02lu searching %#10lx - %#10lx", c->regnum, pool->vars->regions->size,
+                      (unsigned long)c->start, (unsigned long)c->start + c->region_size);
+            fflush(stderr);
+            pool->region_size = c->region_size;
+            pool->region_done = 0;
+            pool->num_dots = 0;
+        }
+        /* the chunks are scanned in order by the calling thread, its progress is known within the chunk */
+        done = pool->region_done;
+        if (finished)
+            done += c->size;
+        else if (!pool->num_threads && bytes_scanned > pool->bytes_reported)
+            done += MIN(bytes_scanned - pool->bytes_reported, c->size);
+        for ( ; pool->num_dots < done * NUM_DOTS / pool->region_size; pool->num_dots++)
+            print_a_dot();
+        if (!finished)
+            break;
+
+        pool->region_done += c->size;
+        pool->bytes_reported += c->size;
+        pool->next_report++;
+        if (pool->region_done >= pool->region_size) {
+            show_user("ok\n");
+            pool->region_size = 0;
+        }
+    }
+}
+
+/* updates the progress for the front-end and prints the dots for the user */
+static void scan_pool_progress(scan_pool_t *pool)
+{
+    size_t bytes_scanned = atomic_load(&pool->bytes_scanned);
+    double progress = pool->total_bytes ? (double)bytes_scanned / pool->total_bytes : MAX_PROGRESS;
+
+    if (progress > MAX_PROGRESS)
+        progress = MAX_PROGRESS;
+    if (pool->by_region)
+        scan_pool_report_regions(pool, bytes_scanned);
+    else
+        for ( ; pool->num_dots < (unsigned)(progress * NUM_DOTS); pool->num_dots++)
+            print_a_dot();
+
+    pool->vars->scan_progress = progress;
+    pool->vars->num_matches = atomic_load(&pool->num_matches);
+    pool->vars->scan_stats = sm_procmem_stats(false);
+}
+
+static void *scan_pool_worker(void *arg)
+{
+    scan_pool_t *pool = arg;
+    size_t i;
+
+#if HAVE_PROCMEM
+    if (pool->num_threads && !peekbuf_open(pool->vars->target)) {
+        atomic_store(&pool->failed, true);
+        atomic_fetch_sub(&pool->running, 1);
+        return NULL;
+    }
+#endif
+    while (!pool->vars->stop_flag && !atomic_load(&pool->failed) &&
+           (i = atomic_fetch_add(&pool->next_chunk, 1)) < pool->num_chunks)
     {
-        total_scan_bytes += tmp_swath_index->number_of_bytes;
-        tmp_swath_index = (matches_and_old_values_swath *)(&tmp_swath_index->data[tmp_swath_index->number_of_bytes]);
+        if (!pool->scan_chunk(pool, &pool->chunks[i]))
+            atomic_store(&pool->failed, true);
+        else if (!pool->vars->stop_flag)
+            atomic_store(&pool->chunks[i].scanned, true);
     }
-    bytes_per_sample = total_scan_bytes / NUM_SAMPLES;
-    bytes_at_next_sample = bytes_per_sample;
-    /* for user, just print the first dot */
-    print_a_dot();
+#if HAVE_PROCMEM
+    if (pool->num_threads)
+        peekbuf_close();
+#endif
+    atomic_fetch_sub(&pool->running, 1);
+    return NULL;
+}
+
+/* scans all the chunks, returns false on a failure to allocate memory or to read the target */
+static bool scan_pool_run(scan_pool_t *pool)
+{
+    pthread_t threads[MAX_SCAN_THREADS];
+    unsigned n = 0;
+
+    atomic_init(&pool->next_chunk, 0);
+    atomic_init(&pool->bytes_scanned, 0);
+    atomic_init(&pool->num_matches, 0);
+    atomic_init(&pool->running, pool->num_threads);
+    atomic_init(&pool->failed, false);
+    pool->num_dots = 0;
+    pool->next_report = 0;
+    pool->region_size = 0;
+    pool->bytes_reported = 0;
+    sm_procmem_stats(true);
+
+    for ( ; n < pool->num_threads; n++) {
+        if (pthread_create(&threads[n], NULL, scan_pool_worker, pool) != 0)
+            break;
+    }
+    if (n == 0) {
+        /* no thread at all, go on alone */
+        pool->num_threads = 0;
+        atomic_store(&pool->running, 1);
+        scan_pool_worker(pool);
+    } else {
+        struct timespec poll_time = { 0, SCAN_POLL_MS * 1000000L };
+
+        atomic_fetch_sub(&pool->running, pool->num_threads - n);
+        while (atomic_load(&pool->running)) {
+            scan_pool_progress(pool);
+            nanosleep(&poll_time, NULL);
+        }
+        while (n)
+            pthread_join(threads[--n], NULL);
+    }
+    scan_pool_progress(pool);
+    return !atomic_load(&pool->failed);
+}
+
+/* prints how the target memory was read by the last scan, once its progress line is ended */
+static void show_scan_stats(const globals_t *vars)
+{
+    show_info("%lu reads of the target memory (%lu bytes) by %s.\n",
+              vars->scan_stats.syscalls, vars->scan_stats.bytes,
+              sm_get_procmem_reader() == PROCMEM_READER_VM_READV ? "process_vm_readv()" : "pread()");
+}
+
+/* Joins the matches of the chunks into `vars->matches`, in address order.
+ * The extra bytes of the last match of a chunk may overlap the next chunk,
+ * where they are replaced by its matches. */
+static bool scan_pool_merge(scan_pool_t *pool)
+{
+    globals_t *vars = pool->vars;
+    matches_and_old_values_swath *writing_swath_index;
+    size_t max_bytes = sizeof(matches_and_old_values_array) + sizeof(matches_and_old_values_swath);
+    size_t i, j;
 
-    size_t reading_iterator = 0;
-    matches_and_old_values_swath *writing_swath_index = vars->matches->swaths;
+    for (i = 0; i < pool->num_chunks; i++) {
+        if (pool->chunks[i].matches)
+            max_bytes += pool->chunks[i].matches->bytes_allocated;
+    }
+    if (!(vars->matches = allocate_array(vars->matches, max_bytes)))
+        return false;
+
+    writing_swath_index = vars->matches->swaths;
     writing_swath_index->first_byte_in_child = NULL;
     writing_swath_index->number_of_bytes = 0;
+    vars->num_matches = 0;
+
+    for (i = 0; i < pool->num_chunks; i++) {
+        scan_chunk_t *c = &pool->chunks[i];
+        matches_and_old_values_swath *s;
+
+        if (!c->matches)
+            continue;
+        vars->num_matches += c->num_matches;
+
+        for (s = c->matches->swaths; s->first_byte_in_child; s = local_address_beyond_last_element(s)) {
+            for (j = 0; j < s->number_of_bytes; j++) {
+                void *address = s->first_byte_in_child + j;
+
+                if (writing_swath_index->number_of_bytes &&
+                    address <= remote_address_of_last_element(writing_swath_index))
+                {
+                    assert(address >= writing_swath_index->first_byte_in_child);
+                    if (s->data[j].match_info != flags_empty)
+                        writing_swath_index->data[address - writing_swath_index->first_byte_in_child] = s->data[j];
+                } else {
+                    writing_swath_index = add_element(&(vars->matches), writing_swath_index, address,
+                                                      s->data[j].old_value, s->data[j].match_info);
+                }
+            }
+        }
+    }
+    return (vars->matches = null_terminate(vars->matches, writing_swath_index)) != NULL;
+}
+
+static void scan_pool_free(scan_pool_t *pool)
+{
+    size_t i;
+
+    for (i = 0; i < pool->num_chunks; i++)
+        free(pool->chunks[i].matches);
+    free(pool->chunks);
+    pool->chunks = NULL;
+    pool->num_chunks = 0;
+}
+
+/* The old matches are read in batches: one range of the target memory per swath
+ * (or part of it), up to `CHECK_BATCH_RANGES` ranges or `CHECK_BATCH_SIZE` bytes.
+ * The last old match of a range may need up to a max size VLT after it. */
+#define CHECK_BATCH_RANGES 1024
+#define CHECK_BATCH_SIZE   (1<<20)
+#define CHECK_BATCH_ALLOC  (CHECK_BATCH_SIZE + (1<<16) + 2 * sizeof(long))
+
+typedef struct {
+    matches_and_old_values_swath *swath;
+    size_t first;               /* first old match to check */
+    size_t end;                 /* end of the old matches to check */
+    size_t extra_end;           /* end of the bytes which may follow the last match */
+    bool unchanged;             /* its pages weren't written since the last scan */
+} check_range_t;
+
+typedef struct {
+    procmem_iov_t iov[CHECK_BATCH_RANGES];
+    check_range_t range[CHECK_BATCH_RANGES];
+    size_t count;
+    procmem_iov_t read_iov[CHECK_BATCH_RANGES]; /* those of the ranges which may have changed */
+    uint8_t data[CHECK_BATCH_ALLOC];
+} check_batch_t;
+
+/* reads the ranges of a batch, with as few syscalls as the reader allows */
+static void readmemory_vec(procmem_iov_t *iov, size_t count)
+{
+    size_t i;
+
+#if HAVE_PROCESS_VM_READV
+    if (sm_get_procmem_reader() == PROCMEM_READER_VM_READV &&
+        sm_vm_read_vec(peekbuf.pid, iov, count) != -1)
+        return;
+#endif
+    for (i = 0; i < count; i++)
+        iov[i].ndone = readmemory(iov[i].data, (const char *)iov[i].addr, iov[i].size);
+}
+
+/* reads the ranges of a batch which may have changed,
+ * the others are unchanged since the last scan, so they are copied from the old values */
+static void check_batch_read(check_batch_t *batch)
+{
+    size_t k, j, n = 0;
+
+    for (k = 0; k < batch->count; k++) {
+        if (!batch->range[k].unchanged)
+            batch->read_iov[n++] = batch->iov[k];
+    }
+    if (n)
+        readmemory_vec(batch->read_iov, n);
+
+    for (k = 0, n = 0; k < batch->count; k++) {
+        const matches_and_old_values_swath *swath = batch->range[k].swath;
+        procmem_iov_t *iov = &batch->iov[k];
+
+        if (!batch->range[k].unchanged) {
+            iov->ndone = batch->read_iov[n++].ndone;
+            continue;
+        }
+        /* the bytes of the old matches are all there, the others aren't used */
+        for (j = 0; j < iov->size; j++) {
+            size_t index = iov->addr + j - (uintptr_t)swath->first_byte_in_child;
+
+            iov->data[j] = index < swath->number_of_bytes ? swath->data[index].old_value : 0;
+        }
+        iov->ndone = iov->size;
+    }
+}
+
+/* Fills the batch with the next old matches of the chunk, from `swath[index]`
+ * (which are moved past them), returns the number of old matches to check. */
+static size_t check_batch_fill(check_batch_t *batch, scan_data_type_t scan_data_type, const dirty_map_t *dirty,
+                               matches_and_old_values_swath **swath, size_t *index, size_t bytes_left)
+{
+    size_t used = 0, nchecked = 0;
+
+    for (batch->count = 0; bytes_left && batch->count < CHECK_BATCH_RANGES && used < CHECK_BATCH_SIZE; batch->count++) {
+        check_range_t *range = &batch->range[batch->count];
+        procmem_iov_t *iov = &batch->iov[batch->count];
+        matches_and_old_values_swath *s = *swath;
+        size_t i, n = MIN(MIN(bytes_left, s->number_of_bytes - *index), CHECK_BATCH_SIZE - used);
+        uintptr_t start, end;
+
+        /* a range ends where the pages change from unchanged to written, or back */
+        n = dirty_map_span(dirty, (uintptr_t)s->first_byte_in_child + *index, n, &range->unchanged);
+
+        range->swath = s;
+        range->first = *index;
+        range->end = range->extra_end = *index + n;
+        /* the last match of the chunk may go on in the next one */
+        if (n == bytes_left)
+            range->extra_end = MIN(s->number_of_bytes, range->end + (1<<16) - 1);
+
+        /* read whole words, ptrace() can't do better */
+        start = (uintptr_t)s->first_byte_in_child + range->first;
+        end = (uintptr_t)s->first_byte_in_child + range->extra_end;
+        for (i = range->first; i < range->end; i++)
+            end = MAX(end, (uintptr_t)s->first_byte_in_child + i +
+                           flags_to_memlength(scan_data_type, s->data[i].match_info));
+        start -= start % sizeof(long);
+        end += (sizeof(long) - end % sizeof(long)) % sizeof(long);
+        /* the last match may go on in a written page */
+        if (range->unchanged && dirty_map_span(dirty, start, end - start, &range->unchanged) < end - start)
+            range->unchanged = false;
+
+        iov->addr = start;
+        iov->size = end - start;
+        iov->data = &batch->data[used];
+        used += iov->size;
+
+        nchecked += n;
+        bytes_left -= n;
+        *index += n;
+        if (*index >= s->number_of_bytes) {
+            *swath = local_address_beyond_last_element(s);
+            *index = 0;
+        }
+    }
+    return nchecked;
+}
 
+/* checks the old matches of a chunk, keeping those which still match */
+static bool check_chunk(scan_pool_t *pool, scan_chunk_t *c)
+{
+    globals_t *vars = pool->vars;
+    matches_and_old_values_swath *reading_swath_index = c->swath;
+    size_t reading_iterator = c->index;
+    size_t bytes_left = c->size;
     int required_extra_bytes_to_record = 0;
-    vars->num_matches = 0;
-    vars->scan_progress = 0.0;
-    vars->stop_flag = false;
+    check_batch_t *batch;
+    size_t k, i;
 
-    /* stop and attach to the target */
-    if (sm_attach(vars->target) == false)
+    if (!(c->matches = allocate_array(NULL, c->max_bytes)))
         return false;
+    c->writing_swath = c->matches->swaths;
+    c->writing_swath->first_byte_in_child = NULL;
+    c->writing_swath->number_of_bytes = 0;
 
-    INTERRUPTABLESCAN();
+    if (!(batch = malloc(sizeof(check_batch_t))))
+        return false;
 
-    while (reading_swath.first_byte_in_child) {
-        unsigned int match_length = 0;
-        const mem64_t *memory_ptr;
-        size_t memlength;
-        match_flags checkflags;
+    while (bytes_left && !vars->stop_flag) {
+        size_t nchecked = check_batch_fill(batch, vars->options.scan_data_type, pool->dirty,
+                                           &reading_swath_index, &reading_iterator, bytes_left);
+        check_batch_read(batch);
 
-        match_flags old_flags = reading_swath_index->data[reading_iterator].match_info;
-        unsigned int old_length = flags_to_memlength(vars->options.scan_data_type, old_flags);
-        void *address = reading_swath.first_byte_in_child + reading_iterator;
+        for (k = 0; k < batch->count; k++) {
+            const check_range_t *range = &batch->range[k];
+            const procmem_iov_t *iov = &batch->iov[k];
+            matches_and_old_values_swath *swath = range->swath;
 
-        /* read value from this address */
-        if (UNLIKELY(sm_peekdata(address, old_length, &memory_ptr, &memlength) == false))
-        {
-            /* If we can't look at the data here, just abort the whole recording, something bad happened */
-            required_extra_bytes_to_record = 0;
+            if (range->first == 0)
+                required_extra_bytes_to_record = 0; /* just in case */
+
+            for (i = range->first; i < range->extra_end; i++) {
+                unsigned int match_length = 0;
+                const mem64_t *memory_ptr = NULL;
+                size_t memlength;
+                match_flags checkflags;
+
+                /* past the chunk, only the rest of its last match is recorded */
+                if (i >= range->end && required_extra_bytes_to_record == 0)
+                    break;
+
+                match_flags old_flags = swath->data[i].match_info;
+                unsigned int old_length = flags_to_memlength(vars->options.scan_data_type, old_flags);
+                void *address = swath->first_byte_in_child + i;
+                size_t offset = (uintptr_t)address - iov->addr;
+
+                if (UNLIKELY(offset >= iov->ndone))
+                {
+                    /* If we can't look at the data here, just abort the whole recording, something bad happened */
+                    required_extra_bytes_to_record = 0;
+                    continue;
+                }
+                memory_ptr = (const mem64_t *)&iov->data[offset];
+                memlength = iov->ndone - offset;
+
+                if (i < range->end && old_flags != flags_empty) /* Test only valid old matches */
+                {
+                    value_t old_val = data_to_val_aux(swath, i, swath->number_of_bytes);
+                    memlength = old_length < memlength ? old_length : memlength;
+
+                    checkflags = flags_empty;
+
+                    match_length = (*sm_scan_routine)(memory_ptr, memlength, &old_val, pool->uservalue, &checkflags);
+                }
+
+                if (match_length > 0)
+                {
+                    assert(match_length <= memlength);
+
+                    /* Still a candidate. Write data. */
+                    c->writing_swath = add_element(&(c->matches), c->writing_swath, address,
+                                                   get_u8b(memory_ptr), checkflags);
+
+                    ++c->num_matches;
+
+                    /* keep the bytes up to the end of the longest match */
+                    if (required_extra_bytes_to_record)
+                        --required_extra_bytes_to_record;
+                    required_extra_bytes_to_record = MAX(required_extra_bytes_to_record, (int)match_length - 1);
+                }
+                else if (required_extra_bytes_to_record)
+                {
+                    c->writing_swath = add_element(&(c->matches), c->writing_swath, address,
+                                                   get_u8b(memory_ptr), flags_empty);
+                    --required_extra_bytes_to_record;
+                }
+            }
         }
-        else if (old_flags != flags_empty) /* Test only valid old matches */
-        {
-            value_t old_val = data_to_val_aux(reading_swath_index, reading_iterator, reading_swath.number_of_bytes);
-            memlength = old_length < memlength ? old_length : memlength;
 
-            checkflags = flags_empty;
+        /* for front-end, update percentage */
+        atomic_fetch_add(&pool->bytes_scanned, nchecked);
+        bytes_left -= nchecked;
+        if (!pool->num_threads)
+            scan_pool_progress(pool);
+    }
+    free(batch);
+
+    /* a stopped chunk is done too */
+    atomic_fetch_add(&pool->bytes_scanned, bytes_left);
+    atomic_fetch_add(&pool->num_matches, c->num_matches);
+    return (c->matches = null_terminate(c->matches, c->writing_swath)) != NULL;
+}
+
+/* flags of every byte of a snapshot of `scan_data_type` (those set by its MATCHANY routine),
+ * empty for the types which are kept in dense swaths */
+static match_flags snapshot_flags(scan_data_type_t scan_data_type)
+{
+    static const mem64_t any_memory;
+    match_flags flags = flags_empty;
+    scan_routine_t any;
+
+    if (scan_data_type == BYTEARRAY || scan_data_type == STRING)
+        return flags_empty;
+    if ((any = sm_get_scanroutine(scan_data_type, MATCHANY, flags_empty, false)))
+        any(&any_memory, sizeof(any_memory), NULL, NULL, &flags);
+    return flags;
+}
 
-            match_length = (*sm_scan_routine)(memory_ptr, memlength, &old_val, uservalue, &checkflags);
+/* the dense swaths are made once they can't take more memory than the snapshot */
+static bool snapshot_shrunk(globals_t *vars)
+{
+    size_t max_bytes_per_match = sizeof(matches_and_old_values_swath) +
+                                 sizeof(int64_t) * sizeof(old_value_and_match_info);
+
+    return vars->num_matches <= snapshot_bytes(vars->snapshot) / max_bytes_per_match;
+}
+
+/* splits the regions of the snapshot in chunks, for sm_checkmatches() */
+static bool snapshot_split(scan_pool_t *pool, matches_snapshot *snap)
+{
+    size_t r, offset;
+
+    for (r = 0; r < snap->num_regions; r++) {
+        pool->num_chunks += (snap->regions[r].number_of_bytes + SEARCH_CHUNK_SIZE - 1) / SEARCH_CHUNK_SIZE;
+        pool->total_bytes += snap->regions[r].number_of_bytes;
+    }
+    if (!(pool->chunks = calloc(pool->num_chunks, sizeof(scan_chunk_t))))
+        return false;
+    pool->num_chunks = 0;
+
+    for (r = 0; r < snap->num_regions; r++) {
+        snapshot_region *region = &snap->regions[r];
+
+        for (offset = 0; offset < region->number_of_bytes; offset += SEARCH_CHUNK_SIZE) {
+            scan_chunk_t *c = &pool->chunks[pool->num_chunks++];
+
+            c->snapshot = region;
+            c->index = offset;
+            c->start = region->first_byte_in_child + offset;
+            c->size = MIN(region->number_of_bytes - offset, SEARCH_CHUNK_SIZE);
+            c->region_size = region->number_of_bytes - offset;
+            memcpy(c->next_old_values, &region->old_values[offset + c->size],
+                   MIN(c->region_size - c->size, sizeof(c->next_old_values)));
         }
+    }
+    return true;
+}
 
-        if (match_length > 0)
-        {
-            assert(match_length <= memlength);
+/* The counterpart of scan_pool_merge() for a snapshot: the matches of the chunks
+ * which were not scanned (on a stop or a failure) are dropped and `vars->matches`
+ * is left empty, the handlers only need to know that there are matches. */
+static bool snapshot_merge(scan_pool_t *pool)
+{
+    globals_t *vars = pool->vars;
+    size_t i;
 
-            /* Still a candidate. Write data.
-               - We can get away with overwriting in the same array because it is guaranteed to take up the same number of bytes or fewer,
-                 and because we copied out the reading swath metadata already.
-               - We can get away with assuming that the pointers will stay valid,
-                 because as we never add more data to the array than there was before, it will not reallocate. */
+    for (i = 0; i < pool->num_chunks; i++) {
+        scan_chunk_t *c = &pool->chunks[i];
 
-            writing_swath_index = add_element(&(vars->matches), writing_swath_index, address,
-                                              get_u8b(memory_ptr), checkflags);
+        if (!c->done)
+            snapshot_drop(vars->snapshot, c->snapshot, c->index, c->index + c->size);
+    }
+    if (!(vars->matches = allocate_array(vars->matches, 0)))
+        return false;
+    vars->matches->swaths[0].first_byte_in_child = NULL;
+    vars->matches->swaths[0].number_of_bytes = 0;
+    return true;
+}
+
+/* the old value of a byte of the chunk, with the bytes after it */
+static inline value_t snapshot_old_value(const scan_chunk_t *c, size_t index, match_flags flags)
+{
+    const snapshot_region *region = c->snapshot;
+    size_t i, end = c->index + c->size;
+    size_t max_bytes = MIN(region->number_of_bytes - index, sizeof(int64_t));
+    value_t val;
+
+    memset(&val, 0, sizeof(val));
+    for (i = 0; i < max_bytes; i++)
+        val.bytes[i] = index + i < end ? region->old_values[index + i] : c->next_old_values[index + i - end];
+    val.flags = flags;
+    return val;
+}
 
-            ++vars->num_matches;
+/* the offsets of [first, end) which may hold a match */
+static inline size_t snapshot_count_aligned(const matches_snapshot *snap, size_t first, size_t end)
+{
+    if (first >= end)
+        return 0;
+    return (end + snap->stride - 1) / snap->stride - (first + snap->stride - 1) / snap->stride;
+}
 
-            required_extra_bytes_to_record = match_length - 1;
+/* copies a chunk of a region into the snapshot, every aligned offset is a match */
+static bool snapshot_chunk(scan_pool_t *pool, scan_chunk_t *c)
+{
+    globals_t *vars = pool->vars;
+    matches_snapshot *snap = vars->snapshot;
+    snapshot_region *region = c->snapshot;
+    size_t pos = c->index, end = c->index + c->size, released = pos;
+    /* the bytes from `last` to the end of the region are too few for any type */
+    size_t last = region->number_of_bytes + 1 - ((snap->flags & flags_8b)  ? 1 :
+                                                 (snap->flags & flags_16b) ? 2 :
+                                                 (snap->flags & flags_32b) ? 4 : 8);
+
+    while (pos < end && !vars->stop_flag) {
+        size_t n = MIN(end - pos, MAX_BUFFER_SIZE);
+        size_t nread = readmemory(&region->old_values[pos], region->first_byte_in_child + pos, n);
+        size_t i;
+
+        c->num_matches += snapshot_count_aligned(snap, pos, MIN(pos + nread, last));
+
+        if (nread < n) {
+            if (nread == 0 && pos == c->index && c->regnum) {
+                /* Failed on first read, which means region not exist. */
+                show_warn("reading region %02lu failed.\n", c->regnum);
+            }
+            /* the region ends here, the types of the last bytes must fit before it */
+            for (i = pos + nread - MIN(pos + nread - c->index, sizeof(int64_t) - 1); i < pos + nread; i++) {
+                match_flags flags = snapshot_get_flags(snap, region, i);
+                match_flags fitting = flags_8b;
+                size_t max_bytes = pos + nread - i;
+
+                if (max_bytes >= 2) fitting |= flags_16b;
+                if (max_bytes >= 4) fitting |= flags_32b;
+                if (flags != flags_empty && !(flags & fitting))
+                    --c->num_matches;
+                snapshot_set_flags(snap, region, i, flags & fitting);
+            }
+            snapshot_drop(snap, region, pos + nread, end);
+            atomic_fetch_add(&pool->bytes_scanned, end - pos);
+            pos = end;
+            break;
         }
-        else if (required_extra_bytes_to_record)
-        {
-            writing_swath_index = add_element(&(vars->matches), writing_swath_index, address,
-                                              get_u8b(memory_ptr), flags_empty);
-            --required_extra_bytes_to_record;
-        }
-
-        if (UNLIKELY(bytes_scanned >= bytes_at_next_sample)) {
-            bytes_at_next_sample += bytes_per_sample;
-            /* handle rounding */
-            if (LIKELY(--samples_remaining > 0)) {
-                /* for front-end, update percentage */
-                vars->scan_progress += PROGRESS_PER_SAMPLE;
-                if (UNLIKELY(--samples_to_dot == 0)) {
-                    samples_to_dot = SAMPLES_PER_DOT;
-                    /* for user, just print a dot */
-                    print_a_dot();
-                }
-                /* stop scanning if asked to */
-                if (vars->stop_flag) {
-                    printf("\n");
-                    break;
-                }
+
+        /* for front-end, update percentage */
+        atomic_fetch_add(&pool->bytes_scanned, n);
+        if (!pool->num_threads)
+            scan_pool_progress(pool);
+        pos += n;
+
+        if (pos - released >= snap->window) {
+            snapshot_release(snap, region, released, pos);
+            released = pos;
+        }
+    }
+
+    /* a stopped chunk has no matches left */
+    atomic_fetch_add(&pool->bytes_scanned, end - pos);
+    snapshot_drop(snap, region, pos, end);
+    snapshot_release(snap, region, released, end);
+    atomic_fetch_add(&pool->num_matches, c->num_matches);
+    c->done = true;
+    return true;
+}
+
+/* reads `size` bytes of a region of the snapshot from `pos`, those of the pages unchanged
+ * since the last scan are copied from the old values, returns the number of bytes read */
+static size_t snapshot_read(const scan_pool_t *pool, const snapshot_region *region, uint8_t *data,
+                            size_t pos, size_t size)
+{
+    size_t done = 0;
+
+    while (done < size) {
+        const char *address = region->first_byte_in_child + pos + done;
+        bool unchanged;
+        size_t n = dirty_map_span(pool->dirty, (uintptr_t)address, size - done, &unchanged);
+
+        if (unchanged) {
+            memcpy(&data[done], &region->old_values[pos + done], n);
+        } else {
+            size_t nread = readmemory(&data[done], address, n);
+
+            if (nread < n)
+                return done + nread;
+        }
+        done += n;
+    }
+    return done;
+}
+
+/* checks the bytes of a chunk of the snapshot, the flags which still match are kept
+ * and the current values replace the old ones */
+static bool snapshot_check_chunk(scan_pool_t *pool, scan_chunk_t *c)
+{
+    globals_t *vars = pool->vars;
+    matches_snapshot *snap = vars->snapshot;
+    snapshot_region *region = c->snapshot;
+    size_t pos = c->index, end = c->index + c->size, released = pos;
+    uint8_t *data;
+
+    /* the last bytes of a buffer may need the next ones */
+    if (!(data = malloc(MAX_BUFFER_SIZE + sizeof(int64_t))))
+        return false;
+
+    while (pos < end && !vars->stop_flag) {
+        size_t n = MIN(end - pos, MAX_BUFFER_SIZE);
+        size_t nread = snapshot_read(pool, region, data, pos,
+                                     MIN(region->number_of_bytes - pos, n + sizeof(int64_t) - 1));
+        size_t i, k;
+
+        /* `pos` is a multiple of the stride, like the chunk */
+        for (i = 0; i < n; i += snap->stride) {
+            match_flags old_flags = snapshot_get_flags(snap, region, pos + i);
+            match_flags checkflags = flags_empty;
+
+            if (old_flags != flags_empty && i < nread) {
+                value_t old_val = snapshot_old_value(c, pos + i, old_flags);
+                size_t memlength = MIN(flags_to_memlength(vars->options.scan_data_type, old_flags), nread - i);
+
+                if ((*sm_scan_routine)((const mem64_t *)&data[i], memlength, &old_val, pool->uservalue, &checkflags) > 0)
+                    ++c->num_matches;
+                else
+                    checkflags = flags_empty;
             }
+            if (checkflags != old_flags)
+                snapshot_set_flags(snap, region, pos + i, checkflags);
         }
-        ++bytes_scanned;
-        
-        /* go on to the next one... */
-        ++reading_iterator;
-        if (reading_iterator >= reading_swath.number_of_bytes)
+
+        /* the bytes after the buffer are still needed as old values, the unchanged ones are there */
+        for (i = 0; i < MIN(n, nread); i += k) {
+            bool unchanged;
+
+            k = dirty_map_span(pool->dirty, (uintptr_t)region->first_byte_in_child + pos + i,
+                               MIN(n, nread) - i, &unchanged);
+            if (!unchanged)
+                memcpy(&region->old_values[pos + i], &data[i], k);
+        }
+
+        /* for front-end, update percentage */
+        atomic_fetch_add(&pool->bytes_scanned, n);
+        if (!pool->num_threads)
+            scan_pool_progress(pool);
+        pos += n;
+
+        if (pos - released >= snap->window) {
+            snapshot_release(snap, region, released, pos);
+            released = pos;
+        }
+    }
+    free(data);
+
+    /* a stopped chunk has no matches left */
+    atomic_fetch_add(&pool->bytes_scanned, end - pos);
+    snapshot_drop(snap, region, pos, end);
+    snapshot_release(snap, region, released, end);
+    atomic_fetch_add(&pool->num_matches, c->num_matches);
+    c->done = true;
+    return true;
+}
+
+/* This is the function that handles when you enter a value (or >, <, =) for the second or later time (i.e. when there's already a list of matches);
+ * it reduces the list to those that still match. It returns false on failure to attach, detach, or reallocate memory, otherwise true. */
+bool sm_checkmatches(globals_t *vars,
+                     scan_match_type_t match_type,
+                     const uservalue_t *uservalue)
+{
+    matches_and_old_values_swath *reading_swath_index;
+    scan_pool_t pool = { .vars = vars, .uservalue = uservalue, .scan_chunk = check_chunk };
+    scan_chunk_t *c = NULL;
+    size_t i, chunk_left = 0;
+    bool ok;
+
+    if (sm_choose_scanroutine(vars->options.scan_data_type, match_type, uservalue, vars->options.reverse_endianness) == false)
+    {
+        show_error("unsupported scan for current data type.\n");
+        return false;
+    }
+
+    assert(sm_scan_routine);
+
+    if (vars->snapshot) {
+        match_flags flags = snapshot_flags(vars->options.scan_data_type);
+
+        /* the bitmaps only have the flags of the snapshot */
+        if ((flags == flags_empty || (flags & ~vars->snapshot->flags)) && !sm_expand_snapshot(vars))
+            return false;
+    }
+
+    if (vars->snapshot) {
+        pool.scan_chunk = snapshot_check_chunk;
+        if (!snapshot_split(&pool, vars->snapshot))
         {
-            reading_swath_index = (matches_and_old_values_swath *)
-                (&reading_swath_index->data[reading_swath.number_of_bytes]);
-            reading_swath = *reading_swath_index;
-            reading_iterator = 0;
-            required_extra_bytes_to_record = 0; /* just in case */
+            show_error("sorry, there was a memory allocation error.\n");
+            return false;
         }
+    } else {
+        /* split the old matches in chunks of about the same size */
+        for (reading_swath_index = vars->matches->swaths; reading_swath_index->number_of_bytes;
+             reading_swath_index = local_address_beyond_last_element(reading_swath_index))
+            pool.total_bytes += reading_swath_index->number_of_bytes;
+
+        if (!(pool.chunks = calloc(pool.total_bytes / CHECK_CHUNK_SIZE + 1, sizeof(scan_chunk_t))))
+        {
+            show_error("sorry, there was a memory allocation error.\n");
+            return false;
+        }
+        for (reading_swath_index = vars->matches->swaths; reading_swath_index->number_of_bytes;
+             reading_swath_index = local_address_beyond_last_element(reading_swath_index))
+        {
+            for (i = 0; i < reading_swath_index->number_of_bytes; ) {
+                size_t n;
+
+                if (chunk_left == 0) {
+                    c = &pool.chunks[pool.num_chunks++];
+                    c->swath = reading_swath_index;
+                    c->index = i;
+                    c->max_bytes = sizeof(matches_and_old_values_array) + sizeof(matches_and_old_values_swath) +
+                                   (1<<16) * sizeof(old_value_and_match_info);
+                    chunk_left = CHECK_CHUNK_SIZE;
+                }
+                n = MIN(chunk_left, reading_swath_index->number_of_bytes - i);
+                c->size += n;
+                c->max_bytes += n * sizeof(old_value_and_match_info) + sizeof(matches_and_old_values_swath);
+                chunk_left -= n;
+                i += n;
+            }
+        }
+    }
+    pool.num_threads = scan_pool_threads(vars, pool.num_chunks);
+
+    vars->num_matches = 0;
+    vars->scan_progress = 0.0;
+    vars->stop_flag = false;
+
+    /* stop and attach to the target */
+    if (sm_attach(vars->target) == false) {
+        scan_pool_free(&pool);
+        return false;
     }
+    pool.dirty = dirty_map_new(vars);
+    dirty_map_clear(vars);
+
+    INTERRUPTABLESCAN();
+
+    ok = scan_pool_run(&pool);
 
     ENDINTERRUPTABLE();
 
-    if (!(vars->matches = null_terminate(vars->matches, writing_swath_index)))
+    dirty_map_free((dirty_map_t *)pool.dirty);
+
+    if (vars->snapshot ? !snapshot_merge(&pool) : !scan_pool_merge(&pool))
     {
         show_error("memory allocation error while reducing matches-array size\n");
+        scan_pool_free(&pool);
+        vars->soft_dirty_target = 0;
         return false;
     }
+    scan_pool_free(&pool);
 
-    show_user("ok\n");
+    if (vars->snapshot && snapshot_shrunk(vars) && !sm_expand_snapshot(vars)) {
+        vars->soft_dirty_target = 0;
+        sm_detach(vars->target);
+        return false;
+    }
+
+    if (vars->stop_flag)
+        printf("\n");
+    else if (ok)
+        show_user("ok\n");
+    else
+        show_error("there was an error while checking the matches.\n");
+    show_scan_stats(vars);
 
     /* tell front-end we've done */
     vars->scan_progress = MAX_PROGRESS;
 
     show_info("we currently have %ld matches.\n", vars->num_matches);
 
+    /* the old values of a failed scan can't be trusted */
+    if (!ok)
+        vars->soft_dirty_target = 0;
+
     /* okay, detach */
-    return sm_detach(vars->target);
+    return sm_detach(vars->target) && ok;
+}
+
+/* searches a chunk of a region for new matches */
+/* matches the offset `pos` of the buffer, the flags which aren't aligned there are dropped */
+static inline unsigned int search_offset(scan_pool_t *pool, const uint8_t *buf_pos, void *reg_pos,
+                                         size_t pos, size_t memlength, match_flags *checkflags)
+{
+    globals_t *vars = pool->vars;
+    unsigned int match_length;
+    match_flags aligned;
+
+    /* initialize checkflags */
+    *checkflags = flags_empty;
+
+    match_length = (*sm_scan_routine)((const mem64_t *)(buf_pos + pos), memlength - pos, NULL,
+                                      pool->uservalue, checkflags);
+    if (match_length == 0 || vars->options.alignment == 1)
+        return match_length;
+
+    aligned = *checkflags & sm_alignment_flags(vars->options.alignment, vars->options.scan_data_type,
+                                               (uintptr_t)(reg_pos + pos));
+    if (aligned != *checkflags) {
+        *checkflags = aligned;
+        match_length = flags_to_memlength(vars->options.scan_data_type, aligned);
+    }
+    return match_length;
+}
+
+/* appends the match at `pos` of the buffer, after the extra bytes of the previous matches
+ * which come before it (they start at `*extra_pos`), the extra bytes go on up to the end
+ * of the longest one (a shorter match may follow a longer one when they are aligned) */
+static inline void search_add_match(scan_chunk_t *c, const uint8_t *buf_pos, void *reg_pos,
+                                    size_t pos, unsigned int match_length, match_flags checkflags,
+                                    int *required_extra_bytes_to_record, size_t *extra_pos)
+{
+    size_t extra_end = *extra_pos + *required_extra_bytes_to_record;
+    size_t extra = MIN((size_t)*required_extra_bytes_to_record, pos - *extra_pos);
+
+    c->writing_swath = add_elements(&(c->matches), c->writing_swath, reg_pos + *extra_pos,
+                                    buf_pos + *extra_pos, extra, flags_empty);
+    c->writing_swath = add_element(&(c->matches), c->writing_swath, reg_pos + pos,
+                                   buf_pos[pos], checkflags);
+    ++c->num_matches;
+
+    *required_extra_bytes_to_record = MAX(extra_end, pos + match_length) - (pos + 1);
+    *extra_pos = pos + 1;
+}
+
+/* the extra bytes within the buffer are final, the rest are left for the next one */
+static inline void search_add_extra(scan_chunk_t *c, const uint8_t *buf_pos, void *reg_pos,
+                                    size_t buffer_size, int *required_extra_bytes_to_record, size_t extra_pos)
+{
+    size_t extra = MIN((size_t)*required_extra_bytes_to_record, buffer_size - extra_pos);
+
+    c->writing_swath = add_elements(&(c->matches), c->writing_swath, reg_pos + extra_pos,
+                                    buf_pos + extra_pos, extra, flags_empty);
+    *required_extra_bytes_to_record -= extra;
 }
 
+/* matches the aligned offsets [0, buffer_size) of the buffer one by one */
+static void search_buffer(scan_pool_t *pool, scan_chunk_t *c, const uint8_t *buf_pos, size_t buffer_size,
+                          void *reg_pos, size_t memlength, size_t stride, int *required_extra_bytes_to_record)
+{
+    size_t pos = (stride - (uintptr_t)reg_pos % stride) % stride;
+    size_t extra_pos = 0; /* the extra bytes of the last match start here */
+
+    for ( ; pos < buffer_size; pos += stride) {
+        match_flags checkflags;
+
+        /* check if we have a match */
+        unsigned int match_length = search_offset(pool, buf_pos, reg_pos, pos, memlength, &checkflags);
+        if (UNLIKELY(match_length > 0))
+        {
+            assert(match_length <= memlength - pos);
+            search_add_match(c, buf_pos, reg_pos, pos, match_length, checkflags,
+                             required_extra_bytes_to_record, &extra_pos);
+        }
+    }
+    search_add_extra(c, buf_pos, reg_pos, buffer_size, required_extra_bytes_to_record, extra_pos);
+}
+
+/* same as `search_buffer()`, but `sm_scan_block_routine` finds the matched offsets
+ * and only those are passed to `sm_scan_routine` for their flags */
+static void search_buffer_blocks(scan_pool_t *pool, scan_chunk_t *c, const uint8_t *buf_pos, size_t buffer_size,
+                                 const uint8_t *buf_end, void *reg_pos, size_t memlength, size_t stride,
+                                 int *required_extra_bytes_to_record, uint32_t *offsets)
+{
+    size_t first = (stride - (uintptr_t)reg_pos % stride) % stride;
+    size_t extra_pos = 0; /* the extra bytes of the last match start here */
+
+    for ( ; first < buffer_size; first += SCAN_BLOCK_SIZE) {
+        size_t count = MIN(buffer_size - first, SCAN_BLOCK_SIZE);
+        size_t n = (*sm_scan_block_routine)(buf_pos + first, count, buf_end - buf_pos - first, stride,
+                                            pool->uservalue, offsets);
+
+        for (size_t k = 0; k < n; k++) {
+            size_t pos = first + offsets[k];
+            match_flags checkflags;
+            unsigned int match_length = search_offset(pool, buf_pos, reg_pos, pos, memlength, &checkflags);
+
+            if (match_length > 0) {
+                assert(match_length <= memlength - pos);
+                search_add_match(c, buf_pos, reg_pos, pos, match_length, checkflags,
+                                 required_extra_bytes_to_record, &extra_pos);
+            }
+        }
+    }
+    search_add_extra(c, buf_pos, reg_pos, buffer_size, required_extra_bytes_to_record, extra_pos);
+}
+
+static bool search_chunk(scan_pool_t *pool, scan_chunk_t *c)
+{
+    globals_t *vars = pool->vars;
+    int required_extra_bytes_to_record = 0;
+    unsigned char *data = NULL;
+    uint32_t *offsets = NULL;
+    /* only the aligned offsets are matched */
+    size_t stride = sm_alignment_stride(vars->options.alignment, vars->options.scan_data_type);
+
+    if (!(c->matches = allocate_array(NULL, c->max_bytes)))
+        return false;
+    c->writing_swath = c->matches->swaths;
+    c->writing_swath->first_byte_in_child = NULL;
+    c->writing_swath->number_of_bytes = 0;
+
+    /* allocate data array */
+    size_t alloc_size = MIN(c->region_size, MAX_ALLOC_SIZE);
+    if ((data = malloc(alloc_size * sizeof(char))) == NULL)
+        return false;
+
+    if (sm_scan_block_routine && !(offsets = malloc(SCAN_BLOCK_SIZE * sizeof(uint32_t)))) {
+        free(data);
+        return false;
+    }
+
+    /* For every offset, check if we have a match. */
+    size_t memlength = c->region_size;  /* bytes left up to the end of the region */
+    size_t checklength = c->size;       /* bytes left up to the end of the chunk */
+    size_t buffer_size = 0;
+    void *reg_pos = c->start;
+    void *counted_pos = c->start;
+    const uint8_t *buf_pos = NULL;
+    const uint8_t *buf_end = NULL;
+    for ( ; ; memlength -= buffer_size, checklength -= buffer_size,
+              reg_pos += buffer_size, buf_pos += buffer_size) {
+
+        /* for front-end, update percentage */
+        atomic_fetch_add(&pool->bytes_scanned, reg_pos - counted_pos);
+        counted_pos = reg_pos;
+        if (!pool->num_threads)
+            scan_pool_progress(pool);
+
+        /* the whole chunk is finished */
+        if (checklength == 0) break;
+
+        /* stop scanning if asked to */
+        if (vars->stop_flag) break;
+
+        /* load the next buffer block */
+        size_t read_size = MIN(memlength, MAX_ALLOC_SIZE);
+        size_t nread = readmemory(data, reg_pos, read_size);
+        if (nread < read_size) {
+            /* the region ends here, update `memlength` */
+            memlength = nread;
+            checklength = MIN(checklength, memlength);
+            if (nread == 0) {
+                if (reg_pos == c->start && c->regnum) {
+                    /* Failed on first read, which means region not exist. */
+                    show_warn("reading region %02lu failed.\n", c->regnum);
+                }
+                break;
+            }
+        }
+        /* If less than `MAX_ALLOC_SIZE` bytes remain, we have all of them
+         * in the buffer, so go all the way.
+         * Otherwise we need to stop at `MAX_BUFFER_SIZE`, so that
+         * the last byte we look at has a full VLT after it */
+        buffer_size = memlength <= MAX_ALLOC_SIZE ? memlength : MAX_BUFFER_SIZE;
+        buffer_size = MIN(buffer_size, checklength);
+        buf_pos = data;
+        buf_end = data + nread;
+
+        if (offsets)
+            search_buffer_blocks(pool, c, buf_pos, buffer_size, buf_end, reg_pos, memlength, stride,
+                                 &required_extra_bytes_to_record, offsets);
+        else
+            search_buffer(pool, c, buf_pos, buffer_size, reg_pos, memlength, stride,
+                          &required_extra_bytes_to_record);
+    }
+
+    /* the last match may go on in the next chunk, it's still in the buffer */
+    if (checklength == 0) {
+        for ( ; required_extra_bytes_to_record && buf_pos < buf_end;
+              --required_extra_bytes_to_record, reg_pos++, buf_pos++)
+        {
+            c->writing_swath = add_element(&(c->matches), c->writing_swath, reg_pos,
+                                           *buf_pos, flags_empty);
+        }
+    }
+
+    free(offsets);
+    free(data);
+
+    /* an unreadable rest of the region is done too */
+    atomic_fetch_add(&pool->bytes_scanned, c->size - (counted_pos - c->start));
+    atomic_fetch_add(&pool->num_matches, c->num_matches);
+    return (c->matches = null_terminate(c->matches, c->writing_swath)) != NULL;
+}
 
 /* sm_searchregions() performs an initial search of the process for values matching `uservalue` */
 bool sm_searchregions(globals_t *vars, scan_match_type_t match_type, const uservalue_t *uservalue)
 {
-    matches_and_old_values_swath *writing_swath_index;
-    int required_extra_bytes_to_record = 0;
-    unsigned long total_size = 0;
+    scan_pool_t pool = { .vars = vars, .uservalue = uservalue, .scan_chunk = search_chunk };
+    match_flags flags = match_type == MATCHANY ? snapshot_flags(vars->options.scan_data_type) : flags_empty;
     unsigned long regnum = 0;
-    element_t *n = vars->regions->head;
+    element_t *n;
     region_t *r;
-    unsigned long total_scan_bytes = 0;
-    unsigned char *data = NULL;
+    size_t offset;
+    bool ok;
 
     if (sm_choose_scanroutine(vars->options.scan_data_type, match_type, uservalue, vars->options.reverse_endianness) == false)
     {
@@ -510,6 +1638,7 @@ bool sm_searchregions(globals_t *vars, scan_match_type_t match_type, const userv
     /* stop and attach to the target */
     if (sm_attach(vars->target) == false)
         return false;
+    vars->soft_dirty_target = 0;
 
    
     /* make sure we have some regions to search */
@@ -519,167 +1648,107 @@ bool sm_searchregions(globals_t *vars, scan_match_type_t match_type, const userv
         return sm_detach(vars->target);
     }
 
-    INTERRUPTABLESCAN();
-    
-    total_size = sizeof(matches_and_old_values_array);
-
-    while (n) {
-        total_size += ((region_t *)(n->data))->size * sizeof(old_value_and_match_info) + sizeof(matches_and_old_values_swath);
-        n = n->next;
+    /* a snapshot of numbers is kept compact, see `matches_snapshot` */
+    snapshot_free(vars->snapshot);
+    vars->snapshot = NULL;
+    if (flags != flags_empty) {
+        if (!(vars->snapshot = snapshot_new(vars->regions->size, flags, vars->options.alignment,
+                                            vars->options.snapshot_dir,
+                                            (size_t)vars->options.snapshot_window << 20))) {
+            show_error("sorry, there was a memory allocation error.\n");
+            sm_detach(vars->target);
+            return false;
+        }
+        pool.scan_chunk = snapshot_chunk;
     }
-    
-    total_size += sizeof(matches_and_old_values_swath); /* for null terminate */
-    
-    show_debug("allocate array, max size %ld\n", total_size);
 
-    if (!(vars->matches = allocate_array(vars->matches, total_size)))
-    {
-        show_error("could not allocate match array\n");
+    /* split the regions in chunks */
+    for (n = vars->regions->head; n; n = n->next) {
+        r = n->data;
+        pool.num_chunks += (r->size + SEARCH_CHUNK_SIZE - 1) / SEARCH_CHUNK_SIZE;
+    }
+    if (!(pool.chunks = calloc(pool.num_chunks, sizeof(scan_chunk_t)))) {
+        show_error("sorry, there was a memory allocation error.\n");
+        sm_detach(vars->target);
         return false;
     }
-    
-    writing_swath_index = vars->matches->swaths;
-    
-    writing_swath_index->first_byte_in_child = NULL;
-    writing_swath_index->number_of_bytes = 0;
-    
-    /* get total number of bytes */
-    for(n = vars->regions->head; n; n = n->next)
-        total_scan_bytes += ((region_t *)n->data)->size;
-
-    vars->scan_progress = 0.0;
-    vars->stop_flag = false;
-    n = vars->regions->head;
+    pool.num_chunks = 0;
 
-    /* check every memory region */
-    while (n) {
-        size_t bytes_remaining;
-        size_t bytes_per_dot;
-        double progress_per_dot;
+    for (n = vars->regions->head; n; n = n->next) {
+        snapshot_region *region = NULL;
 
-        /* load the next region */
         r = n->data;
-        bytes_per_dot = r->size / NUM_DOTS;
-        bytes_remaining = bytes_per_dot * NUM_DOTS;
-        progress_per_dot = (double)bytes_per_dot / total_scan_bytes;
-
-/* The maximum logical size is a comfortable 1MiB (increasing it does not help).
- * The actual allocation is that plus the rounded size of the maximum possible VLT.
- * This is needed because the last byte might be scanned as max size VLT,
- * thus need (2^16 - 2) extra bytes after it */
-#define MAX_BUFFER_SIZE (1<<20)
-#define MAX_ALLOC_SIZE  (MAX_BUFFER_SIZE + (1<<16))
-
-        /* allocate data array */
-        size_t alloc_size = MIN(r->size, MAX_ALLOC_SIZE);
-        if ((data = malloc(alloc_size * sizeof(char))) == NULL) {
-            show_error("sorry, there was a memory allocation error.\n");
+        ++regnum;
+        if (vars->snapshot && !(region = snapshot_add_region(vars->snapshot, r->start, r->size))) {
+            show_error("failed to map %lu bytes for the snapshot of region %02lu.\n", r->size, regnum);
+            scan_pool_free(&pool);
+            snapshot_free(vars->snapshot);
+            vars->snapshot = NULL;
+            sm_detach(vars->target);
             return false;
         }
+        for (offset = 0; offset < r->size; offset += SEARCH_CHUNK_SIZE) {
+            scan_chunk_t *c = &pool.chunks[pool.num_chunks++];
+
+            c->snapshot = region;
+            c->index = offset;
+            c->start = r->start + offset;
+            c->size = MIN(r->size - offset, SEARCH_CHUNK_SIZE);
+            c->region_size = r->size - offset;
+            c->regnum = offset ? 0 : regnum;
+            c->max_bytes = sizeof(matches_and_old_values_array) + 2 * sizeof(matches_and_old_values_swath) +
+                           MIN(c->region_size, c->size + (1<<16)) * sizeof(old_value_and_match_info);
+        }
+        pool.total_bytes += r->size;
+    }
+    pool.num_threads = scan_pool_threads(vars, pool.num_chunks);
 
-        /* print a progress meter so user knows we haven't crashed */
-        show_user("%02lu/%02lu searching %#10lx - %#10lx", ++regnum,
-                vars->regions->size, (unsigned long)r->start, (unsigned long)r->start + r->size);
-        fflush(stderr);
-
-        /* For every offset, check if we have a match. */
-        size_t memlength = r->size;
-        size_t buffer_size = 0;
-        void *reg_pos = r->start;
-        const uint8_t *buf_pos = NULL;
-        for ( ; ; memlength--, buffer_size--, reg_pos++, buf_pos++) {
-
-            /* check if the buffer is finished (or we just started) */
-            if (UNLIKELY(buffer_size == 0)) {
-
-                /* print a simple progress meter */
-                for ( ; memlength < bytes_remaining; bytes_remaining -= bytes_per_dot) {
-                    /* for user, just print a dot */
-                    print_a_dot();
-                    /* for front-end, update percentage */
-                    vars->scan_progress += progress_per_dot;
-                }
-
-                /* the whole region is finished */
-                if (memlength == 0) break;
-
-                /* stop scanning if asked to */
-                if (vars->stop_flag) break;
-
-                /* load the next buffer block */
-                size_t read_size = MIN(memlength, MAX_ALLOC_SIZE);
-                size_t nread = readmemory(data, reg_pos, read_size);
-                if (nread < read_size) {
-                    /* the region ends here, update `memlength` */
-                    memlength = nread;
-                    if ((nread == 0) && (reg_pos == r->start)) {
-                        /* Failed on first read, which means region not exist. */
-                        show_warn("reading region %02u failed.\n", regnum);
-                        break;
-                    }
-                }
-                /* If less than `MAX_ALLOC_SIZE` bytes remain, we have all of them
-                 * in the buffer, so go all the way.
-                 * Otherwise we need to stop at `MAX_BUFFER_SIZE`, so that
-                 * the last byte we look at has a full VLT after it */
-                buffer_size = memlength <= MAX_ALLOC_SIZE ? memlength : MAX_BUFFER_SIZE;
-                buf_pos = data;
-            }
-
-            const mem64_t* memory_ptr = (mem64_t*)buf_pos;
-            unsigned int match_length;
-            match_flags checkflags;
-
-            /* initialize checkflags */
-            checkflags = flags_empty;
+    vars->num_matches = 0;
+    vars->scan_progress = 0.0;
+    vars->stop_flag = false;
 
-            /* check if we have a match */
-            match_length = (*sm_scan_routine)(memory_ptr, memlength, NULL, uservalue, &checkflags);
-            if (UNLIKELY(match_length > 0))
-            {
-                assert(match_length <= memlength);
-                writing_swath_index = add_element(&(vars->matches), writing_swath_index, reg_pos,
-                                                  get_u8b(memory_ptr), checkflags);
-                
-                ++vars->num_matches;
-                
-                required_extra_bytes_to_record = match_length - 1;
-            }
-            else if (required_extra_bytes_to_record)
-            {
-                writing_swath_index = add_element(&(vars->matches), writing_swath_index, reg_pos,
-                                                  get_u8b(memory_ptr), flags_empty);
-                --required_extra_bytes_to_record;
-            }
+    /* print a progress meter for each region so user knows we haven't crashed */
+    pool.by_region = true;
+    show_debug("searching %lu regions by %u thread(s)\n", vars->regions->size,
+               pool.num_threads ? pool.num_threads : 1);
+    /* nothing of the target has been read yet */
+    dirty_map_clear(vars);
 
-        }
+    INTERRUPTABLESCAN();
 
-        free(data);
-
-        /* stop scanning if asked to */
-        if (vars->stop_flag) {
-            printf("\n");
-            break;
-        }
-        n = n->next;
-        show_user("ok\n");
-    }
+    ok = scan_pool_run(&pool);
 
     ENDINTERRUPTABLE();
 
-    /* tell front-end we've finished */
-    vars->scan_progress = MAX_PROGRESS;
-    
-    if (!(vars->matches = null_terminate(vars->matches, writing_swath_index)))
+    /* the line of the region is left open */
+    if (pool.region_size)
+        printf("\n");
+    show_scan_stats(vars);
+
+    if (vars->snapshot ? !snapshot_merge(&pool) : !scan_pool_merge(&pool))
     {
         show_error("memory allocation error while reducing matches-array size\n");
+        scan_pool_free(&pool);
+        vars->soft_dirty_target = 0;
+        sm_detach(vars->target);
         return false;
     }
+    scan_pool_free(&pool);
+
+    /* tell front-end we've finished */
+    vars->scan_progress = MAX_PROGRESS;
+
+    if (!ok)
+        show_error("there was an error while searching the regions.\n");
 
     show_info("we currently have %ld matches.\n", vars->num_matches);
 
+    /* the old values of a failed scan can't be trusted */
+    if (!ok)
+        vars->soft_dirty_target = 0;
+
     /* okay, detach */
-    return sm_detach(vars->target);
+    return sm_detach(vars->target) && ok;
 }
 
 /* Needs to support only ANYNUMBER types */
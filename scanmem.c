@@ -51,9 +51,12 @@ globals_t sm_globals = {
     0,                          /* exit flag */
     0,                          /* pid target */
     NULL,                       /* matches */
+    NULL,                       /* snapshot */
     0,                          /* match count */
     0,                          /* scan progress */
     false,                      /* stop flag */
+    { 0, 0 },                   /* scan stats */
+    0,                          /* soft_dirty_target */
     NULL,                       /* regions */
     NULL,                       /* commands */
     NULL,                       /* current_cmdline */
@@ -68,6 +71,10 @@ globals_t sm_globals = {
         1,                      /* dump_with_ascii */
         0,                      /* reverse_endianness */
         0,                      /* no_ptrace */
+        0,                      /* scan_threads */
+        NULL,                   /* snapshot_dir */
+        64,                     /* snapshot_window */
+        0,                      /* soft_dirty */
     }
 };
 
@@ -208,6 +215,8 @@ void sm_cleanup(void)
     /* free matches array */
     if (sm_globals.matches)
         free(sm_globals.matches);
+    snapshot_free(sm_globals.snapshot);
+    free(sm_globals.options.snapshot_dir);
 
     /* attempt to detach just in case */
     sm_detach(sm_globals.target);
@@ -231,6 +240,26 @@ unsigned long sm_get_num_matches(void)
     return sm_globals.num_matches;
 }
 
+/* replaces the compact matches of a snapshot by the dense swaths,
+   for the commands which go through the matches */
+bool sm_expand_snapshot(globals_t *vars)
+{
+    matches_and_old_values_array *matches;
+
+    if (!vars->snapshot)
+        return true;
+
+    if (!(matches = snapshot_to_array(vars->snapshot, 0, vars->num_matches))) {
+        show_error("memory allocation error while expanding the snapshot.\n");
+        return false;
+    }
+    free(vars->matches);
+    vars->matches = matches;
+    snapshot_free(vars->snapshot);
+    vars->snapshot = NULL;
+    return true;
+}
+
 const char *sm_get_version(void)
 {
     return PACKAGE_VERSION;
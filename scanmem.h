@@ -42,15 +42,18 @@ typedef struct {
     unsigned exit:1;
     pid_t target;
     matches_and_old_values_array *matches;
+    matches_snapshot *snapshot;    /* compact matches of a snapshot, `matches` is empty meanwhile */
     unsigned long num_matches;
     double scan_progress;
     volatile bool stop_flag;
+    procmem_stats_t scan_stats;    /* reads of the target memory by the last scan */
+    pid_t soft_dirty_target;       /* whose soft-dirty bits the last scan cleared, 0 if none */
     list_t *regions;
     list_t *commands;              /* command handlers */
     const char *current_cmdline;   /* the command being executed */
     void (*printversion)(FILE *outfd);
     struct {
-        unsigned short alignment;
+        unsigned short alignment;  /* of the matches of a new scan, see `option scan_alignment` */
         unsigned short debug;
         unsigned short backend;    /* if 1, scanmem will work as a backend and
                                       output will be more machine-readable */
@@ -61,6 +64,10 @@ typedef struct {
         unsigned short dump_with_ascii;
         unsigned short reverse_endianness;
         unsigned short no_ptrace;
+        unsigned short scan_threads; /* 0: one per online CPU */
+        char *snapshot_dir;        /* NULL: snapshots are kept in memory */
+        unsigned snapshot_window;  /* MiB of a snapshot file scanned before releasing them */
+        unsigned short soft_dirty; /* only the pages written since the last scan are read again */
     } options;
 } globals_t;
 
@@ -73,6 +80,7 @@ void sm_printversion(FILE *outfd);
 void sm_set_backend(void);
 void sm_backend_exec_cmd(const char *commandline);
 unsigned long sm_get_num_matches(void);
+bool sm_expand_snapshot(globals_t *vars);
 const char *sm_get_version(void);
 double sm_get_scan_progress(void);
 void sm_set_stop_flag(bool stop_flag);
@@ -22,6 +22,15 @@
 
 #include <assert.h>
 #include <stdbool.h>
+#include <stdint.h>
+#include <string.h>
+
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+# include <immintrin.h>
+# define HAVE_BLOCK_AVX2
+#elif defined(__SSE2__)
+# include <emmintrin.h>
+#endif
 
 #include "scanroutines.h"
 #include "common.h"
@@ -561,6 +570,204 @@ DEFINE_STRING_SMALLOOP_EQUALTO_ROUTINE(48)
 DEFINE_STRING_SMALLOOP_EQUALTO_ROUTINE(56)
 
 
+/******************/
+/* Block routines */
+/******************/
+
+/* The INTEGER32 EQUALTO and RANGE scans both look for values within intervals,
+ * a signed one for s32b and an unsigned one for u32b (EQUALTO has one value only).
+ * An interval without its flag is left empty (lo > hi). The unsigned interval is
+ * compared as signed with the sign bits flipped, as SIMD compares are signed only. */
+typedef struct {
+    int32_t slo, shi;
+    int32_t ulo, uhi;
+} block_interval_t;
+
+#define SIGN_BIT32 ((uint32_t)1 << 31)
+
+static inline void block_interval(const uservalue_t *user_value, bool range, block_interval_t *iv)
+{
+    const uservalue_t *upper = range ? &user_value[1] : &user_value[0];
+
+    iv->slo = iv->ulo = INT32_MAX;
+    iv->shi = iv->uhi = INT32_MIN;
+    if (user_value[0].flags & flag_s32b) {
+        iv->slo = get_s32b(&user_value[0]);
+        iv->shi = get_s32b(upper);
+    }
+    if (user_value[0].flags & flag_u32b) {
+        iv->ulo = (int32_t)(get_u32b(&user_value[0]) ^ SIGN_BIT32);
+        iv->uhi = (int32_t)(get_u32b(upper) ^ SIGN_BIT32);
+    }
+}
+
+/* only the offsets with a whole value before `available` may match */
+static inline size_t block_count(size_t count, size_t available)
+{
+    size_t usable = available >= sizeof(int32_t) ? available - sizeof(int32_t) + 1 : 0;
+    return count < usable ? count : usable;
+}
+
+/* tests the offsets [first, count) one by one, appends to the `n` offsets found so far */
+static inline size_t block_scan_portable(const uint8_t *buffer, size_t first, size_t count, size_t stride,
+                                         const block_interval_t *iv, uint32_t *offsets, size_t n)
+{
+    for (size_t i = first; i < count; i += stride) {
+        uint32_t v;
+        memcpy(&v, buffer + i, sizeof(v));
+        int32_t s = (int32_t)v, u = (int32_t)(v ^ SIGN_BIT32);
+        if ((s >= iv->slo && s <= iv->shi) || (u >= iv->ulo && u <= iv->uhi))
+            offsets[n++] = i;
+    }
+    return n;
+}
+
+#if defined(__SSE2__) || defined(HAVE_BLOCK_AVX2)
+/* spreads the 4 bits of a lane mask to every 4th bit, like the offsets of the lanes */
+static const uint16_t block_spread4[16] = {
+    0x0000, 0x0001, 0x0010, 0x0011, 0x0100, 0x0101, 0x0110, 0x0111,
+    0x1000, 0x1001, 0x1010, 0x1011, 0x1100, 0x1101, 0x1110, 0x1111
+};
+
+/* bits of the offsets multiple of `stride` within a step of `width` offsets */
+static inline uint32_t block_stride_mask(size_t stride, unsigned width)
+{
+    uint32_t mask = 0;
+
+    for (size_t b = 0; b < width; b += stride)
+        mask |= (uint32_t)1 << b;
+    return mask;
+}
+
+/* appends `base` + the index of each bit set in `mask` */
+static inline size_t block_emit(uint32_t mask, size_t base, uint32_t *offsets, size_t n)
+{
+    for ( ; mask; mask &= mask - 1)
+        offsets[n++] = base + __builtin_ctz(mask);
+    return n;
+}
+#endif
+
+#ifdef __SSE2__
+/* 16 offsets per step: the 4 lanes of the loads at +0..+3 cover every offset,
+ * a stride needs fewer loads and bigger steps */
+static size_t block_scan_sse2(const uint8_t *buffer, size_t count, size_t available, size_t stride,
+                              const uservalue_t *user_value, uint32_t *offsets, bool range)
+{
+    const size_t step = stride > 16 ? stride : 16;
+    const uint32_t aligned = block_stride_mask(stride, 16);
+    block_interval_t iv;
+    size_t i, n = 0;
+
+    block_interval(user_value, range, &iv);
+    count = block_count(count, available);
+
+    const __m128i sign = _mm_set1_epi32((int32_t)SIGN_BIT32);
+    const __m128i slo = _mm_set1_epi32(iv.slo), shi = _mm_set1_epi32(iv.shi);
+    const __m128i ulo = _mm_set1_epi32(iv.ulo), uhi = _mm_set1_epi32(iv.uhi);
+
+    for (i = 0; i + 16 <= count; i += step) {
+        uint32_t mask = 0;
+        for (unsigned o = 0; o < 4; o += stride) {
+            __m128i s = _mm_loadu_si128((const __m128i *)(buffer + i + o));
+            __m128i u = _mm_xor_si128(s, sign);
+            __m128i out = _mm_and_si128(
+                _mm_or_si128(_mm_cmplt_epi32(s, slo), _mm_cmpgt_epi32(s, shi)),
+                _mm_or_si128(_mm_cmplt_epi32(u, ulo), _mm_cmpgt_epi32(u, uhi)));
+            mask |= (uint32_t)block_spread4[_mm_movemask_ps(_mm_castsi128_ps(out)) ^ 0xf] << o;
+        }
+        n = block_emit(mask & aligned, i, offsets, n);
+    }
+    return block_scan_portable(buffer, i, count, stride, &iv, offsets, n);
+}
+#endif
+
+#ifdef HAVE_BLOCK_AVX2
+/* 32 offsets per step: the 8 lanes of the loads at +0..+3 cover every offset,
+ * a stride needs fewer loads and bigger steps */
+__attribute__((target("avx2")))
+static size_t block_scan_avx2(const uint8_t *buffer, size_t count, size_t available, size_t stride,
+                              const uservalue_t *user_value, uint32_t *offsets, bool range)
+{
+    const size_t step = stride > 32 ? stride : 32;
+    const uint32_t aligned = block_stride_mask(stride, 32);
+    block_interval_t iv;
+    size_t i, n = 0;
+
+    block_interval(user_value, range, &iv);
+    count = block_count(count, available);
+
+    const __m256i sign = _mm256_set1_epi32((int32_t)SIGN_BIT32);
+    const __m256i slo = _mm256_set1_epi32(iv.slo), shi = _mm256_set1_epi32(iv.shi);
+    const __m256i ulo = _mm256_set1_epi32(iv.ulo), uhi = _mm256_set1_epi32(iv.uhi);
+
+    for (i = 0; i + 32 <= count; i += step) {
+        uint32_t mask = 0;
+        for (unsigned o = 0; o < 4; o += stride) {
+            __m256i s = _mm256_loadu_si256((const __m256i *)(buffer + i + o));
+            __m256i u = _mm256_xor_si256(s, sign);
+            __m256i out = _mm256_and_si256(
+                _mm256_or_si256(_mm256_cmpgt_epi32(slo, s), _mm256_cmpgt_epi32(s, shi)),
+                _mm256_or_si256(_mm256_cmpgt_epi32(ulo, u), _mm256_cmpgt_epi32(u, uhi)));
+            unsigned lanes = _mm256_movemask_ps(_mm256_castsi256_ps(out)) ^ 0xff;
+            mask |= ((uint32_t)block_spread4[lanes & 0xf] | (uint32_t)block_spread4[lanes >> 4] << 16) << o;
+        }
+        n = block_emit(mask & aligned, i, offsets, n);
+    }
+    return block_scan_portable(buffer, i, count, stride, &iv, offsets, n);
+}
+#endif
+
+static size_t block_scan_any(const uint8_t *buffer, size_t count, size_t available, size_t stride,
+                             const uservalue_t *user_value, uint32_t *offsets, bool range)
+{
+    block_interval_t iv;
+
+    block_interval(user_value, range, &iv);
+    return block_scan_portable(buffer, 0, block_count(count, available), stride, &iv, offsets, 0);
+}
+
+#define BLOCK_ROUTINE_ARGUMENTS (const uint8_t *buffer, size_t count, size_t available, size_t stride, const uservalue_t *user_value, uint32_t *offsets)
+scan_block_routine_t sm_scan_block_routine;
+
+#define DEFINE_INTEGER32_BLOCK_ROUTINES(ISA) \
+    static size_t scan_block_INTEGER32_EQUALTO_##ISA BLOCK_ROUTINE_ARGUMENTS \
+    { \
+        return block_scan_##ISA(buffer, count, available, stride, user_value, offsets, false); \
+    } \
+    static size_t scan_block_INTEGER32_RANGE_##ISA BLOCK_ROUTINE_ARGUMENTS \
+    { \
+        return block_scan_##ISA(buffer, count, available, stride, user_value, offsets, true); \
+    }
+
+DEFINE_INTEGER32_BLOCK_ROUTINES(any)
+#ifdef __SSE2__
+DEFINE_INTEGER32_BLOCK_ROUTINES(sse2)
+#endif
+#ifdef HAVE_BLOCK_AVX2
+DEFINE_INTEGER32_BLOCK_ROUTINES(avx2)
+#endif
+
+#define CHOOSE_BLOCK_ROUTINE(ISA) \
+    return (mt == MATCHRANGE) ? &scan_block_INTEGER32_RANGE_##ISA : &scan_block_INTEGER32_EQUALTO_##ISA;
+
+scan_block_routine_t sm_get_scan_block_routine(scan_data_type_t dt, scan_match_type_t mt, bool reverse_endianness)
+{
+    if (dt != INTEGER32 || reverse_endianness || (mt != MATCHEQUALTO && mt != MATCHRANGE))
+        return NULL;
+
+#ifdef HAVE_BLOCK_AVX2
+    __builtin_cpu_init();
+    if (__builtin_cpu_supports("avx2"))
+        CHOOSE_BLOCK_ROUTINE(avx2)
+#endif
+#ifdef __SSE2__
+    CHOOSE_BLOCK_ROUTINE(sse2)
+#endif
+    CHOOSE_BLOCK_ROUTINE(any)
+}
+
+
 /***************************************************************/
 /* choose a routine according to scan_data_type and match_type */
 /***************************************************************/
@@ -693,10 +900,12 @@ bool sm_choose_scanroutine(scan_data_type_t dt, scan_match_type_t mt, const user
         if ((possible_flags & uflags) == flags_empty) {
             /* There's no possibility to have a match, just abort */
             sm_scan_routine = NULL;
+            sm_scan_block_routine = NULL;
             return false;
         }
     }
 
     sm_scan_routine = sm_get_scanroutine(dt, mt, uflags, reverse_endianness);
+    sm_scan_block_routine = sm_scan_routine ? sm_get_scan_block_routine(dt, mt, reverse_endianness) : NULL;
     return (sm_scan_routine != NULL);
 }
@@ -24,6 +24,7 @@
 #define SCANROUTINES_H
 
 #include <stdbool.h>
+#include <stdint.h>
 
 #include "value.h"
 
@@ -78,4 +79,63 @@ bool sm_choose_scanroutine(scan_data_type_t dt, scan_match_type_t mt, const user
 
 scan_routine_t sm_get_scanroutine(scan_data_type_t dt, scan_match_type_t mt, match_flags uflags, bool reverse_endianness);
 
+/* Alignment of the matches (see `option scan_alignment`):
+ * 1 for any address, 0 for the size of each type, a power of two N for multiples of N */
+
+/* step between the addresses which may hold a match of the data type */
+static inline size_t sm_alignment_stride(unsigned alignment, scan_data_type_t dt)
+{
+    if (alignment)
+        return alignment;
+
+    switch (dt) {
+    case INTEGER16:
+        return 2;
+    case INTEGER32:
+    case FLOAT32:
+    case ANYFLOAT:
+        return 4;
+    case INTEGER64:
+    case FLOAT64:
+        return 8;
+    default:
+        return 1;
+    }
+}
+
+/* flags which may match at `address`, all of them (flags_max) for the lengths of bytearrays and strings */
+static inline match_flags sm_alignment_flags(unsigned alignment, scan_data_type_t dt, uintptr_t address)
+{
+    match_flags flags = flags_8b;
+
+    if (alignment)
+        return address % alignment ? flags_empty : flags_max;
+    if (dt == BYTEARRAY || dt == STRING)
+        return flags_max;
+
+    if (address % 2 == 0) flags |= flags_16b;
+    if (address % 4 == 0) flags |= flags_32b;
+    if (address % 8 == 0) flags |= flags_64b;
+    return flags;
+}
+
+/* Number of offsets a block routine tests at most in a single call */
+#define SCAN_BLOCK_SIZE 4096
+
+/* Tests the offsets [0, count) of `buffer` which are multiples of `stride` (a power of two) at once,
+ * with the same result as `sm_scan_routine` would give for each of them,
+ * without reading beyond `buffer + available`.
+ * Stores the matched offsets in increasing order into `offsets` (room for `count` is needed)
+ * and returns how many there are; the match flags are left to `sm_scan_routine`.
+ */
+typedef size_t (*scan_block_routine_t)(const uint8_t *buffer, size_t count, size_t available, size_t stride,
+                                       const uservalue_t *user_value, uint32_t *offsets);
+extern scan_block_routine_t sm_scan_block_routine;
+
+/*
+ * Returns the block routine of the given parameters (for the CPU we're running on),
+ * NULL if there is none and `sm_scan_routine` must be called for each offset.
+ */
+scan_block_routine_t sm_get_scan_block_routine(scan_data_type_t dt, scan_match_type_t mt, bool reverse_endianness);
+
 #endif /* SCANROUTINES_H */
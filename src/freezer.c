@@ -0,0 +1,242 @@
+/*
+    Freeze table of the socket backend (values written back by a timer thread).
+
+    This file is part of scanmem.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+*/
+#include "config.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <time.h>
+#include <pthread.h>
+
+#include "freezer.h"
+
+static struct {
+	pthread_mutex_t lock;
+	pthread_cond_t  wake; // signaled when the table, the period or the target changes
+	pthread_t       thread;
+	procmem_iov_t  *ent;
+	size_t          count;
+	unsigned int    period_ms;
+	int             mem_fd;
+	bool            running, quit;
+} s_frz = {
+	.lock      = PTHREAD_MUTEX_INITIALIZER,
+	.period_ms = FREEZE_PERIOD_MS,
+	.mem_fd    = -1
+};
+
+static void freezer_clear_locked(void)
+{
+	for (size_t i = 0; i < s_frz.count; i++)
+		free(s_frz.ent[i].data);
+	free(s_frz.ent);
+	s_frz.ent = NULL;
+	s_frz.count = 0;
+}
+
+static void *freezer_thread(void *arg)
+{
+	struct timespec next, now;
+
+	clock_gettime(CLOCK_MONOTONIC, &next);
+	pthread_mutex_lock(&s_frz.lock);
+
+	while (!s_frz.quit) {
+		if (!s_frz.period_ms || !s_frz.count || s_frz.mem_fd == -1) {
+			pthread_cond_wait(&s_frz.wake, &s_frz.lock);
+			clock_gettime(CLOCK_MONOTONIC, &next);
+			continue;
+		}
+		sm_write_procmem_vec(s_frz.mem_fd, s_frz.ent, s_frz.count);
+
+		next.tv_nsec += (s_frz.period_ms % 1000) * 1000000L;
+		next.tv_sec  += (s_frz.period_ms / 1000) + next.tv_nsec / 1000000000L;
+		next.tv_nsec %= 1000000000L;
+		// don't try to catch up the missed ticks
+		clock_gettime(CLOCK_MONOTONIC, &now);
+		if (next.tv_sec < now.tv_sec || (next.tv_sec == now.tv_sec && next.tv_nsec < now.tv_nsec))
+			next = now;
+		pthread_cond_timedwait(&s_frz.wake, &s_frz.lock, &next);
+	}
+	pthread_mutex_unlock(&s_frz.lock);
+	return arg;
+}
+
+bool sm_freezer_attach(pid_t procid)
+{
+	char proclnk[32];
+	int mem_fd = -1;
+
+	if (procid) {
+		snprintf(proclnk, sizeof(proclnk), "/proc/%d/mem", procid);
+		mem_fd = open(proclnk, O_WRONLY);
+	}
+	pthread_mutex_lock(&s_frz.lock);
+
+	freezer_clear_locked();
+	if (s_frz.mem_fd != -1)
+		close(s_frz.mem_fd);
+	s_frz.mem_fd = mem_fd;
+
+	if (!s_frz.running) {
+		pthread_condattr_t attr;
+		pthread_condattr_init(&attr);
+		pthread_condattr_setclock(&attr, CLOCK_MONOTONIC);
+		pthread_cond_init(&s_frz.wake, &attr);
+		pthread_condattr_destroy(&attr);
+
+		s_frz.quit = false;
+		s_frz.running = pthread_create(&s_frz.thread, NULL, freezer_thread, NULL) == 0;
+		if (!s_frz.running)
+			pthread_cond_destroy(&s_frz.wake);
+	} else {
+		pthread_cond_signal(&s_frz.wake);
+	}
+	pthread_mutex_unlock(&s_frz.lock);
+	return mem_fd != -1;
+}
+
+void sm_freezer_detach(void)
+{
+	pthread_mutex_lock(&s_frz.lock);
+	bool running = s_frz.running;
+	if (running) {
+		s_frz.quit = true;
+		pthread_cond_signal(&s_frz.wake);
+	}
+	pthread_mutex_unlock(&s_frz.lock);
+
+	if (running) {
+		pthread_join(s_frz.thread, NULL);
+		pthread_cond_destroy(&s_frz.wake);
+		s_frz.running = false;
+	}
+	freezer_clear_locked();
+	if (s_frz.mem_fd != -1)
+		close(s_frz.mem_fd);
+	s_frz.mem_fd = -1;
+}
+
+size_t sm_freezer_add(procmem_iov_t *iov, size_t count)
+{
+	size_t i, j, nfull = 0;
+
+	if (count == 0)
+		return 0;
+
+	pthread_mutex_lock(&s_frz.lock);
+
+	procmem_iov_t *ent = realloc(s_frz.ent, (s_frz.count + count) * sizeof(procmem_iov_t));
+	if (!ent) {
+		for (i = 0; i < count; i++)
+			free(iov[i].data);
+	} else {
+		if (s_frz.mem_fd != -1)
+			nfull = sm_write_procmem_vec(s_frz.mem_fd, iov, count);
+
+		// the same address replaces the entry
+		for (s_frz.ent = ent, i = 0; i < count; i++) {
+			for (j = 0; j < s_frz.count && ent[j].addr != iov[i].addr; j++);
+			if (j < s_frz.count)
+				free(ent[j].data);
+			else
+				s_frz.count++;
+			ent[j] = iov[i];
+		}
+		if (s_frz.running)
+			pthread_cond_signal(&s_frz.wake);
+	}
+	pthread_mutex_unlock(&s_frz.lock);
+	return nfull;
+}
+
+size_t sm_freezer_remove(const uintptr_t *addrs, size_t count)
+{
+	size_t i, j, nrem = 0;
+
+	pthread_mutex_lock(&s_frz.lock);
+
+	for (i = 0; i < count; i++) {
+		for (j = 0; j < s_frz.count && s_frz.ent[j].addr != addrs[i]; j++);
+		if (j < s_frz.count) {
+			free(s_frz.ent[j].data);
+			memmove(&s_frz.ent[j], &s_frz.ent[j + 1], (--s_frz.count - j) * sizeof(procmem_iov_t));
+			nrem++;
+		}
+	}
+	pthread_mutex_unlock(&s_frz.lock);
+	return nrem;
+}
+
+void sm_freezer_clear(void)
+{
+	pthread_mutex_lock(&s_frz.lock);
+	freezer_clear_locked();
+	pthread_mutex_unlock(&s_frz.lock);
+}
+
+size_t sm_freezer_apply(void)
+{
+	size_t nfull = 0;
+
+	pthread_mutex_lock(&s_frz.lock);
+	if (s_frz.mem_fd != -1)
+		nfull = sm_write_procmem_vec(s_frz.mem_fd, s_frz.ent, s_frz.count);
+	pthread_mutex_unlock(&s_frz.lock);
+	return nfull;
+}
+
+size_t sm_freezer_write(procmem_iov_t *iov, size_t count)
+{
+	size_t nfull = 0;
+
+	pthread_mutex_lock(&s_frz.lock);
+	if (s_frz.mem_fd != -1)
+		nfull = sm_write_procmem_vec(s_frz.mem_fd, iov, count);
+	pthread_mutex_unlock(&s_frz.lock);
+	return nfull;
+}
+
+void sm_freezer_set_period(unsigned int period_ms)
+{
+	pthread_mutex_lock(&s_frz.lock);
+	s_frz.period_ms = period_ms;
+	if (s_frz.running)
+		pthread_cond_signal(&s_frz.wake);
+	pthread_mutex_unlock(&s_frz.lock);
+}
+
+unsigned int sm_freezer_get_period(void)
+{
+	return s_frz.period_ms;
+}
+
+const procmem_iov_t *sm_freezer_lock_table(size_t *count)
+{
+	pthread_mutex_lock(&s_frz.lock);
+	*count = s_frz.count;
+	return s_frz.ent;
+}
+
+void sm_freezer_unlock_table(void)
+{
+	pthread_mutex_unlock(&s_frz.lock);
+}
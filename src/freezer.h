@@ -0,0 +1,77 @@
+/*
+    Freeze table of the socket backend (values written back by a timer thread).
+
+    This file is part of scanmem.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#ifndef FREEZER_H
+# define FREEZER_H
+# include <stdbool.h>
+# include <stdint.h>
+# include <sys/types.h>
+
+# include "procmaps.h"
+
+# define FREEZE_PERIOD_MS 10 // default period of the timer thread
+# define FREEZE_PERIOD_MAX_MS 60000 // longest period which can be set
+
+/**
+ * (re)opens `/proc/{pid}/mem` of the new target and empties the table,
+ * starts the timer thread on the first call.
+ *
+ * @return false if the target memory can't be opened for writing
+ */
+bool sm_freezer_attach(pid_t procid);
+
+/* stops the timer thread, empties the table and closes the target memory */
+void sm_freezer_detach(void);
+
+/**
+ * adds the entries to the table (an entry of the same address is replaced)
+ * and writes them at once, the table takes ownership of the entries `data`.
+ *
+ * @return the number of entries written completely
+ */
+size_t sm_freezer_add(procmem_iov_t *iov, size_t count);
+
+/* @return the number of removed entries */
+size_t sm_freezer_remove(const uintptr_t *addrs, size_t count);
+
+void sm_freezer_clear(void);
+
+/* writes all the entries now, @return the number of entries written completely */
+size_t sm_freezer_apply(void);
+
+/**
+ * writes the entries once, without adding them to the table (the caller keeps their `data`).
+ *
+ * @return the number of entries written completely
+ */
+size_t sm_freezer_write(procmem_iov_t *iov, size_t count);
+
+/* 0 stops writing by the timer, the table is only written by `sm_freezer_apply()`,
+ * up to FREEZE_PERIOD_MAX_MS */
+void sm_freezer_set_period(unsigned int period_ms);
+unsigned int sm_freezer_get_period(void);
+
+/**
+ * gives access to the table, which must be released by `sm_freezer_unlock_table()`
+ * as soon as possible, `ndone` of the entries tells the result of the last write.
+ */
+const procmem_iov_t *sm_freezer_lock_table(size_t *count);
+void sm_freezer_unlock_table(void);
+
+#endif // FREEZER_H
@@ -32,8 +32,15 @@
 
 #include "sys.h"
 #include "messages.h"
+#include "freezer.h"
 #include "parseopt.c"
 
+#include <ctype.h>
+#include <math.h>
+#include <poll.h>
+#include <pthread.h>
+#include <stdatomic.h>
+
 #ifdef HAVE_READLINE
 # define HIST_MAX_SIZE 1000
 # include <readline/history.h>
@@ -45,6 +52,9 @@
 # define HINT_TYPE_VALUE "Type a value to start scanning"
 # define HINT_ENTER_HELP "Enter `help` at the prompt for further assistance"
 
+# define EVENT_FRAME_ID 0  // id of the frames pushed by the backend, never used by requests
+# define SCAN_EVENT_MS  50 // at most one progress event per period
+
 # define COPYRIGHT_TEXT \
 	"\n<~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~(!)~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~>\n"\
 	"Copyright (C) 2006-2017 Scanmem authors\n"\
@@ -82,12 +92,14 @@ static void print_help(bool is_quick)
 
 static bool iter_exec_commands(globals_t *vars, char *cmd, bool exit_on_err)
 {
+	char *save = NULL;
+
 	// this will initialize matches and regions
 	if (!sm_execcommand(vars, "reset")) {
 		vars->target = 0;
 	}
-	// iterate list of commands
-	if (cmd && (cmd = strtok(cmd, ";\n")))
+	// iterate list of commands, the commands themselves are split by strtok()
+	if (cmd && (cmd = strtok_r(cmd, ";\n", &save)))
 	do {
 		if (vars->matches) {
 			printf("%ld> %s\n", vars->num_matches, cmd);
@@ -103,7 +115,7 @@ static bool iter_exec_commands(globals_t *vars, char *cmd, bool exit_on_err)
 		fflush(stdout);
 		fflush(stderr);
 
-	} while ((cmd = strtok(NULL, ";\n")));
+	} while ((cmd = strtok_r(NULL, ";\n", &save)));
 	// returns exit flag
 	return !vars->exit;
 }
@@ -158,17 +170,685 @@ static inline void s_cmd_info_scanning(globals_t *vars)
 	);
 }
 
-static inline void s_cmd_dump_memory(globals_t *vars, const char *cmd)
+/* `dump {addr} {size} [path]` writes to the file when a path is given,
+ * otherwise returns the bytes in-band, as a binary frame */
+static inline bool s_cmd_dump_memory(globals_t *vars, const char *cmd, int ipc_fd, uint32_t id)
 {
 	uintptr_t addr = 0;
 	size_t nb = 0;
 	int n = 0;
 
-	if (2 == sscanf(cmd, "dump %lx %lu %n", &addr, &nb, &n)) {
+	if (2 != sscanf(cmd, "dump %lx %lu %n", &addr, &nb, &n)) {
+		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+	} else if (cmd[n] == '\0') {
+		// the frame header starts with the id, the rest is sent with the data
+		if (sys_write_all(ipc_fd, &id, sizeof(id)))
+			sm_read_procmem(&ipc_fd, vars->target, MEMDUMP_TO_SOCKET, addr, nb, true);
+		return true;
+	} else {
 		sm_read_procmem((void*)&cmd[n],
 			vars->target, MEMDUMP_TO_FILE, addr, nb, true );
-	} else
+	}
+	return false;
+}
+
+/* `read {addr}:{size} ...` reads all entries at once and returns a binary frame:
+ * `uint32_t` bytes read per entry, then the entries data (each padded to its size),
+ * the frame is empty if the arguments are invalid or the memory allocation failed */
+static inline bool s_cmd_read_values(globals_t *vars, const char *cmd, int ipc_fd, uint32_t id)
+{
+	size_t count = 0, data_l = 0, i;
+	unsigned long size;
+	const char *p;
+
+	for (p = cmd; (p = strchr(p, ':')); p++)
+		count++;
+
+	procmem_iov_t *iov = calloc(count, sizeof(procmem_iov_t));
+	char *end;
+
+	for (i = 0, p = &cmd[4]; iov && i < count; i++, p = end) {
+		iov[i].addr = strtoul(p, &end, 16);
+		if (*end != ':')
+			break;
+		size = strtoul(&end[1], &end, 10);
+		if (size > UINT32_MAX)
+			break;
+		iov[i].size = size;
+		data_l += size;
+	}
+	uint64_t frame_l = count * sizeof(uint32_t) + data_l;
+	uint8_t *frame = NULL, *out;
+
+	if (iov && i != count) {
+		SM_Debug("%s [%s]", "invalid arguments", cmd);
+	} else if (iov) {
+		frame = malloc(frame_l);
+	}
+	if (!frame) {
+		frame_l = 0;
+	} else {
+		out = &frame[count * sizeof(uint32_t)];
+		for (i = 0; i < count; out += iov[i++].size)
+			iov[i].data = out;
+
+		sm_read_procmem_vec(vars->target, iov, count);
+
+		for (i = 0; i < count; i++)
+			memcpy(&frame[i * sizeof(uint32_t)], &iov[i].ndone, sizeof(uint32_t));
+	}
+	if (!sys_send_frame(ipc_fd, id, frame, frame_l)) {
+		SM_Debug("%s", "unable to send frame");
+	}
+	free(frame);
+	free(iov);
+	return true;
+}
+
+/* header and fixed part of the records of a `list` reply, the value bytes follow every record */
+typedef struct __attribute__((packed)) {
+	uint32_t count;    // records in the reply
+	uint32_t rec_size; // sizeof(s_match_rec_t) + value width
+	uint64_t total;    // matches selected by the filters (all matches of the last scan by default)
+} s_match_hdr_t;
+
+typedef struct __attribute__((packed)) {
+	uint32_t match_id;
+	uint32_t region_id;
+	uint64_t addr;
+	uint64_t off;     // offset from the load address of the region
+	uint16_t flags;   // match flags of numbers, length of strings and byte arrays
+	uint8_t  region_type;
+	uint8_t  _pad;
+} s_match_rec_t;
+
+/* a match selected by the filters of `list` */
+typedef struct {
+	match_location loc;
+	const region_t *region;
+	unsigned long   match_id; // the matches are in address order, so is the id
+	double          value;
+} s_match_ref_t;
+
+/* changes along with the matches, outdates the view */
+static unsigned long s_matches_gen = 1;
+
+/* selected and sorted matches of the last `list` with sort keys or filters, reused while paging */
+static struct {
+	char          *spec;  // sort keys and filters of the view
+	unsigned long  gen;   // `s_matches_gen` of the view
+	s_match_ref_t *refs;
+	size_t         count;
+} s_view = { .spec = NULL, .refs = NULL };
+
+static int s_view_order = 1; // -1 for the descending order
+
+static void s_view_free(void)
+{
+	free(s_view.spec);
+	free(s_view.refs);
+	s_view.spec  = NULL;
+	s_view.refs  = NULL;
+	s_view.count = 0;
+}
+
+static int s_cmp_match_id(const s_match_ref_t *a, const s_match_ref_t *b)
+{
+	return (a->match_id > b->match_id) - (a->match_id < b->match_id);
+}
+
+static int s_cmp_by_addr(const void *a, const void *b)
+{
+	return s_view_order * s_cmp_match_id(a, b);
+}
+
+static int s_cmp_by_value(const void *a, const void *b)
+{
+	const s_match_ref_t *ra = a, *rb = b;
+	int c = (ra->value > rb->value) - (ra->value < rb->value);
+	return s_view_order * (c ? c : s_cmp_match_id(ra, rb));
+}
+
+static int s_cmp_by_region(const void *a, const void *b)
+{
+	const s_match_ref_t *ra = a, *rb = b;
+	int ta = ra->region ? ra->region->type : -1, tb = rb->region ? rb->region->type : -1;
+	int c = (ta > tb) - (ta < tb);
+	return s_view_order * (c ? c : s_cmp_match_id(ra, rb));
+}
+
+/* the value of a number match as its longest type */
+static double s_match_value(const value_t *v)
+{
+	if (v->flags & flag_s64b) return v->int64_value;
+	if (v->flags & flag_u64b) return v->uint64_value;
+	if (v->flags & flag_f64b) return v->float64_value;
+	if (v->flags & flag_s32b) return v->int32_value;
+	if (v->flags & flag_u32b) return v->uint32_value;
+	if (v->flags & flag_f32b) return v->float32_value;
+	if (v->flags & flag_s16b) return v->int16_value;
+	if (v->flags & flag_u16b) return v->uint16_value;
+	if (v->flags & flag_s8b)  return v->int8_value;
+	return v->uint8_value;
+}
+
+static inline void s_next_match_byte(match_location *loc)
+{
+	if (++loc->index >= loc->swath->number_of_bytes) {
+		loc->swath = local_address_beyond_last_element(loc->swath);
+		loc->index = 0;
+	}
+}
+
+/* selects the matches by the `spec` filters and sorts them by its key:
+ * `sort:[-]{addr|value|region}`, `addr:{lo}:{hi}` (hex, hi excluded), `region:{type}`, `value:{lo}:{hi}`,
+ * the matches of a snapshot are refused (only paged by `list`) */
+static bool s_view_build(globals_t *vars, const char *spec, bool is_array)
+{
+	static const char *const region_names[] = REGION_TYPE_NAMES;
+	int (*cmp)(const void *, const void *) = NULL;
+	uintptr_t addr_lo = 0, addr_hi = UINTPTR_MAX;
+	double val_lo = -INFINITY, val_hi = INFINITY;
+	int region = -1, n;
+	char key[8], *tok, *save, *args;
+
+	if (s_view.spec && s_view.gen == s_matches_gen && !strcmp(s_view.spec, spec))
+		return true;
+	s_view_free();
+
+	if (!(args = strdup(spec)))
+		return false;
+	s_view_order = 1;
+
+	for (tok = strtok_r(args, " ", &save); tok; tok = strtok_r(NULL, " ", &save)) {
+		n = 0;
+		if (sscanf(tok, "sort:%7[-a-z]%n", key, &n) == 1 && !tok[n]) {
+			s_view_order = key[0] == '-' ? -1 : 1;
+			const char *k = &key[key[0] == '-'];
+			cmp = !strcmp(k, "addr") ? s_cmp_by_addr : !strcmp(k, "value") ? s_cmp_by_value :
+				!strcmp(k, "region") ? s_cmp_by_region : NULL;
+			if (!cmp)
+				break;
+		} else if (sscanf(tok, "addr:%lx:%lx%n", &addr_lo, &addr_hi, &n) == 2 && !tok[n]) {
+		} else if (sscanf(tok, "value:%lf:%lf%n", &val_lo, &val_hi, &n) == 2 && !tok[n]) {
+		} else if (sscanf(tok, "region:%7[a-z]%n", key, &n) == 1 && !tok[n]) {
+			for (region = REGION_TYPE_STACK; region >= 0 && strcmp(key, region_names[region]); region--);
+			if (region < 0)
+				break;
+		} else {
+			break;
+		}
+	}
+	free(args);
+	if (tok) {
+		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), spec);
+		return false;
+	}
+	// the view refers to all the matches, expanding those of a snapshot could run out of memory
+	if (vars->snapshot) {
+		SM_Message("{"F_JSON_STR("error","%s")"}", lStr("narrow the scan first to sort or filter the matches"));
+		return false;
+	}
+
+	size_t cap = 0;
+	unsigned long match_id = 0;
+	element_t *np = vars->regions ? vars->regions->head : NULL;
+	match_location loc = { vars->matches ? vars->matches->swaths : NULL, 0 };
+
+	for (; loc.swath && loc.swath->first_byte_in_child; s_next_match_byte(&loc)) {
+		if (loc.swath->data[loc.index].match_info == flags_empty)
+			continue;
+		s_match_ref_t ref = { .loc = loc, .region = NULL, .match_id = match_id++, .value = 0.0 };
+		uintptr_t addr = (uintptr_t)remote_address_of_nth_element(loc.swath, loc.index);
+
+		if (addr < addr_lo || addr >= addr_hi)
+			continue;
+		for (; np; np = np->next) {
+			const region_t *r = np->data;
+			if (addr >= (uintptr_t)r->start && addr < (uintptr_t)r->start + r->size) {
+				ref.region = r;
+				break;
+			}
+		}
+		if (region != -1 && (!ref.region || ref.region->type != region))
+			continue;
+		if (!is_array) {
+			value_t v = data_to_val(loc.swath, loc.index);
+			ref.value = s_match_value(&v);
+			if (ref.value < val_lo || ref.value > val_hi)
+				continue;
+		}
+		if (s_view.count == cap) {
+			s_match_ref_t *refs = realloc(s_view.refs, (cap = cap ? cap * 2 : 4096) * sizeof(s_match_ref_t));
+			if (!refs) {
+				s_view_free();
+				SM_Message("{"F_JSON_STR("error","%s")"}", lStr("sorry, there was a memory allocation error"));
+				return false;
+			}
+			s_view.refs = refs;
+		}
+		s_view.refs[s_view.count++] = ref;
+	}
+	if (cmp && s_view.count)
+		qsort(s_view.refs, s_view.count, sizeof(s_match_ref_t), cmp);
+
+	s_view.spec = strdup(spec);
+	s_view.gen  = s_matches_gen;
+	return true;
+}
+
+/* writes the record of the match and its value */
+static void s_match_record(uint8_t *out, const match_location *loc, const region_t *region,
+                           unsigned long match_id, bool is_array)
+{
+	uint16_t flags = loc->swath->data[loc->index].match_info;
+	s_match_rec_t rec = { .match_id = match_id, .region_id = 99, .flags = flags };
+	uint8_t *val = &out[sizeof(rec)];
+
+	rec.addr = (uintptr_t)remote_address_of_nth_element(loc->swath, loc->index);
+	if (region) {
+		rec.region_id   = region->id;
+		rec.region_type = region->type;
+		rec.off         = rec.addr - region->load_addr;
+	}
+	if (is_array) {
+		for (size_t i = 0; i < flags && loc->index + i < loc->swath->number_of_bytes; i++)
+			val[i] = loc->swath->data[loc->index + i].old_value;
+	} else {
+		value_t v = data_to_val(loc->swath, loc->index);
+		rec.flags = v.flags;
+		memcpy(val, v.bytes, sizeof(v.bytes));
+	}
+	memcpy(out, &rec, sizeof(rec));
+}
+
+/* `list [first] [count] [sort:..] [addr:..] [region:..] [value:..]` replies with a binary frame:
+ * `s_match_hdr_t` and `count` records of the matches starting from the index `first`
+ * (all of them when `count` is 0), the value width is 8 bytes for numbers
+ * or the longest string/byte array of the records.
+ * The sort key and the filters are applied to all matches before paging (see `s_view_build()`) */
+static inline bool s_cmd_list_matches(globals_t *vars, const char *cmd, int ipc_fd, uint32_t id)
+{
+	unsigned long first = 0, count = 0, total = vars->num_matches, n;
+	bool is_array = vars->options.scan_data_type == BYTEARRAY || vars->options.scan_data_type == STRING;
+	size_t vwidth = is_array ? 0 : sizeof(int64_t);
+	int pos = 0;
+
+	sscanf(cmd, "list %lu %lu %n", &first, &count, &pos);
+
+	const char *spec = pos ? &cmd[pos] : "";
+	bool use_view = spec[0] != '\0';
+
+	if (use_view) {
+		if (!s_view_build(vars, spec, is_array))
+			return false;
+		total = s_view.count;
+	} else if (s_view.spec) {
+		s_view_free();
+	}
+	match_location start = { NULL, 0 }, loc;
+	matches_and_old_values_array *page = NULL;
+	// only the page is expanded from a snapshot
+	if (!use_view && vars->snapshot && first < total) {
+		if (!(page = snapshot_to_array(vars->snapshot, first, count ? count : total - first))) {
+			SM_Message("{"F_JSON_STR("error","%s")"}", lStr("sorry, there was a memory allocation error"));
+			return false;
+		}
+		start = nth_match(page, 0);
+	} else if (!use_view && vars->matches && first < total)
+		start = nth_match(vars->matches, first);
+	if (first >= total)
+		count = 0;
+	else if (!count || count > total - first)
+		count = total - first;
+
+	// measure the values, the matches have the same order as the regions
+	if (use_view) {
+		for (n = 0; n < count; n++) {
+			const match_location *l = &s_view.refs[first + n].loc;
+			uint16_t flags = l->swath->data[l->index].match_info;
+			if (is_array && flags > vwidth)
+				vwidth = MIN(flags, l->swath->number_of_bytes - l->index);
+		}
+	} else {
+		for (n = 0, loc = start; loc.swath && loc.swath->first_byte_in_child && n < count; s_next_match_byte(&loc)) {
+			uint16_t flags = loc.swath->data[loc.index].match_info;
+			if (flags != flags_empty) {
+				if (is_array && flags > vwidth)
+					vwidth = MIN(flags, loc.swath->number_of_bytes - loc.index);
+				n++;
+			}
+		}
+	}
+	s_match_hdr_t hdr = { .count = n, .rec_size = sizeof(s_match_rec_t) + vwidth, .total = total };
+	uint64_t frame_l = sizeof(hdr) + (uint64_t)hdr.count * hdr.rec_size;
+	uint8_t *frame = calloc(1, frame_l), *out;
+
+	if (!frame) {
+		SM_Message("{"F_JSON_STR("error","%s")"}", lStr("sorry, there was a memory allocation error"));
+		free(page);
+		return false;
+	}
+	memcpy(frame, &hdr, sizeof(hdr));
+	out = &frame[sizeof(hdr)];
+
+	if (use_view) {
+		for (n = 0; n < hdr.count; n++, out += hdr.rec_size) {
+			const s_match_ref_t *ref = &s_view.refs[first + n];
+			s_match_record(out, &ref->loc, ref->region, ref->match_id, is_array);
+		}
+	} else {
+		element_t *np = vars->regions ? vars->regions->head : NULL;
+
+		for (n = 0, loc = start; n < hdr.count; s_next_match_byte(&loc)) {
+			if (loc.swath->data[loc.index].match_info == flags_empty)
+				continue;
+			uintptr_t addr = (uintptr_t)remote_address_of_nth_element(loc.swath, loc.index);
+			const region_t *region = NULL;
+
+			for (; np; np = np->next) {
+				const region_t *r = np->data;
+				if (addr >= (uintptr_t)r->start && addr < (uintptr_t)r->start + r->size) {
+					region = r;
+					break;
+				}
+			}
+			s_match_record(out, &loc, region, first + n, is_array);
+			out += hdr.rec_size;
+			n++;
+		}
+	}
+	if (!sys_send_frame(ipc_fd, id, frame, frame_l)) {
+		SM_Debug("%s", "unable to send frame");
+	}
+	free(frame);
+	free(page);
+	return true;
+}
+
+static inline uint8_t s_hex_digit(char c)
+{
+	return c <= '9' ? c - '0' : (c | 0x20) - 'a' + 10;
+}
+
+/* parses `{addr}:{hex bytes} ...`, returns NULL on error */
+static procmem_iov_t *s_parse_write_entries(const char *p, size_t *count)
+{
+	size_t n = 0, i, k, l;
+	char *end;
+
+	for (const char *c = p; (c = strchr(c, ':')); c++)
+		n++;
+
+	procmem_iov_t *iov = calloc(n ? n : 1, sizeof(procmem_iov_t));
+
+	for (i = 0; iov && i < n; i++, p = end) {
+		iov[i].addr = strtoul(p, &end, 16);
+		if (*end++ != ':')
+			break;
+		l = strspn(end, "0123456789abcdefABCDEF");
+		if (l == 0 || l % 2 || (end[l] != ' ' && end[l] != '\0') || !(iov[i].data = malloc(l / 2)))
+			break;
+		iov[i].size = l / 2;
+		for (k = 0; k < iov[i].size; k++, end += 2)
+			iov[i].data[k] = s_hex_digit(end[0]) << 4 | s_hex_digit(end[1]);
+	}
+	if (iov && i != n) {
+		for (k = 0; k <= i; k++)
+			free(iov[k].data);
+		free(iov);
+		iov = NULL;
+	}
+	*count = n;
+	return iov;
+}
+
+/* `writev [=] {addr}:{hex bytes} ...` writes the entries and keeps them in the freeze table
+ * (`=` empties the table first), with no entries re-applies the whole table */
+static inline void s_cmd_write_values(const char *cmd)
+{
+	const char *p = &cmd[6];
+	size_t count = 0, nfull = 0;
+	bool reset = false;
+
+	while (*p == ' ')
+		p++;
+	if (*p == '=')
+		reset = true, p++;
+
+	procmem_iov_t *iov = s_parse_write_entries(p, &count);
+
+	if (!iov) {
+		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+		return;
+	}
+	if (reset)
+		sm_freezer_clear();
+	if (count != 0)
+		nfull = sm_freezer_add(iov, count);
+	else if (!reset)
+		nfull = sm_freezer_apply();
+	free(iov);
+
+	sm_freezer_lock_table(&count);
+	sm_freezer_unlock_table();
+	SM_Message("{"
+		F_JSON_NUM("lock_count","%lu")","
+		F_JSON_NUM("written","%lu")
+	"}", count, nfull);
+}
+
+/* `write {addr}:{hex bytes} ...` writes the entries once, e.g. the edits of the memory editor */
+static inline void s_cmd_write_once(const char *cmd)
+{
+	size_t count = 0, nfull, i;
+	procmem_iov_t *iov = s_parse_write_entries(&cmd[5], &count);
+
+	if (!iov || count == 0) {
+		free(iov);
+		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+		return;
+	}
+	nfull = sm_freezer_write(iov, count);
+	for (i = 0; i < count; i++)
+		free(iov[i].data);
+	free(iov);
+
+	SM_Message("{"F_JSON_NUM("written","%lu")"}", nfull);
+}
+
+/* `lock add {addr}:{hex bytes} ...`, `lock remove {addr} ...`, `lock clear`,
+ * `lock period {ms}` and `lock list` manage the freeze table.
+ * The period is 0 (the timer doesn't write) to FREEZE_PERIOD_MAX_MS */
+static inline void s_cmd_lock_table(const char *cmd)
+{
+	const procmem_iov_t *ent;
+	size_t count = 0, n = 0, i, k;
+	long period;
+	char *end;
+	int pos = 0;
+
+	if (sscanf(cmd, "lock add %n", &pos), pos && cmd[pos - 1] == ' ') {
+		procmem_iov_t *iov = s_parse_write_entries(&cmd[pos], &count);
+		if (iov && count) {
+			n = sm_freezer_add(iov, count);
+			free(iov);
+			sm_freezer_lock_table(&count);
+			sm_freezer_unlock_table();
+			SM_Message("{"F_JSON_NUM("lock_count","%lu")","F_JSON_NUM("written","%lu")"}", count, n);
+			return;
+		}
+		free(iov);
+	} else if (sscanf(cmd, "lock remove %n", &pos), pos && cmd[pos - 1] == ' ') {
+		uintptr_t *addrs = malloc((strlen(cmd) / 2 + 1) * sizeof(uintptr_t));
+		for (const char *p = &cmd[pos]; addrs; p = end) {
+			uintptr_t addr = strtoul(p, &end, 16);
+			if (end == p)
+				break;
+			addrs[count++] = addr;
+		}
+		if (count) {
+			n = sm_freezer_remove(addrs, count);
+			free(addrs);
+			sm_freezer_lock_table(&count);
+			sm_freezer_unlock_table();
+			SM_Message("{"F_JSON_NUM("lock_count","%lu")","F_JSON_NUM("removed","%lu")"}", count, n);
+			return;
+		}
+		free(addrs);
+	} else if (_CMP_5(cmd, 5, "clear") && !cmd[10 + strspn(&cmd[10], " ")]) {
+		sm_freezer_clear();
+		SM_Message("{"F_JSON_NUM("lock_count","%d")"}", 0);
+		return;
+	} else if (sscanf(cmd, "lock period %n", &pos), pos && cmd[pos - 1] == ' ') {
+		period = strtol(&cmd[pos], &end, 10);
+		if (end != &cmd[pos] && !end[strspn(end, " ")] && period >= 0 && period <= FREEZE_PERIOD_MAX_MS) {
+			sm_freezer_set_period(period);
+			SM_Message("{"F_JSON_NUM("period_ms","%ld")"}", period);
+			return;
+		}
+	} else if (_CMP_4(cmd, 5, "list") && !cmd[9 + strspn(&cmd[9], " ")]) {
+		SM_Message("{"F_JSON_NUM("period_ms","%u")",\"locks\":[", sm_freezer_get_period());
+		for (ent = sm_freezer_lock_table(&count), i = 0; i < count; i++) {
+			SM_Message("%s{"F_JSON_STR("addr","%lx")",\"bytes\":\"", i ? "," : "", ent[i].addr);
+			for (k = 0; k < ent[i].size; k++)
+				SM_Message("%02x", ent[i].data[k]);
+			SM_Message("\","F_JSON_NUM("written","%s")"}", ent[i].ndone == ent[i].size ? "true" : "false");
+		}
+		sm_freezer_unlock_table();
+		SM_Message("%s", "]}");
+		return;
+	}
+	SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+}
+
+/* one frame at once on the socket: replies and events of the scan worker */
+static pthread_mutex_t s_sock_lock = PTHREAD_MUTEX_INITIALIZER;
+
+static struct {
+	pthread_t   thread;
+	atomic_bool running;  // cleared by the worker along with its last event
+	bool        joinable;
+	char       *cmd;      // legacy command line of the scan
+	int         ipc_fd;
+	double      last_pgss;
+	unsigned long last_mcnt;
+} s_scan = { .running = false, .joinable = false, .cmd = NULL };
+
+/* sends a `progress` or `done` event, the socket must be locked */
+static void s_push_scan_event(globals_t *vars, const char *event, bool ok)
+{
+	char buf[256];
+	int n = snprintf(buf, sizeof(buf), "{"
+		F_JSON_STR("event","%s")","
+		F_JSON_NUM("scan_progress","%f")","
+		F_JSON_NUM("match_count","%lu")","
+		F_JSON_NUM("syscalls","%lu")","
+		F_JSON_NUM("read_bytes","%lu")","
+		F_JSON_NUM("stopped","%s")","
+		F_JSON_NUM("snapshot","%s")","
+		F_JSON_NUM("ok","%s")
+	"}",
+		event, vars->scan_progress, vars->num_matches,
+		vars->scan_stats.syscalls, vars->scan_stats.bytes,
+		vars->stop_flag ? "true" : "false", vars->snapshot ? "true" : "false", ok ? "true" : "false");
+
+	sys_send_frame(s_scan.ipc_fd, EVENT_FRAME_ID, buf, n);
+	s_scan.last_pgss = vars->scan_progress;
+	s_scan.last_mcnt = vars->num_matches;
+}
+
+static void *s_scan_worker(void *arg)
+{
+	globals_t *vars = arg;
+	bool ok = sm_execcommand(vars, s_scan.cmd);
+
+	pthread_mutex_lock(&s_sock_lock);
+	s_push_scan_event(vars, "done", ok);
+	atomic_store(&s_scan.running, false);
+	pthread_mutex_unlock(&s_sock_lock);
+	return NULL;
+}
+
+/* waits for the scan worker, if it's done (or `stop` is set) */
+static void s_scan_join(bool stop)
+{
+	if (!s_scan.joinable)
+		return;
+	if (stop)
+		sm_set_stop_flag(true);
+	if (stop || !atomic_load(&s_scan.running)) {
+		pthread_join(s_scan.thread, NULL);
+		s_scan.joinable = false;
+		free(s_scan.cmd);
+		s_scan.cmd = NULL;
+	}
+}
+
+/* `find {match}:{type}[@{alignment}] {value}` starts scanning in a worker thread,
+ * the progress is pushed as events: `progress` while scanning and `done` at the end.
+ * The alignment is the one of `option scan_alignment`, the option is kept if none is given */
+static inline void s_cmd_find_matches(globals_t *vars, const char *cmd, int ipc_fd)
+{
+	static const char *const match_ops[][2] = {
+		{ "eq", "" }, { "ne", "!= " }, { "lt", "< " }, { "gt", "> " }, { "ic", "+ " }, { "dc", "- " }
+	};
+	static const char *const type_names[][2] = {
+		{ "str", "string" }, { "a8u", "bytearray" }
+	};
+	char match[4], type[12], align[8] = "", opt[48], aopt[48];
+	const char *op = NULL, *tn = type, *val;
+	int pos = 0, n = 0;
+	size_t i, len;
+
+	if (sscanf(cmd, "find %3[a-z]:%11[a-z0-9]%n", match, type, &pos) == 2 && cmd[pos] == '@' &&
+		sscanf(&cmd[pos], "@%7[0-9]%n", align, &n) == 1)
+		pos += n;
+	if (!pos || cmd[pos] != ' ' || !cmd[pos += strspn(&cmd[pos], " ")]) {
 		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+		return;
+	}
+	for (i = 0; i < sizeof(match_ops) / sizeof(match_ops[0]); i++)
+		if (!strcmp(match, match_ops[i][0]))
+			op = match_ops[i][1];
+	for (i = 0; i < sizeof(type_names) / sizeof(type_names[0]); i++)
+		if (!strcmp(type, type_names[i][0]))
+			tn = type_names[i][1];
+	if (!op) {
+		SM_Message("{"F_JSON_STR("error","%s `%s`")"}", lStr("unsupported match type"), match);
+		return;
+	}
+	// operators apply to plain numbers only, other values are scan commands already
+	val = &cmd[pos];
+	if (!(isdigit(val[0]) || val[0] == '.' || (val[0] == '-' && (isdigit(val[1]) || val[1] == '.'))))
+		op = "";
+
+	// the type and alignment are short, checked by sscanf above
+	snprintf(opt, sizeof(opt), "option scan_data_type %s", tn);
+	snprintf(aopt, sizeof(aopt), "option scan_alignment %s", align);
+	len = strlen(op) + strlen(val) + 1;
+
+	if (!sm_execcommand(vars, opt)) {
+		SM_Message("{"F_JSON_STR("error","%s `%s`")"}", lStr("unsupported data type"), type);
+	} else if (*align && !sm_execcommand(vars, aopt)) {
+		SM_Message("{"F_JSON_STR("error","%s `%s`")"}", lStr("unsupported alignment"), align);
+	} else if (!(s_scan.cmd = malloc(len))) {
+		SM_Message("{"F_JSON_STR("error","%s")"}", lStr("sorry, there was a memory allocation error"));
+	} else {
+		snprintf(s_scan.cmd, len, "%s%s", op, val);
+		s_scan.ipc_fd = ipc_fd;
+		s_scan.last_pgss = -1.0;
+		atomic_store(&s_scan.running, true);
+		if (pthread_create(&s_scan.thread, NULL, s_scan_worker, vars) != 0) {
+			atomic_store(&s_scan.running, false);
+			free(s_scan.cmd);
+			s_scan.cmd = NULL;
+			SM_Message("{"F_JSON_STR("error","%s")"}", lStr("unable to start scanning"));
+		} else {
+			s_scan.joinable = true;
+			s_matches_gen++;
+		}
+	}
 }
 
 static inline void s_cmd_reset_process(globals_t *vars, const char *cmd)
@@ -181,53 +861,123 @@ static inline void s_cmd_reset_process(globals_t *vars, const char *cmd)
 	}
 	vars->options.region_scan_level = r;
 	sm_reset_process(vars);
+	s_matches_gen++;
+	sm_freezer_attach(vars->target);
 }
 
-static int iter_sock_loop(globals_t *vars, const int ipc_fd)
+/* `delete {ids}` deletes the matches of the set of ids (as listed by `list`, see `help delete`),
+ * returns the number of matches left */
+static inline void s_cmd_delete_matches(globals_t *vars, const char *cmd)
 {
-	int _stderr_fd = dup(STDERR_FILENO);
-	( void )dup2(ipc_fd, STDERR_FILENO);
+	const char *ids = &cmd[6 + (cmd[6] == ' ')];
+	size_t l = strspn(ids, "0123456789,");
 
+	// the matches of a snapshot are expanded by `delete` first
+	if (l == 0 || ids[l] != '\0' || !sm_execcommand(vars, cmd)) {
+		SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid arguments"), cmd);
+	} else {
+		SM_Message("{"F_JSON_NUM("match_count","%lu")"}", sm_get_num_matches());
+	}
+	s_matches_gen++;
+}
+
+/* Every request and reply is a frame: id + length + payload (see `sys_send_frame()`).
+ * JSON replies are written to `sm_msgout`, which is kept in memory until the command is done,
+ * binary replies are sent by the command itself.
+ * While scanning, events are pushed in frames with the id `EVENT_FRAME_ID`. */
+static int iter_sock_loop(globals_t *vars, const int ipc_fd)
+{
 	struct {
-		unsigned char ipos:7;
-		bool quit:1;
-		const char endl[4];
-		char buf[127];
+		bool quit, sent;
+		uint32_t id;  // id of the current command
+		char  *buf;   // current command, NUL terminated
+		size_t buf_l;
+		char  *reply; // stream buffer of the reply
+		size_t reply_l;
 	} loop = {
-		.ipos = 0,
-		.quit = false,
-		.endl = "{}\n",
-		.buf  = {0}
+		.quit  = false,
+		.sent  = false,
+		.id    = 0,
+		.buf   = NULL,
+		.buf_l = 0,
+		.reply = NULL,
+		.reply_l = 0
 	};
+	if (!(sm_msgout = open_memstream(&loop.reply, &loop.reply_l))) {
+		SM_Error("Unable to create a reply stream");
+		return EXIT_FAILURE;
+	}
 	sm_set_backend();
+	sm_freezer_attach(vars->target);
 
 	while (!loop.quit)
-	{ // receive data from the server
-		if (read(ipc_fd, loop.buf, sizeof(loop.buf)) == -1) {
-			puts("  --- ???");
-			continue;
+	{
+		s_scan_join(false);
+		// push the progress until the next command comes
+		if (atomic_load(&s_scan.running)) {
+			struct pollfd pfd = { .fd = ipc_fd, .events = POLLIN };
+			if (poll(&pfd, 1, SCAN_EVENT_MS) == 0) {
+				pthread_mutex_lock(&s_sock_lock);
+				if (atomic_load(&s_scan.running) &&
+					(vars->scan_progress != s_scan.last_pgss || vars->num_matches != s_scan.last_mcnt))
+					s_push_scan_event(vars, "progress", true);
+				pthread_mutex_unlock(&s_sock_lock);
+				continue;
+			}
+		}
+		// receive data from the server
+		if (sys_recv_frame(ipc_fd, &loop.id, &loop.buf, &loop.buf_l) == -1) {
+			SM_Demsg("connection closed");
+			break;
 		}
 		SM_Debug("%s", loop.buf);
-		loop.ipos = 0;
+		loop.sent = false;
+
+		pthread_mutex_lock(&s_sock_lock);
 
+		bool busy = atomic_load(&s_scan.running);
+		if (busy && (_CMP_4(loop.buf, 0, "rset") || _CMP_4(loop.buf, 0, "find") || _CMP_4(loop.buf, 0, "list") ||
+		             _CMP_6(loop.buf, 0, "option") || _CMP_6(loop.buf, 0, "delete"))) {
+			SM_Message("{"F_JSON_STR("error","%s")"}", lStr("scan in progress"));
+		} else
 		/*--*/ if (_CMP_4(loop.buf, 0, "exit")) { loop.quit = true;
-		} else if (_CMP_4(loop.buf, 0, "rset")) { loop.ipos = 2; s_cmd_reset_process(vars, loop.buf);
-		} else if (_CMP_4(loop.buf, 0, "dump")) { loop.ipos = 2; s_cmd_dump_memory  (vars, loop.buf);
-		} else if (_CMP_4(loop.buf, 0, "list")) {
-		} else if (_CMP_4(loop.buf, 0, "info")) { loop.ipos = 2; s_cmd_info_scanning(vars);
-		} else if (_CMP_4(loop.buf, 0, "find")) {
+		} else if (_CMP_4(loop.buf, 0, "rset")) { s_cmd_reset_process(vars, loop.buf);
+		} else if (_CMP_4(loop.buf, 0, "dump")) { loop.sent = s_cmd_dump_memory(vars, loop.buf, ipc_fd, loop.id);
+		} else if (_CMP_4(loop.buf, 0, "read")) { loop.sent = s_cmd_read_values(vars, loop.buf, ipc_fd, loop.id);
+		} else if (_CMP_6(loop.buf, 0, "writev")) { s_cmd_write_values(loop.buf);
+		} else if (_CMP_6(loop.buf, 0, "write ")) { s_cmd_write_once(loop.buf);
+		} else if (_CMP_4(loop.buf, 0, "lock")) { s_cmd_lock_table(loop.buf);
+		} else if (_CMP_4(loop.buf, 0, "list")) { loop.sent = s_cmd_list_matches(vars, loop.buf, ipc_fd, loop.id);
+		} else if (_CMP_4(loop.buf, 0, "info")) { s_cmd_info_scanning(vars);
+		} else if (_CMP_6(loop.buf, 0, "delete")) { s_cmd_delete_matches(vars, loop.buf);
+		} else if (_CMP_4(loop.buf, 0, "find")) { s_scan_join(false); s_cmd_find_matches(vars, loop.buf, ipc_fd);
+		} else if (_CMP_6(loop.buf, 0, "option")) {
+			// runtime options of libscanmem, e.g. `option snapshot_dir {path}`
+			if (!sm_execcommand(vars, loop.buf))
+				SM_Message("{"F_JSON_STR("error","%s [%s]")"}", lStr("invalid option"), loop.buf);
 		} else if (_CMP_4(loop.buf, 0, "stop")) {
 			// Sets the flag to interrupt the current scan at the next opportunity
 			sm_set_stop_flag(true);
 		} else {
 		}
-		if (write(ipc_fd, &loop.endl[loop.ipos], sizeof(loop.endl) - loop.ipos - 1)) {
-			
+		if (!loop.sent) {
+			fflush(sm_msgout);
+			off_t nbytes = ftello(sm_msgout);
+			if (!sys_send_frame(ipc_fd, loop.id, nbytes > 0 ? loop.reply : "{}", nbytes > 0 ? nbytes : 2))
+				loop.quit = true;
 		}
+		pthread_mutex_unlock(&s_sock_lock);
+
+		rewind(sm_msgout);
 		fflush(stdout);
-		fflush(stderr);
 	}
-	dup2(_stderr_fd, STDERR_FILENO);
+	s_scan_join(true);
+	s_view_free();
+	sm_freezer_detach();
+	fclose(sm_msgout);
+	sm_msgout = NULL;
+	free(loop.reply);
+	free(loop.buf);
 	shutdown(ipc_fd, SHUT_WR);
 	sleep(1);
 	close(ipc_fd);
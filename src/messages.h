@@ -16,7 +16,7 @@
 #endif
 # define SM_Hint(_M,_N) printf("💡 %s.\n"_N, lStr(_M))
 # define SM_Info(_F,...) printf(" ✔︎ " _F ".\n", __VA_ARGS__)
-# define SM_Message(_F,...) fprintf(stderr, _F, __VA_ARGS__)
+# define SM_Message(_F,...) fprintf(sm_msgout ? sm_msgout : stderr, _F, __VA_ARGS__)
 
 #ifdef DEBUG
 # define SM_Demsg(_M)     puts  ("🐞 ~ " _M)
@@ -43,6 +43,9 @@
 # define _CMP_7(_B,_i,_S) (_CMP_6(_B,_i,_S) &&_B[_i+6]==(_S)[6])
 # define _CMP_8(_B,_i,_S) (_CMP_7(_B,_i,_S) &&_B[_i+7]==(_S)[7])
 
+/* stream of the messages to the front-end, `stderr` when NULL */
+extern FILE *sm_msgout;
+
 void sm_message(const char *fmt, ...);
 
 #endif // _MESSAGES_H
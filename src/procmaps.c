@@ -6,13 +6,27 @@
 #include <fcntl.h>
 #include <errno.h>
 #include <ctype.h>
+#include <stdlib.h>
+#include <stdatomic.h>
 
+#include <sys/mman.h>
 #include <sys/stat.h>
+#include <sys/uio.h>
 
 #define MIN_LNKBUF_L 32
 #define MAX_LNKBUF_L 256
 #define MAX_RWOBUF_L 512
 #define BAD_SIZE_ERR (size_t)-1
+#define PROCMEM_PAGE_L 4096
+#define MAX_COALESCE_L 256
+#define MAX_DUMPBUF_L (1<<16)
+#define VM_READV_MAX_IOV 1024 // UIO_MAXIOV of Linux
+#define PAGEMAP_BUF_L 4096     // entries read from the pagemap at once
+
+// bits of a `/proc/{pid}/pagemap` entry
+#define PAGEMAP_SOFT_DIRTY (1ULL << 55)
+#define PAGEMAP_SWAPPED    (1ULL << 62)
+#define PAGEMAP_PRESENT    (1ULL << 63)
 
 #include "messages.h"
 #include "procmaps.h"
@@ -254,13 +268,184 @@ bool sm_read_procmaps(list_t *regions, pid_t procid, enum region_scan_level scan
 }
 
 
-static size_t dump_mem_to_buf(uint8_t *buf, uintptr_t base_addr, size_t nbytes, int _fd)
+static atomic_int s_reader =
+#if HAVE_PROCESS_VM_READV
+	PROCMEM_READER_VM_READV;
+#else
+	PROCMEM_READER_PREAD;
+#endif
+static atomic_ulong s_nsyscalls, s_nbytes;
+
+enum procmem_reader sm_set_procmem_reader(enum procmem_reader reader)
+{
+#if !HAVE_PROCESS_VM_READV
+	reader = PROCMEM_READER_PREAD;
+#endif
+	atomic_store(&s_reader, reader);
+	return reader;
+}
+
+enum procmem_reader sm_get_procmem_reader(void)
+{
+	return atomic_load(&s_reader);
+}
+
+void sm_procmem_count(unsigned long syscalls, size_t bytes)
+{
+	atomic_fetch_add_explicit(&s_nsyscalls, syscalls, memory_order_relaxed);
+	atomic_fetch_add_explicit(&s_nbytes, bytes, memory_order_relaxed);
+}
+
+procmem_stats_t sm_procmem_stats(bool reset)
+{
+	procmem_stats_t st;
+
+	if (reset) {
+		st.syscalls = atomic_exchange(&s_nsyscalls, 0);
+		st.bytes    = atomic_exchange(&s_nbytes, 0);
+	} else {
+		st.syscalls = atomic_load(&s_nsyscalls);
+		st.bytes    = atomic_load(&s_nbytes);
+	}
+	return st;
+}
+
+static bool write_clear_refs(pid_t procid)
+{
+	char proclnk[MIN_LNKBUF_L];
+	bool ok;
+
+	snprintf(proclnk, sizeof(proclnk), "/proc/%d/clear_refs", procid);
+
+	int w_fd = open(proclnk, O_WRONLY);
+	if (w_fd == -1)
+		return false;
+	// 4: clear the soft-dirty bits, and write-protect the pages to track them again
+	ok = write(w_fd, "4", 1) == 1;
+	close(w_fd);
+	return ok;
+}
+
+bool sm_soft_dirty_supported(void)
+{
+	static int supported = -1;
+
+	if (supported == -1) {
+		long page_l = sysconf(_SC_PAGESIZE);
+		volatile uint8_t *page = mmap(NULL, page_l, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+		uint64_t dirty = 0;
+
+		if (page == MAP_FAILED)
+			return false;
+		// without the soft-dirty bits the page written after clearing them doesn't look dirty
+		page[0] = 1;
+		supported = write_clear_refs(getpid());
+		page[0] = 2;
+		supported = supported && sm_read_soft_dirty(getpid(), (uintptr_t)page, 1, &dirty) && dirty == 1;
+		munmap((void *)page, page_l);
+	}
+	return supported;
+}
+
+bool sm_clear_soft_dirty(pid_t procid)
+{
+	return sm_soft_dirty_supported() && write_clear_refs(procid);
+}
+
+bool sm_read_soft_dirty(pid_t procid, uintptr_t base_addr, size_t npages, uint64_t *dirty)
+{
+	char proclnk[MIN_LNKBUF_L];
+	uint64_t entries[PAGEMAP_BUF_L];
+	uintptr_t page = base_addr / sysconf(_SC_PAGESIZE);
+	size_t i, k, n;
+
+	snprintf(proclnk, sizeof(proclnk), "/proc/%d/pagemap", procid);
+
+	int r_fd = open(proclnk, O_RDONLY);
+	if (r_fd == -1)
+		return false;
+
+	memset(dirty, 0, (npages + 63) / 64 * sizeof(uint64_t));
+
+	for (i = 0; i < npages; i += n) {
+		n = L_MIN(npages - i, PAGEMAP_BUF_L);
+		ssize_t nr = pread(r_fd, entries, n * sizeof(uint64_t), (page + i) * sizeof(uint64_t));
+		if (nr != (ssize_t)(n * sizeof(uint64_t))) {
+			close(r_fd);
+			return false;
+		}
+		for (k = 0; k < n; k++) {
+			if ((entries[k] & PAGEMAP_SOFT_DIRTY) || !(entries[k] & (PAGEMAP_PRESENT | PAGEMAP_SWAPPED)))
+				dirty[(i + k) / 64] |= 1ULL << ((i + k) % 64);
+		}
+	}
+	close(r_fd);
+	return true;
+}
+
+ssize_t sm_vm_read_vec(pid_t procid, procmem_iov_t *iov, size_t count)
+{
+#if HAVE_PROCESS_VM_READV
+	struct iovec local[VM_READV_MAX_IOV], remote[VM_READV_MAX_IOV];
+	size_t i, k, n, nfull = 0;
+
+	for (i = 0; i < count; i++)
+		iov[i].ndone = 0;
+
+	for (i = 0; i < count; i += k) {
+		for (n = 0; n < VM_READV_MAX_IOV && i + n < count; n++) {
+			local[n]  = (struct iovec){ .iov_base = iov[i + n].data, .iov_len = iov[i + n].size };
+			remote[n] = (struct iovec){ .iov_base = (void *)iov[i + n].addr, .iov_len = iov[i + n].size };
+		}
+		ssize_t nr = process_vm_readv(procid, local, n, remote, n, 0);
+		sm_procmem_count(1, L_MAX(nr, 0));
+
+		if (nr == -1 && (errno == ENOSYS || errno == EPERM) && i == 0) {
+			// not supported or not permitted, `pread()` may do
+			atomic_store(&s_reader, PROCMEM_READER_PREAD);
+			return -1;
+		} else if (nr == -1 && errno == ESRCH) {
+			break;
+		}
+		// the call stops at the first unreadable byte, which is skipped with the rest of its entry
+		size_t left = L_MAX(nr, 0);
+		for (k = 0; k < n && left >= iov[i + k].size; k++) {
+			iov[i + k].ndone = iov[i + k].size;
+			left -= iov[i + k].size;
+		}
+		if (k < n)
+			iov[i + k++].ndone = left;
+	}
+	for (i = 0; i < count; i++)
+		nfull += (iov[i].ndone == iov[i].size);
+	return nfull;
+#else
+	(void) procid, (void) iov, (void) count;
+	return -1;
+#endif
+}
+
+static size_t dump_mem_to_buf(pid_t procid, uint8_t *buf, uintptr_t base_addr, size_t nbytes, int _fd)
 {
 	size_t nread = 0;
 
+#if HAVE_PROCESS_VM_READV
+	if (atomic_load(&s_reader) == PROCMEM_READER_VM_READV) {
+		struct iovec local = { .iov_base = buf, .iov_len = nbytes }, remote = { .iov_base = (void *)base_addr, .iov_len = nbytes };
+		ssize_t nr = process_vm_readv(procid, &local, 1, &remote, 1, 0);
+		sm_procmem_count(1, L_MAX(nr, 0));
+
+		if (nr != -1 || !(errno == ENOSYS || errno == EPERM))
+			return L_MAX(nr, 0);
+		atomic_store(&s_reader, PROCMEM_READER_PREAD);
+	}
+#else
+	(void) procid;
+#endif
 	for (ssize_t nr = 0; nread < nbytes; nread += nr) {
 		/**/nr = pread(_fd, &buf[nread], nbytes - nread, base_addr + nread);
-		if (nr == -1) {
+		sm_procmem_count(1, L_MAX(nr, 0));
+		if (nr <= 0) {
 			// we can't read further, report what was read
 			break;
 		}
@@ -268,38 +453,70 @@ static size_t dump_mem_to_buf(uint8_t *buf, uintptr_t base_addr, size_t nbytes,
 	return nread;
 }
 
-static size_t dump_mem_to_file(const char *filename, uintptr_t base_addr, size_t nbytes, int _fd, bool json_msg)
+static bool write_to_sock(int sock_fd, const uint8_t *buf, size_t nbytes)
+{
+	for (ssize_t nw = 0; nbytes > 0; nbytes -= nw, buf += nw) {
+		/**/nw = write(sock_fd, buf, nbytes);
+		if (nw == -1) {
+			if (errno == EINTR) {
+				nw = 0;
+				continue;
+			}
+			return false;
+		}
+	}
+	return true;
+}
+
+static size_t dump_mem_to_sock(pid_t procid, int sock_fd, uintptr_t base_addr, size_t nbytes, int _fd)
 {
-	uint8_t buf[MAX_RWOBUF_L];
+	// read straight into the frame payload, the length goes first
+	uint8_t *frame = _fd == -1 ? NULL : malloc(sizeof(uint64_t) + nbytes);
+	uint64_t nread = 0;
+
+	if (frame) {
+		nread = dump_mem_to_buf(procid, &frame[sizeof(uint64_t)], base_addr, nbytes, _fd);
+		memcpy(frame, &nread, sizeof(uint64_t));
+	}
+	// without a payload only the zero length is sent
+	bool ok = write_to_sock(sock_fd, frame ? frame : (uint8_t *)&nread, sizeof(uint64_t) + nread);
+	free(frame);
+	return ok ? nread : BAD_SIZE_ERR;
+}
+
+static size_t dump_mem_to_file(pid_t procid, const char *filename, uintptr_t base_addr, size_t nbytes, int _fd, bool json_msg)
+{
+	uint8_t *buf = malloc(MAX_DUMPBUF_L);
 	 size_t nread = 0;
 
-	FILE *f_out = fopen(filename, "wb");
+	FILE *f_out = buf ? fopen(filename, "wb") : NULL;
 	if ( !f_out ) {
 		SM_Message(json_msg ? "{"F_JSON_STR("error","%s %s")"}" :
 		/* - - - - - - - - - */  F_TEXT_MSG("error","%s %s"), lStr("unable open file for write"), filename);
+		free(buf);
 		return BAD_SIZE_ERR;
 	} else {
-		for (ssize_t nr = 0; nread < nbytes; nread += nr) {
-			/**/ nr = pread(_fd, buf, L_MIN(nbytes - nread, MAX_RWOBUF_L), base_addr + nread);
-			if ( nr == -1 ) {
-				// we can't read further, report what was read
-				break;
-			} else
-				fwrite(buf, sizeof(uint8_t), nr, f_out);
+		for (size_t nr = 0, len = 0; nread < nbytes && nr == len; nread += nr) {
+			/**/ len = L_MIN(nbytes - nread, MAX_DUMPBUF_L);
+			/**/ nr  = dump_mem_to_buf(procid, buf, base_addr + nread, len, _fd);
+			// a short read is the last one
+			fwrite(buf, sizeof(uint8_t), nr, f_out);
 		}
 		fclose(f_out);
 	}
+	free(buf);
 	return nread;
 }
 
-static size_t dump_mem_to_stdout(uintptr_t base_addr, size_t nbytes, int _fd)
+static size_t dump_mem_to_stdout(pid_t procid, uintptr_t base_addr, size_t nbytes, int _fd)
 {
 	char buf[MAX_RWOBUF_L], fmt[8] = "\0\0\0\0\0\0\0";
 	size_t nread = 0;
 
-	for (ssize_t j, i, nr = 0; nread < nbytes; nread += nr) {
-		/**/ nr = pread(_fd, buf, L_MIN(nbytes - nread, MAX_RWOBUF_L), base_addr + nread);
-		if ( nr == -1 ) {
+	for (ssize_t j, i, nr = 0, len = 0; nread < nbytes && nr == len; nread += nr) {
+		/**/ len = L_MIN(nbytes - nread, MAX_RWOBUF_L);
+		/**/ nr  = dump_mem_to_buf(procid, (uint8_t *)buf, base_addr + nread, len, _fd);
+		if ( nr == 0 ) {
 			// we can't read further, report what was read
 			break;
 		}
@@ -340,7 +557,7 @@ bool sm_read_procmem(void *out, pid_t procid, enum memdump_out_type out_type, ui
 {
 	char proclnk[MIN_LNKBUF_L];
 	// check if out ptr is valid 
-	if (out_type == MEMDUMP_TO_BUFFER && out == NULL) {
+	if ((out_type == MEMDUMP_TO_BUFFER || out_type == MEMDUMP_TO_SOCKET) && out == NULL) {
 		SM_Message(json_msg ? "{"F_JSON_STR("error","%s")"}" :
 		/* - - - - - - - - - */  F_TEXT_MSG("error","%s"), lStr("output buffer is nullptr"));
 		return false;
@@ -353,21 +570,29 @@ bool sm_read_procmem(void *out, pid_t procid, enum memdump_out_type out_type, ui
 	snprintf(proclnk, sizeof(proclnk), "/proc/%d/mem", procid);
 	// open the `/proc/<pid>/mem` for read only
 	int r_fd = open(proclnk, O_RDONLY);
-	if (r_fd == -1) {
+	if (r_fd == -1 && out_type == MEMDUMP_TO_SOCKET) {
+		// the client waits for a frame, not for a message
+		dump_mem_to_sock(procid, *(int *)out, base_addr, nbytes, r_fd);
+		return false;
+	} else if (r_fd == -1) {
 		SM_Message(json_msg ? "{"F_JSON_STR("error","%s %s")"}" :
 		/* - - - - - - - - - */  F_TEXT_MSG("error","%s %s"), lStr("unable to open"), proclnk);
 		return false;
 	}
 	else switch (out_type) {
 		case MEMDUMP_TO_STDOUT:
-			nbytes = dump_mem_to_stdout(base_addr, nbytes, r_fd);
+			nbytes = dump_mem_to_stdout(procid, base_addr, nbytes, r_fd);
 			break;
 		case MEMDUMP_TO_BUFFER:
-			nbytes = dump_mem_to_buf(out, base_addr, nbytes, r_fd);
+			nbytes = dump_mem_to_buf(procid, out, base_addr, nbytes, r_fd);
 			break;
 		case MEMDUMP_TO_FILE:
-			nbytes = dump_mem_to_file(out, base_addr, nbytes, r_fd, json_msg);
+			nbytes = dump_mem_to_file(procid, out, base_addr, nbytes, r_fd, json_msg);
 			break;
+		case MEMDUMP_TO_SOCKET:
+			nbytes = dump_mem_to_sock(procid, *(int *)out, base_addr, nbytes, r_fd);
+			close(r_fd);
+			return nbytes != BAD_SIZE_ERR;
 	}
 	close(r_fd);
 
@@ -378,3 +603,105 @@ bool sm_read_procmem(void *out, pid_t procid, enum memdump_out_type out_type, ui
 	}
 	return false;
 }
+
+
+static int cmp_iov_addr(const void *a, const void *b)
+{
+	const procmem_iov_t *l = *(procmem_iov_t *const *)a, *r = *(procmem_iov_t *const *)b;
+	return (l->addr > r->addr) - (l->addr < r->addr);
+}
+
+/*
+ * the gap between `end` and `next` is read only if it can't fail by itself:
+ * both ends are readable and the gap lies within their pages
+ */
+static inline bool may_coalesce(uintptr_t end, uintptr_t next)
+{
+	return next <= end + MAX_COALESCE_L && next / PROCMEM_PAGE_L <= (end - 1) / PROCMEM_PAGE_L + 1;
+}
+
+size_t sm_read_procmem_vec(pid_t procid, procmem_iov_t *iov, size_t count)
+{
+	char proclnk[MIN_LNKBUF_L];
+	size_t i, j, k, nfull = 0, span_l = 0;
+	uint8_t *span = NULL;
+
+	if (atomic_load(&s_reader) == PROCMEM_READER_VM_READV) {
+		ssize_t n = sm_vm_read_vec(procid, iov, count);
+		if (n != -1)
+			return n;
+	}
+	for (i = 0; i < count; i++)
+		iov[i].ndone = 0;
+
+	snprintf(proclnk, sizeof(proclnk), "/proc/%d/mem", procid);
+
+	int r_fd = open(proclnk, O_RDONLY);
+	procmem_iov_t **order = malloc(count * sizeof(procmem_iov_t *));
+
+	if (r_fd == -1 || !order) {
+		if (r_fd != -1)
+			close(r_fd);
+		free(order);
+		return 0;
+	}
+	for (i = 0; i < count; i++)
+		order[i] = &iov[i];
+	qsort(order, count, sizeof(procmem_iov_t *), cmp_iov_addr);
+
+	for (i = 0; i < count; i = j) {
+		uintptr_t base = order[i]->addr, end = base + order[i]->size;
+		// find the neighbours to read at once
+		for (j = i + 1; j < count && may_coalesce(end, order[j]->addr); j++)
+			end = L_MAX(end, order[j]->addr + order[j]->size);
+
+		if (j - i == 1) {
+			order[i]->ndone = dump_mem_to_buf(procid, order[i]->data, base, order[i]->size, r_fd);
+		} else {
+			if (span_l < end - base) {
+				uint8_t *p = realloc(span, end - base);
+				if (!p)
+					break;
+				span = p, span_l = end - base;
+			}
+			size_t nread = dump_mem_to_buf(procid, span, base, end - base, r_fd);
+
+			for (k = i; k < j; k++) {
+				procmem_iov_t *v = order[k];
+				size_t off = v->addr - base;
+				if (off + v->size <= nread) {
+					memcpy(v->data, &span[off], v->size);
+					v->ndone = v->size;
+				} else {
+					// the span was cut, try that entry alone
+					v->ndone = dump_mem_to_buf(procid, v->data, v->addr, v->size, r_fd);
+				}
+			}
+		}
+	}
+	close(r_fd);
+
+	for (i = 0; i < count; i++)
+		nfull += (iov[i].ndone == iov[i].size);
+	free(order);
+	free(span);
+	return nfull;
+}
+
+size_t sm_write_procmem_vec(int mem_fd, procmem_iov_t *iov, size_t count)
+{
+	size_t i, nfull = 0;
+
+	for (i = 0; i < count; i++) {
+		ssize_t nw = 0;
+		iov[i].ndone = 0;
+		while (iov[i].ndone < iov[i].size) {
+			nw = pwrite(mem_fd, &iov[i].data[iov[i].ndone], iov[i].size - iov[i].ndone, iov[i].addr + iov[i].ndone);
+			if (nw <= 0 && !(nw == -1 && errno == EINTR))
+				break;
+			iov[i].ndone += L_MAX(nw, 0);
+		}
+		nfull += (iov[i].ndone == iov[i].size);
+	}
+	return nfull;
+}
@@ -25,6 +25,7 @@
 #ifndef PROCMAPS_H
 # define PROCMAPS_H
 # include <stdbool.h>
+# include <stdint.h>
 # include <sys/types.h>
 
 # include "list.h"
@@ -50,7 +51,14 @@ enum region_type {
 enum memdump_out_type {
 	MEMDUMP_TO_STDOUT,
 	MEMDUMP_TO_BUFFER,
-	MEMDUMP_TO_FILE
+	MEMDUMP_TO_FILE,
+	MEMDUMP_TO_SOCKET
+};
+
+// how the target memory is read, see `sm_set_procmem_reader()`
+enum procmem_reader {
+	PROCMEM_READER_PREAD,   // `pread()` on `/proc/{pid}/mem` (or `ptrace()` without it)
+	PROCMEM_READER_VM_READV // `process_vm_readv()`, many ranges per call
 };
 
 typedef unsigned char region_scan_level_t;
@@ -70,14 +78,100 @@ typedef struct {
 	char filename[1]; // associated file, must be last
 } region_t;
 
+// one entry of a batched read or write of `/proc/{pid}/mem`
+typedef struct {
+	uintptr_t addr;  // target address
+	uint32_t  size;  // bytes requested
+	uint32_t  ndone; // bytes actually read/written, set by `sm_*_procmem_vec()`
+	uint8_t  *data;  // destination/source, at least `size` bytes
+} procmem_iov_t;
+
+// reads of the target memory, counted since the last reset
+typedef struct {
+	unsigned long syscalls; // calls of `pread()`, `process_vm_readv()` or `ptrace()`
+	unsigned long bytes;    // bytes read by them
+} procmem_stats_t;
+
 bool sm_read_procmaps(list_t *regions, pid_t procid, enum region_scan_level scan_lvl, bool json_msg);
 
 /**
  * reads bytes from `proc/{pid}/mem` and writes to out.
  *
- * @param out       can be memory allocated buffer, or just a string with a filepath
+ * @param out       can be memory allocated buffer, or just a string with a filepath,
+ *                  or a pointer to the socket descriptor (`int *`)
  * @param out_type  defines that kind of `out` is
+ *
+ * For `MEMDUMP_TO_SOCKET` the bytes are sent as a binary frame: `uint64_t` length
+ * (host byte order) followed by the payload, the frame is sent even on failure
+ * (with zero length) and no text messages are printed, so the stream stays in sync.
  */
 bool sm_read_procmem(void *out, pid_t procid, enum memdump_out_type out_type, uintptr_t base_addr, size_t nbytes, bool json_msg);
 
+/**
+ * reads many (address, size) entries through one `/proc/{pid}/mem` descriptor.
+ *
+ * With `process_vm_readv()` the entries are read by `sm_vm_read_vec()`, otherwise
+ * in address order, neighbours (overlapping, or separated by a small gap within
+ * the same or the next page) are coalesced into a single `pread()`.
+ *
+ * @return the number of entries that were read completely
+ */
+size_t sm_read_procmem_vec(pid_t procid, procmem_iov_t *iov, size_t count);
+
+/**
+ * writes many (address, bytes) entries through the `/proc/{pid}/mem` descriptor `mem_fd`
+ * (opened with `O_WRONLY` or `O_RDWR`), so it can be kept open by the caller.
+ *
+ * @return the number of entries that were written completely
+ */
+size_t sm_write_procmem_vec(int mem_fd, procmem_iov_t *iov, size_t count);
+
+/**
+ * selects how the target memory is read (by the scans and `sm_read_procmem*()`),
+ * `PROCMEM_READER_VM_READV` is the default where `process_vm_readv()` exists.
+ * The reader falls back to `pread()` by itself once `process_vm_readv()` fails as unusable.
+ *
+ * @return the reader in use
+ */
+enum procmem_reader sm_set_procmem_reader(enum procmem_reader reader);
+enum procmem_reader sm_get_procmem_reader(void);
+
+/**
+ * reads many (address, size) entries with `process_vm_readv()`, up to `VM_READV_MAX_IOV`
+ * entries per call, each entry is read up to its first unreadable byte.
+ *
+ * @return the number of entries that were read completely,
+ *         -1 if `process_vm_readv()` isn't usable (nothing was read, the reader falls back)
+ */
+ssize_t sm_vm_read_vec(pid_t procid, procmem_iov_t *iov, size_t count);
+
+/* adds reads of the target memory to the counters */
+void sm_procmem_count(unsigned long syscalls, size_t bytes);
+
+/* @return the counters, which are zeroed if `reset` is true */
+procmem_stats_t sm_procmem_stats(bool reset);
+
+/**
+ * whether the kernel tracks the soft-dirty pages (probed once on a page of our own),
+ * which is needed by `sm_clear_soft_dirty()` and `sm_read_soft_dirty()`.
+ */
+bool sm_soft_dirty_supported(void);
+
+/**
+ * clears the soft-dirty bits of all the pages of the process through `/proc/{pid}/clear_refs`,
+ * so the pages written after that are reported by `sm_read_soft_dirty()`.
+ *
+ * @return false if they can't be cleared, or the kernel doesn't track them
+ */
+bool sm_clear_soft_dirty(pid_t procid);
+
+/**
+ * reads which of `npages` pages from the page of `base_addr` are soft-dirty through
+ * `/proc/{pid}/pagemap` into the bitmap `dirty` (bit `i % 64` of `dirty[i / 64]` for the page `i`).
+ * The pages which are neither present nor swapped count as dirty too, they may be gone.
+ *
+ * @return false if the pagemap can't be read
+ */
+bool sm_read_soft_dirty(pid_t procid, uintptr_t base_addr, size_t npages, uint64_t *dirty);
+
 #endif
@@ -6,11 +6,13 @@
 
 #include "scanmem.c"
 
+FILE *sm_msgout = NULL;
+
 void sm_message(const char *fmt, ...)
 {
 	va_list  args;
 	va_start(args  , fmt);
-	vfprintf(stderr, fmt, args);
+	vfprintf(sm_msgout ? sm_msgout : stderr, fmt, args);
 	va_end  (args);
 }
 
@@ -20,11 +22,13 @@ bool sm_reset_process(globals_t *p)
 	// reset matches and regions
 	if (p->matches)
 		 free(p->matches);
+	snapshot_free(p->snapshot);
 	l_destroy(p->regions);
 
 	// reset scan progress and matches
 	p->scan_progress = 0.0;
 	p->matches = NULL;
+	p->snapshot = NULL;
 	p->num_matches = 0;
 
 	// create a new linked list of regions
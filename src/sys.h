@@ -7,6 +7,9 @@
 # include <errno.h>
 # include <string.h>
 # include <unistd.h>
+# include <stdlib.h>
+# include <stdint.h>
+# include <limits.h>
 # include <stdbool.h>
 
 # include <sys/types.h>
@@ -114,4 +117,70 @@ static inline int sys_connect_sock(const char *ipc_path)
 	return client_fd;
 }
 
+/* Writes the whole buffer, restarting on signals */
+static inline bool sys_write_all(int fd, const void *buf, size_t nbytes)
+{
+	const char *p = buf;
+	for (ssize_t nw = 0; nbytes > 0; nbytes -= nw, p += nw) {
+		if ((nw = write(fd, p, nbytes)) == -1) {
+			if (errno != EINTR)
+				return false;
+			nw = 0;
+		}
+	}
+	return true;
+}
+
+/* Reads exactly `nbytes`, restarting on signals, false on error or end of file */
+static inline bool sys_read_all(int fd, void *buf, size_t nbytes)
+{
+	char *p = buf;
+	for (ssize_t nr = 0; nbytes > 0; nbytes -= nr, p += nr) {
+		if ((nr = read(fd, p, nbytes)) == -1) {
+			if (errno != EINTR)
+				return false;
+			nr = 0;
+		} else if (nr == 0) {
+			return false;
+		}
+	}
+	return true;
+}
+
+/* Frame header: request id (`uint32_t`) then payload length (`uint64_t`),
+ * in host byte order, with no padding. The reply has the id of the request. */
+# define SYS_FRAME_HDR_L (sizeof(uint32_t) + sizeof(uint64_t))
+
+static inline bool sys_send_frame(int fd, uint32_t id, const void *buf, uint64_t nbytes)
+{
+	char hdr[SYS_FRAME_HDR_L];
+	memcpy(&hdr[0], &id, sizeof(id));
+	memcpy(&hdr[sizeof(id)], &nbytes, sizeof(nbytes));
+	return sys_write_all(fd, hdr, sizeof(hdr)) && sys_write_all(fd, buf, nbytes);
+}
+
+/* Receives a frame into the growing buffer `*buf` of `*buf_l` bytes,
+ * which is NUL terminated past the payload, returns the payload length or -1 */
+static inline ssize_t sys_recv_frame(int fd, uint32_t *id, char **buf, size_t *buf_l)
+{
+	char hdr[SYS_FRAME_HDR_L];
+	uint64_t nbytes;
+	if (!sys_read_all(fd, hdr, sizeof(hdr)))
+		return -1;
+	memcpy(id, &hdr[0], sizeof(*id));
+	memcpy(&nbytes, &hdr[sizeof(*id)], sizeof(nbytes));
+	if (nbytes >= SSIZE_MAX)
+		return -1;
+	if (nbytes >= *buf_l) {
+		char *p = realloc(*buf, nbytes + 1);
+		if (!p)
+			return -1;
+		*buf = p, *buf_l = nbytes + 1;
+	}
+	if (!sys_read_all(fd, *buf, nbytes))
+		return -1;
+	(*buf)[nbytes] = '\0';
+	return nbytes;
+}
+
 #endif // _SYS_H
@@ -26,7 +26,11 @@
 #include <stdlib.h>
 #include <assert.h>
 #include <ctype.h>
+#include <errno.h>
+#include <unistd.h>
+#include <sys/mman.h>
 
+#include "common.h"
 #include "targetmem.h"
 #include "value.h"
 
@@ -211,3 +215,287 @@ delete_in_address_range (matches_and_old_values_array *array,
 
     return null_terminate(array, writing_swath_index);
 }
+
+/* releases the whole pages of [base+first, base+end) */
+static void
+snapshot_release_pages (void *base, size_t first, size_t end, size_t page_size)
+{
+    uintptr_t start = ((uintptr_t)base + first + page_size - 1) / page_size * page_size;
+    uintptr_t stop = ((uintptr_t)base + end) / page_size * page_size;
+
+    if (start < stop)
+        madvise((void *)start, stop - start, MADV_DONTNEED);
+}
+
+matches_snapshot *
+snapshot_new (size_t max_regions, match_flags flags, unsigned alignment,
+              const char *dir, size_t window)
+{
+    matches_snapshot *snap;
+    unsigned bit, k;
+
+    if (!(snap = calloc(1, sizeof(matches_snapshot) +
+                           max_regions * sizeof(snapshot_region))))
+        return NULL;
+
+    if (dir && !(snap->dir = strdup(dir))) {
+        free(snap);
+        return NULL;
+    }
+    snap->window = window;
+    snap->flags = flags;
+    snap->stride = alignment ? alignment : 8;
+    for (bit = 0; bit < 16; bit++) {
+        if (flags & (1u << bit)) {
+            match_flags flag = 1u << bit;
+            /* a flag of a number type is aligned to its size by default */
+            size_t stride = alignment ? alignment :
+                            (flag & flags_64b) ? 8 :
+                            (flag & flags_32b) ? 4 :
+                            (flag & flags_16b) ? 2 : 1;
+
+            k = snap->num_flags++;
+            snap->flag[k] = flag;
+            while (((size_t)1 << snap->shift[k]) < stride)
+                snap->shift[k]++;
+            snap->stride = MIN(snap->stride, stride);
+        }
+    }
+    return snap;
+}
+
+/* the words of all the bitmaps of a region */
+static size_t
+snapshot_bitmaps_words (const matches_snapshot *snap, const snapshot_region *region)
+{
+    size_t words = 0;
+    unsigned k;
+
+    for (k = 0; k < snap->num_flags; k++)
+        words += snapshot_bitmap_words(snap, region, k);
+    return words;
+}
+
+/* the copy of the region, then the bitmaps from the next page */
+static size_t
+snapshot_map_size (const matches_snapshot *snap, const snapshot_region *region)
+{
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    size_t size = (region->number_of_bytes + page_size - 1) / page_size * page_size;
+
+    return size + snapshot_bitmaps_words(snap, region) * sizeof(uint64_t);
+}
+
+/* maps a sparse file of the snapshot directory, removed at once,
+   so it goes away with the mapping */
+static void *
+snapshot_map_file (const char *dir, size_t size)
+{
+    char *path = NULL;
+    void *p = MAP_FAILED;
+    int fd;
+
+    if (asprintf(&path, "%s/scanmem-snapshot-XXXXXX", dir) < 0)
+        return NULL;
+
+    if ((fd = mkstemp(path)) == -1) {
+        show_error("can't create a snapshot file in `%s`: %s.\n", dir, strerror(errno));
+        free(path);
+        return NULL;
+    }
+    unlink(path);
+    free(path);
+
+    if (ftruncate(fd, size) == 0)
+        p = mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    else
+        show_error("can't extend a snapshot file in `%s`: %s.\n", dir, strerror(errno));
+    close(fd);
+
+    return p == MAP_FAILED ? NULL : p;
+}
+
+snapshot_region *
+snapshot_add_region (matches_snapshot *snap, void *start, size_t size)
+{
+    snapshot_region *region = &snap->regions[snap->num_regions];
+    size_t map_size;
+    uint64_t *bitmap;
+    uint8_t *p;
+    unsigned k;
+
+    region->first_byte_in_child = start;
+    region->number_of_bytes = size;
+    map_size = snapshot_map_size(snap, region);
+
+    if (snap->dir) {
+        p = snapshot_map_file(snap->dir, map_size);
+    } else {
+        p = mmap(NULL, map_size, PROT_READ | PROT_WRITE,
+                 MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+        if (p == MAP_FAILED)
+            p = NULL;
+    }
+    if (!p)
+        return NULL;
+
+    region->old_values = p;
+    bitmap = (uint64_t *)(p + map_size - snapshot_bitmaps_words(snap, region) * sizeof(uint64_t));
+    for (k = 0; k < snap->num_flags; k++) {
+        region->dropped_flags[k] = bitmap;
+        bitmap += snapshot_bitmap_words(snap, region, k);
+    }
+    snap->num_regions++;
+    return region;
+}
+
+void
+snapshot_free (matches_snapshot *snap)
+{
+    size_t r;
+
+    if (!snap)
+        return;
+
+    for (r = 0; r < snap->num_regions; r++)
+        munmap(snap->regions[r].old_values, snapshot_map_size(snap, &snap->regions[r]));
+    free(snap->dir);
+    free(snap);
+}
+
+void
+snapshot_release (const matches_snapshot *snap, snapshot_region *region,
+                  size_t first, size_t end)
+{
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    unsigned k;
+
+    /* the pages of an anonymous snapshot would be lost */
+    if (!snap->dir)
+        return;
+
+    snapshot_release_pages(region->old_values, first, end, page_size);
+    for (k = 0; k < snap->num_flags; k++)
+        snapshot_release_pages(region->dropped_flags[k], (first >> snap->shift[k]) / 64 * sizeof(uint64_t),
+                               (end >> snap->shift[k]) / 64 * sizeof(uint64_t), page_size);
+}
+
+size_t
+snapshot_bytes (const matches_snapshot *snap)
+{
+    size_t r, bytes = 0;
+
+    for (r = 0; r < snap->num_regions; r++)
+        bytes += snapshot_map_size(snap, &snap->regions[r]);
+    return bytes;
+}
+
+/* sets a bit of a bitmap, only if it isn't set already */
+static inline void
+snapshot_set_bit (uint64_t *bitmap, size_t bit)
+{
+    uint64_t mask = (uint64_t)1 << (bit % 64);
+
+    if (!(bitmap[bit / 64] & mask))
+        bitmap[bit / 64] |= mask;
+}
+
+void
+snapshot_drop (const matches_snapshot *snap, snapshot_region *region,
+               size_t first, size_t end)
+{
+    unsigned k;
+
+    for (k = 0; k < snap->num_flags; k++) {
+        uint64_t *bitmap = region->dropped_flags[k];
+        size_t stride = (size_t)1 << snap->shift[k];
+        size_t bit = (first + stride - 1) >> snap->shift[k];
+        size_t end_bit = (end + stride - 1) >> snap->shift[k];
+
+        /* the partial words at both ends, then the whole words between them */
+        for ( ; bit < end_bit && bit % 64; bit++)
+            snapshot_set_bit(bitmap, bit);
+        for ( ; end_bit > bit && end_bit % 64; end_bit--)
+            snapshot_set_bit(bitmap, end_bit - 1);
+        if (bit < end_bit)
+            memset(&bitmap[bit / 64], 0xff, (end_bit - bit) / 64 * sizeof(uint64_t));
+    }
+}
+
+/* whether all the flags of the offsets [index, index + 64 * stride) are dropped,
+   `index` being a multiple of 64 * stride */
+static inline bool
+snapshot_all_dropped (const matches_snapshot *snap, const snapshot_region *region,
+                      size_t index)
+{
+    unsigned k;
+
+    for (k = 0; k < snap->num_flags; k++) {
+        size_t bit = index >> snap->shift[k];
+        size_t bits = (64 * snap->stride) >> snap->shift[k];
+        uint64_t mask = bits >= 64 ? ~(uint64_t)0 : (((uint64_t)1 << bits) - 1) << (bit % 64);
+
+        if ((region->dropped_flags[k][bit / 64] & mask) != mask)
+            return false;
+    }
+    return true;
+}
+
+matches_and_old_values_array *
+snapshot_to_array (const matches_snapshot *snap, size_t n, size_t count)
+{
+    matches_and_old_values_array *array;
+    matches_and_old_values_swath *writing_swath_index;
+    size_t r, i, nth = 0;
+
+    if (!(array = allocate_array(NULL, (size_t)-1)))
+        return NULL;
+
+    writing_swath_index = array->swaths;
+    writing_swath_index->first_byte_in_child = NULL;
+    writing_swath_index->number_of_bytes = 0;
+
+    for (r = 0; r < snap->num_regions && count; r++) {
+        const snapshot_region *region = &snap->regions[r];
+        size_t required_extra_bytes_to_record = 0;
+        size_t extra_pos = 0; /* the extra bytes of the last match start here */
+        size_t extra;
+
+        for (i = 0; i < region->number_of_bytes && count; i += snap->stride) {
+            match_flags flags;
+
+            /* skip the words where all the flags are dropped */
+            if (i % (64 * snap->stride) == 0 && snapshot_all_dropped(snap, region, i)) {
+                i += 63 * snap->stride;
+                continue;
+            }
+
+            flags = snapshot_get_flags(snap, region, i);
+            if (flags == flags_empty || nth++ < n)
+                continue;
+
+            /* the extra bytes of the last match end at this one */
+            extra = MIN(required_extra_bytes_to_record, i - extra_pos);
+            writing_swath_index = add_elements(&array, writing_swath_index,
+                                               region->first_byte_in_child + extra_pos,
+                                               &region->old_values[extra_pos], extra, flags_empty);
+            writing_swath_index = add_element(&array, writing_swath_index,
+                                              region->first_byte_in_child + i,
+                                              region->old_values[i], flags);
+            /* up to the end of the longest match, an aligned one may be shorter than the last */
+            required_extra_bytes_to_record = MAX(extra_pos + required_extra_bytes_to_record,
+                                                 i + ((flags & flags_64b) ? 8 :
+                                                      (flags & flags_32b) ? 4 :
+                                                      (flags & flags_16b) ? 2 : 1)) - (i + 1);
+            extra_pos = i + 1;
+            count--;
+        }
+
+        extra = MIN(required_extra_bytes_to_record, region->number_of_bytes - extra_pos);
+        writing_swath_index = add_elements(&array, writing_swath_index,
+                                           region->first_byte_in_child + extra_pos,
+                                           &region->old_values[extra_pos], extra, flags_empty);
+    }
+
+    return null_terminate(array, writing_swath_index);
+}
@@ -67,6 +67,35 @@ typedef struct {
     size_t index;
 } match_location;
 
+/* Compact store of the matches of a snapshot (MATCHANY scan of numbers).
+   Every byte of a region starts as a match with all the `flags` which fit
+   before the end of the region and are aligned there, so the snapshot is only
+   a copy of the regions and one bit per aligned offset and flag, set once the
+   flag is dropped by a next scan (the regions start at page boundaries, so the
+   alignment of an offset is the one of its address).
+   Both are in one mapping per region, whose untouched pages cost no memory:
+   anonymous, or a sparse file of `dir`, whose pages are released from memory
+   every `window` bytes scanned.
+   It is replaced by a matches_and_old_values_array once few matches are left. */
+typedef struct {
+    void *first_byte_in_child;
+    size_t number_of_bytes;
+    uint8_t *old_values;        /* copy of the region */
+    uint64_t *dropped_flags[16]; /* one bitmap per flag of the snapshot */
+} snapshot_region;
+
+typedef struct {
+    match_flags flags;          /* flags of every byte of the snapshot */
+    unsigned num_flags;
+    match_flags flag[16];       /* flag of each bitmap */
+    unsigned shift[16];         /* the bits of a bitmap are for the multiples of 1 << shift */
+    size_t stride;              /* step between the offsets which may hold a match */
+    char *dir;                  /* directory of the files, NULL for anonymous mappings */
+    size_t window;              /* bytes scanned in a row before their pages are released */
+    size_t num_regions;
+    snapshot_region regions[0];
+} matches_snapshot;
+
 
 /* Public functions */
 
@@ -94,6 +123,32 @@ delete_in_address_range (matches_and_old_values_array *array,
                          unsigned long *num_matches,
                          void *start_address, void *end_address);
 
+/* `alignment` is the one of `option scan_alignment` (0 for the size of each type) */
+matches_snapshot *snapshot_new (size_t max_regions, match_flags flags, unsigned alignment,
+                                const char *dir, size_t window);
+
+/* maps the copy of [start, start+size) and its bitmaps, NULL on failure */
+snapshot_region *snapshot_add_region (matches_snapshot *snap,
+                                      void *start, size_t size);
+
+void snapshot_free (matches_snapshot *snap);
+
+/* releases the memory of the bytes [first, end) of a region backed by a file,
+   which are read again from the file if needed */
+void snapshot_release (const matches_snapshot *snap, snapshot_region *region,
+                       size_t first, size_t end);
+
+/* memory taken by the copy of the regions and the bitmaps */
+size_t snapshot_bytes (const matches_snapshot *snap);
+
+/* drops all the flags of the bytes [first, end) of the region */
+void snapshot_drop (const matches_snapshot *snap, snapshot_region *region,
+                    size_t first, size_t end);
+
+/* dense array of `count` matches from the nth, with their extra bytes */
+matches_and_old_values_array *snapshot_to_array (const matches_snapshot *snap,
+                                                 size_t n, size_t count);
+
 /* The following functions are called in the hot scanning path and were moved
    to this header from the .c file so that they could be inlined */
 
@@ -250,6 +305,37 @@ add_element (matches_and_old_values_array **array,
     return swath;
 }
 
+/* adds `count` bytes at once, only the first one gets `new_flags`,
+   returns the last swath like `add_element()` */
+static inline matches_and_old_values_swath *
+add_elements (matches_and_old_values_array **array,
+              matches_and_old_values_swath *swath,
+              void *remote_address,
+              const uint8_t *new_bytes,
+              size_t count,
+              match_flags new_flags)
+{
+    if (count == 0)
+        return swath;
+
+    swath = add_element(array, swath, remote_address, new_bytes[0], new_flags);
+    if (count == 1)
+        return swath;
+
+    *array = allocate_enough_to_reach(*array,
+        local_address_beyond_last_element(swath) +
+        (count - 1) * sizeof(old_value_and_match_info), &swath);
+
+    old_value_and_match_info *dataptr = local_address_beyond_last_element(swath);
+    for (size_t i = 1; i < count; i++, dataptr++) {
+        dataptr->old_value = new_bytes[i];
+        dataptr->match_info = flags_empty;
+    }
+    swath->number_of_bytes += count - 1;
+
+    return swath;
+}
+
 /* only at most sizeof(int64_t) bytes will be read,
    if more bytes are needed (e.g. bytearray),
    read them separately (for performance) */
@@ -285,6 +371,56 @@ data_to_val_aux (const matches_and_old_values_swath *swath,
     return val;
 }
 
+static inline size_t
+snapshot_bitmap_words (const matches_snapshot *snap,
+                       const snapshot_region *region, unsigned k)
+{
+    size_t bits = (region->number_of_bytes + ((size_t)1 << snap->shift[k]) - 1) >> snap->shift[k];
+
+    return (bits + 63) / 64;
+}
+
+static inline match_flags
+snapshot_get_flags (const matches_snapshot *snap,
+                    const snapshot_region *region, size_t index)
+{
+    size_t max_bytes = region->number_of_bytes - index;
+    match_flags flags = snap->flags;
+    unsigned k;
+
+    /* the same as data_to_val_aux() */
+    if (max_bytes < 8) flags &= ~flags_64b;
+    if (max_bytes < 4) flags &= ~flags_32b;
+    if (max_bytes < 2) flags &= ~flags_16b;
+
+    for (k = 0; k < snap->num_flags; k++) {
+        size_t bit = index >> snap->shift[k];
+
+        if ((bit << snap->shift[k]) != index ||
+            (region->dropped_flags[k][bit / 64] & ((uint64_t)1 << (bit % 64))))
+            flags &= ~snap->flag[k];
+    }
+    return flags;
+}
+
+/* only the bits which change are written, the others may stay unmapped,
+   the flags which aren't aligned at `index` are ignored */
+static inline void
+snapshot_set_flags (const matches_snapshot *snap, snapshot_region *region,
+                    size_t index, match_flags flags)
+{
+    unsigned k;
+
+    for (k = 0; k < snap->num_flags; k++) {
+        size_t bit = index >> snap->shift[k];
+        uint64_t *word = &region->dropped_flags[k][bit / 64];
+        uint64_t mask = (uint64_t)1 << (bit % 64);
+
+        if ((bit << snap->shift[k]) == index && !(*word & mask) != !!(flags & snap->flag[k]))
+            *word ^= mask;
+    }
+}
+
 static inline value_t
 data_to_val (const matches_and_old_values_swath *swath, size_t index)
 {
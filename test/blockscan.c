@@ -0,0 +1,143 @@
+/*
+    Compares the block scan routines of every instruction set with the scan routine
+    of each offset, on buffers ending before an unreadable page
+
+    This library is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published
+    by the Free Software Foundation; either version 3 of the License, or
+    (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public License
+    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/mman.h>
+#include <unistd.h>
+
+/* the block routines of each instruction set are static */
+#include "../scanroutines.c"
+
+typedef size_t (*block_scan_t)(const uint8_t *buffer, size_t count, size_t available, size_t stride,
+                               const uservalue_t *user_value, uint32_t *offsets, bool range);
+
+static const struct {
+    const char *name;
+    block_scan_t scan;
+} isas[] = {
+    { "any", block_scan_any },
+#ifdef __SSE2__
+    { "sse2", block_scan_sse2 },
+#endif
+#ifdef HAVE_BLOCK_AVX2
+    { "avx2", block_scan_avx2 },
+#endif
+};
+
+/* bytes making values at the bounds of the int32 and uint32 ranges */
+static const uint8_t bytes[] = { 0x00, 0x00, 0x00, 0x01, 0x05, 0x7f, 0x80, 0xff, 0xff, 0xfb };
+
+static const size_t counts[] = { 1, 3, 4, 5, 15, 16, 17, 31, 32, 33, 63, 100, 1001, 4093, SCAN_BLOCK_SIZE };
+static const long tails[] = { -3, -1, 0, 1, 2, 3, 4, 9 };
+static const size_t strides[] = { 1, 2, 4, 8, 16, 32, 64 };
+
+static void set_value(uservalue_t *val, uint32_t v, match_flags flags)
+{
+    zero_uservalue(val);
+    val->int32_value = (int32_t)v;
+    val->uint32_value = v;
+    val->flags = flags;
+}
+
+/* the offsets matched by the scan routine of each offset */
+static size_t scalar_scan(scan_routine_t routine, const uint8_t *buffer, size_t count, size_t available,
+                          size_t stride, const uservalue_t *user_value, uint32_t *offsets)
+{
+    size_t n = 0;
+
+    for (size_t i = 0; i < count && i < available; i += stride) {
+        match_flags flags = flags_empty;
+        if ((*routine)((const mem64_t *)(buffer + i), available - i, NULL, user_value, &flags) > 0)
+            offsets[n++] = i;
+    }
+    return n;
+}
+
+int main(void)
+{
+    static const struct {
+        uint32_t lo, hi;
+        match_flags flags;
+    } values[] = {
+        { 0, 0, flags_i32b },
+        { 0xffffffff, 0xffffffff, flags_i32b },
+        { 0x80000000, 0x80000000, flag_u32b },
+        { 0x7fffffff, 0x7fffffff, flag_s32b },
+        { (uint32_t)-5, 5, flag_s32b },
+        { 0x7fffff00, 0x80000100, flag_u32b },
+        { 0x00000005, 0xfbffffff, flags_i32b },
+    };
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    size_t map_size = (SCAN_BLOCK_SIZE + 64 + page_size - 1) / page_size * page_size + page_size;
+    uint8_t *map = mmap(NULL, map_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    uint32_t *expected = malloc(SCAN_BLOCK_SIZE * sizeof(uint32_t));
+    uint32_t *offsets = malloc(SCAN_BLOCK_SIZE * sizeof(uint32_t));
+    unsigned long checks = 0, matches = 0;
+
+    assert(map != MAP_FAILED && expected && offsets);
+    /* a routine reading beyond `available` faults on the last page */
+    uint8_t *end = map + map_size - page_size;
+    assert(mprotect(end, page_size, PROT_NONE) == 0);
+
+    srand(1);
+    for (uint8_t *p = map; p < end; p++)
+        *p = bytes[rand() % sizeof(bytes)];
+
+    for (size_t v = 0; v < sizeof(values) / sizeof(values[0]); v++) {
+        bool range = values[v].lo != values[v].hi;
+        scan_match_type_t mt = range ? MATCHRANGE : MATCHEQUALTO;
+        uservalue_t user_value[2];
+
+        set_value(&user_value[0], values[v].lo, values[v].flags);
+        set_value(&user_value[1], values[v].hi, values[v].flags);
+        scan_routine_t routine = sm_get_scanroutine(INTEGER32, mt, values[v].flags, false);
+        assert(routine);
+
+        for (size_t c = 0; c < sizeof(counts) / sizeof(counts[0]); c++)
+        for (size_t t = 0; t < sizeof(tails) / sizeof(tails[0]); t++)
+        for (size_t s = 0; s < sizeof(strides) / sizeof(strides[0]); s++) {
+            size_t count = counts[c], stride = strides[s];
+            if (tails[t] < 0 && (size_t)-tails[t] > count)
+                continue;
+            /* the buffer ends at the unreadable page, every misalignment comes with the tails */
+            size_t available = count + tails[t];
+            const uint8_t *buffer = end - available;
+            size_t n = scalar_scan(routine, buffer, count, available, stride, user_value, expected);
+
+            for (size_t k = 0; k < sizeof(isas) / sizeof(isas[0]); k++) {
+#ifdef HAVE_BLOCK_AVX2
+                if (isas[k].scan == block_scan_avx2 && !__builtin_cpu_supports("avx2"))
+                    continue;
+#endif
+                size_t m = (*isas[k].scan)(buffer, count, available, stride, user_value, offsets, range);
+                if (m != n || memcmp(offsets, expected, n * sizeof(uint32_t))) {
+                    fprintf(stderr, "%s: %s 0x%08x..0x%08x (flags 0x%x), count %zu, available %zu, stride %zu: "
+                            "%zu matches instead of %zu\n", isas[k].name, range ? "range" : "eq",
+                            values[v].lo, values[v].hi, values[v].flags, count, available, stride, m, n);
+                    return 1;
+                }
+                checks++;
+            }
+            matches += n;
+        }
+    }
+    printf("%lu block scans matched %lu offsets as the scan routine\n", checks, matches);
+    /* the buffers must have had matches */
+    return matches ? 0 : 1;
+}
@@ -0,0 +1,44 @@
+#!/bin/bash
+# Times the scans of the given scanmem binaries (../scanmem by default)
+# on the same memfake target, e.g. to compare two builds:
+#   ./sm_bench.sh ./scanmem-old ../scanmem
+set -e
+
+MB=${MB:-512}
+RUNS=${RUNS:-3}
+binaries=("$@")
+[ ${#binaries[@]} -eq 0 ] && binaries=(../scanmem)
+
+# Start memfake, half of it random
+./memfake $MB 1 &
+memfake_pid=$!
+trap 'kill $memfake_pid' EXIT
+sleep 1
+
+scans=(
+    "option scan_data_type int32;12345"
+    "option scan_data_type int32;-1000..1000"
+    "option scan_data_type int32;3000000000..4000000000"
+    "option scan_data_type int16;12345"
+    "option scan_data_type int32;option scan_alignment 0;12345"
+    "option scan_data_type int;option scan_alignment 0;12345"
+    "option scan_data_type int;12345"
+)
+
+bench_sm () {
+    local best=
+    for ((i=0; i < RUNS; i++)); do
+        local start=$(date +%s%N)
+        echo -e "${2//;/\\n}\nexit" | "$1" -p $memfake_pid > /dev/null 2>&1
+        local ms=$(( ($(date +%s%N) - start) / 1000000 ))
+        [ -z "$best" ] || [ $ms -lt $best ] && best=$ms
+    done
+    printf "%8d ms  %s\n" $best "$2"
+}
+
+for bin in "${binaries[@]}"; do
+    echo "$bin (${MB} MiB, best of $RUNS):"
+    for scan in "${scans[@]}"; do
+        bench_sm "$bin" "$scan"
+    done
+done
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+    Runs the edits of the memory editor against the pages read meanwhile, with a fake target
+    Usage: ./sm_hexedit_test.py
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os, sys
+
+import gi
+gi.require_version('Gtk', '3.0')
+# paths of the GameConqueror data, which the editor doesn't use
+for var in ('SCANMEM_DOMAIN_TS', 'SCANMEM_LOCALEDIR', 'SCANMEM_USER_CFG', 'SCANMEM_UI_DIR'):
+    os.environ.setdefault(var, '')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gui'))
+from hexview import PagedBuffer
+
+PAGE = PagedBuffer.PAGE_SIZE
+
+def check(cond, what):
+    print(('ok    ' if cond else 'FAIL  ') + what)
+    if not cond:
+        raise SystemExit(1)
+
+class Target():
+    """Memory of the target, the reads are answered when `reply()` is called"""
+    def __init__(self, size):
+        self.mem = bytearray(size)
+        self.reads = []
+
+    def fetch(self, offset, size, callback):
+        self.reads.append((offset, size, callback))
+
+    def reply(self):
+        reads, self.reads = self.reads, []
+        for offset, size, callback in reads:
+            callback(self.mem[offset:offset + size])
+
+    def write(self, items):
+        for off, val in items:
+            self.mem[off] = val
+
+def run():
+    target = Target(4 * PAGE)
+    pb = PagedBuffer(len(target.mem), target.fetch, max_pages=2)
+    pb.load(0, PAGE)
+    target.reply()
+    check(pb[10] == 0, 'load')
+    # edit while the page is read again
+    pb.load(0, PAGE, reload=True)
+    pb[10] = 0x41
+    target.mem[20] = 7
+    target.reply()
+    check(pb[10] == 0x41 and pb[20] == 7, 'edit: kept on the page read meanwhile')
+    # the edited page isn't dropped by the reads of the other pages
+    pb.load(PAGE, 4 * PAGE)
+    target.reply()
+    check(pb[10] == 0x41, 'edit: kept while reading the other pages')
+    # taken, then written after a read was sent: that read holds the bytes before the write
+    pb.load(0, PAGE, reload=True)
+    edits = pb.take_edits()
+    check(edits == [(10, 0x41)] and pb.take_edits() == [], 'take_edits')
+    target.reply()
+    target.write(edits)
+    check(pb[10] == 0x41, 'edit: kept on the page read before the write')
+    target.mem[10] = 0x42
+    pb.load(0, PAGE, reload=True)
+    target.reply()
+    check(pb[10] == 0x42, 'edit: the pages read after the write are from the target')
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+    Runs the socket commands of the backend on a memfake target, through the wrapper of GameConqueror
+    Usage: ./sm_ipc_test.py <memfake pid> [scanmem binary]
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os, sys, select, struct, subprocess, tempfile, time
+
+SOCK_PATH = os.path.join(tempfile.mkdtemp(), 'socket')
+os.environ['SCANMEM_SOCKET'] = SOCK_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gui'))
+import scanmem
+
+def check(cond, what):
+    print(('ok    ' if cond else 'FAIL  ') + what)
+    if not cond:
+        raise SystemExit(1)
+
+def wait_done(sm: scanmem.Scanmem, cmd: str):
+    done = []
+    sm.subscribe('done', done.append)
+    check('error' not in sm.send_command(cmd), cmd)
+    while not done:
+        select.select([sm.fileno()], [], [], 1)
+        sm.dispatch_replies()
+    return done[0]
+
+def run(sm: scanmem.Scanmem):
+    emsg, rcount, _ = sm.reset_process()
+    check(not emsg and rcount > 0, 'rset')
+    # options
+    check(not sm.set_option('scan_threads', 2), 'option scan_threads 2')
+    check(not sm.set_option('scan_alignment', 0), 'option scan_alignment 0')
+    check(sm.set_option('scan_alignment', 3), 'option scan_alignment 3 is rejected')
+    check(not sm.set_option('vm_readv', 1), 'option vm_readv 1')
+    # scan, binary list
+    done = wait_done(sm, 'find eq:i32@4 0')
+    check(done['ok'] and done['match_count'] > 0, 'find: done')
+    mlst, total, emsg = sm.get_list_matches(8)
+    check(not emsg and len(mlst) == 8 and total == done['match_count'], 'list 0 8')
+    check(all(int(m[1], 16) % 4 == 0 and m[4] == 0 for m in mlst), 'list: aligned zeroes')
+    addrs = [int(m[1], 16) for m in mlst]
+    # delete, the next matches are listed in their place
+    check(sm.delete_matches([mlst[0][0], mlst[2][0]]) == (total - 2, ''), 'delete')
+    dlst, dtotal, _ = sm.get_list_matches(2)
+    check(dtotal == total - 2 and [m[1] for m in dlst] == [mlst[1][1], mlst[3][1]], 'delete: list')
+    check(sm.delete_matches([total])[1] != '', 'delete: an unknown id is rejected')
+    mlst, total, _ = sm.get_list_matches(8)
+    addrs = [int(m[1], 16) for m in mlst]
+    # write once, read back by `read` and `dump`
+    check(sm.write_memory([(addrs[0], struct.pack('i', 1234))]) == (1, ''), 'write')
+    check(sm.read_many([(addrs[0], 4), (addrs[1], 4)]) == [struct.pack('i', 1234), bytes(4)], 'read')
+    data, emsg = sm.read_memory(addrs[0], 4, fresh=True)
+    check(not emsg and bytes(data) == struct.pack('i', 1234), 'dump')
+    # lock table, held by the freezer
+    check(sm.freezer.add([(addrs[2], struct.pack('i', 77))]) == (1, ''), 'lock add')
+    check(sm.freezer.list() == [(addrs[2], struct.pack('i', 77), True)], 'lock list')
+    check(sm.freezer.add([(addrs[1], b'')])[1] and addrs[1] not in sm.freezer, 'lock add: a rejected item is left out')
+    sm.write_memory([(addrs[2], struct.pack('i', 5))])
+    time.sleep(0.2)
+    data, _ = sm.read_memory(addrs[2], 4, fresh=True)
+    check(bytes(data) == struct.pack('i', 77), 'lock: the value is written back')
+    check('error' in sm.send_command('lock period -1'), 'lock period -1 is rejected')
+    check(sm.send_command('lock period 20').get('period_ms') == 20, 'lock period 20')
+    check('error' in sm.send_command('lock clearall') and len(sm.freezer.list()) == 1, 'lock clearall is rejected')
+    check('error' in sm.send_command('lock listing'), 'lock listing is rejected')
+    check(sm.write_many([(addrs[3], struct.pack('i', 9))]) == (1, ''), 'write_many')
+    check([a for a,_,_ in sm.freezer.list()] == [addrs[3]], 'write_many: the table is replaced')
+    sm.write_memory([(addrs[3], struct.pack('i', 5))])
+    check(sm.write_many([(addrs[3], struct.pack('i', 9))]) == (1, ''), 'write_many: the table is re-applied')
+    data, _ = sm.read_memory(addrs[3], 4, fresh=True)
+    check(bytes(data) == struct.pack('i', 9), 'write_many: the value is written back')
+    check(sm.freezer.clear() == (0, '') and sm.freezer.list() == [], 'lock clear')
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__.split('\n\n')[0])
+    sm = scanmem.Scanmem(sys.argv[1])
+    backend = subprocess.Popen([sys.argv[2] if len(sys.argv) > 2 else '../scanmem', '-ipc=' + SOCK_PATH],
+                               stdout=subprocess.DEVNULL)
+    sm.socket_server()
+    try:
+        run(sm)
+    finally:
+        sm.exit_cleanup()
+        backend.wait(5)
+        sm.close_server()
+        os.rmdir(os.path.dirname(SOCK_PATH))
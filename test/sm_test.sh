@@ -21,6 +21,50 @@ test_sm "option scan_data_type int;1;exit"
 test_sm "option scan_data_type float;1;exit"
 test_sm "option scan_data_type number;1;exit"
 
+# Scans split among threads
+test_sm "option scan_threads 4;option scan_data_type int32;0;exit"
+test_sm "option scan_threads 1;option scan_data_type int32;0;=;exit"
+test_sm "option scan_threads 0;option scan_data_type int8;snapshot;1;exit"
+
+# Reads of the target by process_vm_readv() or pread()
+test_sm "option vm_readv 1;option scan_data_type int32;0;=;exit"
+test_sm "option vm_readv 0;option scan_data_type int32;0;=;exit"
+
+# Snapshots in sparse files of a directory, mapped by windows
+test_sm "option snapshot_dir /tmp;snapshot;1;exit"
+test_sm "option snapshot_dir /tmp;option snapshot_window 1;option scan_data_type int32;snapshot;=;0;exit"
+test_sm "option snapshot_dir -;snapshot;exit"
+
+# Scans of aligned addresses only, a bad alignment is rejected before the scan
+test_sm "option scan_alignment 0;option scan_data_type int32;0;=;exit"
+test_sm "option scan_alignment 8;option scan_data_type int16;0;=;exit"
+test_sm "option scan_alignment 2;option scan_data_type int;snapshot;0;exit"
+test_sm "option scan_alignment 3;exit" 2>&1 | grep -q "bad value for scan_alignment"
+
+# Next scans skipping the pages unchanged since the last one, memfake doesn't write
+# its memory so the `=` scans read a small part of what the search read
+# (skipped if the kernel doesn't track the soft-dirty pages)
+if test_sm "option soft_dirty 1;exit" 2>&1 | grep -q "not tracked by your kernel"; then
+    echo "soft-dirty pages not tracked, skipped"
+else
+    read_bytes=($(test_sm "option soft_dirty 1;option scan_data_type int32;0;=;=;exit" 2>&1 |
+                  sed -n 's/^info: [0-9]* reads of the target memory (\([0-9]*\) bytes).*/\1/p'))
+    test ${#read_bytes[@]} -eq 3
+    test $((read_bytes[2] * 10)) -lt ${read_bytes[0]}
+    test_sm "option soft_dirty 1;option scan_data_type int8;snapshot;=;1;exit"
+fi
+test_sm "option soft_dirty 0;option scan_data_type int32;0;=;exit"
+
+# Socket commands of the backend, as sent by GameConqueror
+if command -v python3 > /dev/null; then
+    python3 sm_ipc_test.py $memfake_pid
+fi
+
+# Edits of the memory editor, kept on the pages read meanwhile (needs the gi module)
+if command -v python3 > /dev/null && python3 -c "import gi" 2> /dev/null; then
+    python3 sm_hexedit_test.py
+fi
+
 huge_bytearray=""
 huge_string=""
 # 257 not a typo, forces full scan routine use